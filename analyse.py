@@ -0,0 +1,135 @@
+""" Analyses game records position by position and writes the AI's verdicts as JSON lines """
+
+import argparse
+import json
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+from board import Board, MARKS
+from players import search_position
+
+# A game record is one line of moves, O first, then alternating. Either "x,y x,y ..." or a JSON list [[x, y], ...]
+# Lines that are empty or start with # are skipped. Records that cannot be read or replayed are reported
+# on stderr with their line number and skipped, and the rest of the file is still analysed.
+
+def skip(line_no:int, reason:str) -> None:
+    print(f'line {line_no}: {reason}, skipped', file=sys.stderr)
+
+def parse_games(lines:Iterable[str]) -> Iterator[Tuple[int, list]]:
+    """ Yield (line number, [(tile_x, tile_y, mark), ...]) for each game record """
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            if line.startswith('['):
+                coords = [(int(x), int(y)) for x, y in json.loads(line)]
+            else:
+                coords = []
+                for token in line.split():
+                    numbers = token.split(',')
+                    if len(numbers) != 2:
+                        raise ValueError(f'{token!r} is not an x,y pair')
+                    coords.append((int(numbers[0]), int(numbers[1])))
+        except (ValueError, TypeError) as e:
+            skip(line_no, f'not a game record ({e})')
+            continue
+        yield line_no, [(x, y, MARKS[ply % 2]) for ply, (x, y) in enumerate(coords)]
+
+def positions(games:Iterable[Tuple[int, list]], width:int, height:int) -> Iterator[Tuple[dict, bytes]]:
+    """
+    Replay each game and yield (where, snapshot) for every position after a move, up to the end of the game.
+    where identifies the position and the move actually played from it, if any.
+    A game is replayed to its end before its positions are yielded, so one with an illegal move is skipped whole
+    """
+    for line_no, moves in games:
+        board = Board(width * 40, height * 40, 40, verbose=False)
+        found = []
+        for ply, move in enumerate(moves):
+            if not board.check_legal(move):
+                skip(line_no, f'illegal move {move[:2]} at ply {ply + 1}')
+                found = []
+                break
+            board.update_board(move, graphic=False)
+            if board.check_win(move)[0] or board.check_full():
+                break
+            played = list(moves[ply + 1][:2]) if ply + 1 < len(moves) else None
+            found.append(({'line': line_no, 'ply': ply + 1, 'to_move': MARKS[board.side_to_move], 'played': played},
+                          board.to_bytes(chains=False)))
+        yield from found
+
+def verdict(score:float) -> Tuple[float, str]:
+    """ (score, forced): a won or lost score becomes forced 'win' or 'loss' instead, as JSON has no infinity """
+    if score is not None and math.isinf(score):
+        return None, 'win' if score > 0 else 'loss'
+    return score, None
+
+def analyse(jobs:Iterable[Tuple[dict, bytes]], depth:int, branch_factor:int, time_limit:float, selective:bool, \
+            workers:int, multi_pv:int=1) -> Iterator[dict]:
+    """
+    Search every position, in order. With several workers, at most a few positions per worker are
+    in flight at once, so the input is read only as fast as the workers get through it.
+    Each search starts from an empty transposition table, so the results do not depend on the number of workers.
+    :param multi_pv: also list this many of the best moves with their scores and lines
+    """
+    def record(where:dict, result:dict) -> dict:
+        score, forced = verdict(result['score'])
+        found = {**where, 'best': list(result['move'][:2]), 'score': score, 'forced': forced, 'depth': result['depth'],
+                 'nodes': result['nodes'], 'time': round(result['search_time'], 4)}
+        if multi_pv > 1:
+            found['lines'] = []
+            for move, line_score, pv in result['lines']:
+                line_score, line_forced = verdict(line_score)
+                found['lines'].append({'move': list(move[:2]), 'score': line_score, 'forced': line_forced,
+                                       'pv': [list(pv_move[:2]) for pv_move in pv]})
+        return found
+
+    if workers <= 1:
+        for where, snapshot in jobs:
+            yield record(where, search_position(snapshot, depth, branch_factor, time_limit, selective, False, multi_pv))
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for where, snapshot in jobs:
+            pending.append((where, pool.submit(search_position, snapshot, depth, branch_factor, time_limit, selective, False, multi_pv)))
+            if len(pending) >= 4 * workers:
+                where, future = pending.popleft()
+                yield record(where, future.result())
+        while pending:
+            where, future = pending.popleft()
+            yield record(where, future.result())
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse game records with the AI, one JSON line per position')
+    parser.add_argument('games', help="file of game records, one per line, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help='JSON lines file to write, - for stdout')
+    parser.add_argument('-d', '--depth', type=int, default=4)
+    parser.add_argument('-b', '--branch-factor', type=int, default=10)
+    parser.add_argument('-t', '--time', type=float, default=5, help='seconds per position')
+    parser.add_argument('-s', '--selective', action='store_true', help='late move reductions and null move pruning')
+    parser.add_argument('-n', '--multi-pv', type=int, default=1, help='list this many of the best moves per position, with their lines')
+    parser.add_argument('--width', type=int, default=15)
+    parser.add_argument('--height', type=int, default=15)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    games_file = sys.stdin if args.games == '-' else open(args.games)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        jobs = positions(parse_games(games_file), args.width, args.height)
+        for result in analyse(jobs, args.depth, args.branch_factor, args.time, args.selective, args.workers, args.multi_pv):
+            output.write(json.dumps(result) + '\n')
+    finally:
+        if games_file is not sys.stdin:
+            games_file.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
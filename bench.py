@@ -0,0 +1,133 @@
+""" Times the board's hot paths and a fixed search on each backend, and checks that they agree.
+With --adaptive, compares the states an adaptive search takes with a fixed one's over a set of positions instead """
+
+import argparse
+import io
+import json
+import random
+from contextlib import redirect_stdout
+from statistics import median
+from time import perf_counter
+
+from board import Board, BACKENDS, EMPTY
+from players import AI, Player
+
+def random_position(board:Board, stones:int, seed:int) -> list:
+    """ Play stones random moves around the centre, returning them as (cell index, side) """
+    rng = random.Random(seed)
+    centre_x, centre_y = board.width // 2, board.height // 2
+    played = []
+    while len(played) < stones:
+        tile_x, tile_y = centre_x + rng.randint(-4, 4), centre_y + rng.randint(-4, 4)
+        idx = board.index(tile_x, tile_y)
+        if board.cells[idx] == EMPTY:
+            side = len(played) % 2
+            change = board.play(idx, side)
+            if board.is_win(idx, side): # keep the game going
+                board.undo(change, idx, side)
+            else:
+                played.append((idx, side))
+    return played
+
+def timed(function, repeat:int) -> float:
+    """ Microseconds per call, the best of 5 runs of repeat calls """
+    best = float('inf')
+    for _ in range(5):
+        start = perf_counter()
+        for _ in range(repeat):
+            function()
+        best = min(best, perf_counter() - start)
+    return best / repeat * 1e6
+
+def bench(backend:str, size:int, stones:int, depth:int, branch_factor:int, repeat:int) -> dict:
+    board = Board(size * 40, size * 40, 40, verbose=False, backend=backend)
+    Board(size * 40, size * 40, 40, verbose=False, backend=backend).play(board.index(0, 0), 0) # compile the kernels first
+    random_position(board, stones, seed=1)
+    empty = [idx for idx, _ in board.candidate_tiles()]
+
+    def play_undo():
+        for idx in empty[:10]:
+            board.undo(board.play(idx, 0), idx, 0)
+
+    results = {
+        'backend': board.backend,
+        'play+undo': timed(play_undo, repeat) / 10,
+        'get_chains': timed(lambda: board.get_chains(empty[0], 1), repeat),
+        'is_win': timed(lambda: board.is_win(board.history[-1][0], board.history[-1][1]), repeat),
+        'score_board': timed(lambda: board.score_board(board), repeat),
+    }
+
+    Player.PlayerNumber = 0
+    ai = AI(depth, branch_factor, ponder_width=0)
+    ai.mark = 'O' if board.side_to_move == 0 else 'X'
+    start = perf_counter()
+    with redirect_stdout(io.StringIO()):
+        move = ai.get_move_iterative_deepening(board, depth, branch_factor, float('inf'))
+    results['search'] = (perf_counter() - start) * 1e6
+    results['search_move'] = move
+    results['search_nodes'] = ai.num_states_searched
+    results['score'] = board.score_board(board)
+    return results
+
+def adaptive_nodes(size:int, stones:int, depth:int, branch_factor:int, positions:int) -> list:
+    """ The states a fixed and an adaptive get_move search, as (seed, fixed, adaptive) for seeds 1 to positions """
+    results = []
+    for seed in range(1, positions + 1):
+        nodes = []
+        for adaptive in (False, True):
+            board = Board(size * 40, size * 40, 40, verbose=False)
+            random_position(board, stones, seed)
+            ai = AI(depth, branch_factor, ponder_width=0, adaptive=adaptive)
+            ai.mark = 'O' if board.side_to_move == 0 else 'X'
+            with redirect_stdout(io.StringIO()):
+                ai.get_move(board, depth, branch_factor)
+            nodes.append(ai.num_states_searched)
+        results.append((seed, *nodes))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the board backends on their hot paths and a fixed search')
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--stones', type=int, default=20, help='random stones on the board before timing')
+    parser.add_argument('-d', '--depth', type=int, default=4)
+    parser.add_argument('-b', '--branch-factor', type=int, default=10)
+    parser.add_argument('-n', '--repeat', type=int, default=2000, help='calls per timing run')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--adaptive', type=int, default=0, metavar='N',
+                        help='compare the states of adaptive and fixed searches on N positions instead')
+    args = parser.parse_args()
+
+    if args.adaptive:
+        results = adaptive_nodes(args.size, args.stones, args.depth, args.branch_factor, args.adaptive)
+        if args.json:
+            print(json.dumps([{'seed': seed, 'fixed': fixed, 'adaptive': adaptive} for seed, fixed, adaptive in results]))
+            return
+        ratios = sorted(adaptive / fixed for _, fixed, adaptive in results)
+        for seed, fixed, adaptive in results:
+            print(f'seed {seed:>3}: {fixed:>8} -> {adaptive:>8} states ({adaptive / fixed:.2f}x)')
+        print(f'depth {args.depth}, {len(results)} positions: adaptive/fixed states min {ratios[0]:.2f}x, '
+              f'median {median(ratios):.2f}x, max {ratios[-1]:.2f}x, '
+              f'{sum(ratio < 1 for ratio in ratios)} fewer, {sum(ratio > 1 for ratio in ratios)} more')
+        print(f'total {sum(fixed for _, fixed, _ in results)} -> {sum(adaptive for _, _, adaptive in results)} states')
+        return
+
+    results = [bench(backend, args.size, args.stones, args.depth, args.branch_factor, args.repeat) for backend in BACKENDS]
+    reference = results[0]
+    for result in results[1:]:
+        if (result['search_move'], result['search_nodes'], result['score']) != \
+                (reference['search_move'], reference['search_nodes'], reference['score']):
+            raise SystemExit(f"The {result['backend']} backend disagrees with the python one!")
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    timings = ['play+undo', 'get_chains', 'is_win', 'score_board', 'search']
+    print(f"{'us per call':<14}" + ''.join(f'{result["backend"]:>12}' for result in results) + f'{"speedup":>10}')
+    for name in timings:
+        times = [result[name] for result in results]
+        print(f'{name:<14}' + ''.join(f'{t:>12.2f}' for t in times) + f'{times[0] / times[-1]:>9.1f}x')
+    print(f"search: depth {args.depth}, {reference['search_nodes']} nodes, same move {reference['search_move'][:2]} on every backend")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,102 +2,279 @@
 
 __author__ = 'Hoang Long Dang'
 
-from graphics import Point, Circle, GraphWin, Line, Text
+from bisect import insort
 from copy import deepcopy
 from typing import Tuple, TypeVar
+import json
+import struct
+from tables import get_tables, EMPTY, WALL
+# graphics opens a Tk window as soon as it is imported, so only the draw methods import it
 
 T = TypeVar('T')
 int_str = TypeVar('int_str', int, str)
 
+THREAT_VALUE = 10 # chain value of a tile that completes a four or an open three: 1 + (4 - 1)**2 or 1 + (3 - 0)**2
+
+# Internally a move is a cell index and a side: 0 for O (first player, maximizer), 1 for X.
+# A cell holds EMPTY, the stone of a side (side + 1) or WALL, which pads the grid so chains stop at the edges.
+MARKS = ('O', 'X')
+SIDES = {'O': 0, 'X': 1}
+CELL_MARKS = (0, 'O', 'X', 0)
+
+# Board.to_bytes layout: header, one stone byte per tile in reading order, then the history as one
+# uint16 per move (tile number * 2 + side), then optionally the chains of the tiles any chain reached: their
+# uint16 tile numbers, then 16 bytes per tile, O's 8 chains then X's. A chain value is 0 or 1 + m**2 for a
+# whole m no longer than the chain, so it fits a byte on any board still in play
+SNAPSHOT_MAGIC = b'GBD1'
+SNAPSHOT_HEADER = struct.Struct('<4sBBHHBBHII') # magic, version, flags, width, height, win length, side to move, tile size, moves, touched tiles
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CHAINS = 1 # flag: the chain state is included
+SPARSE_MAGIC = b'GSB1'
+SPARSE_HEADER = struct.Struct('<4sBBIIBBHII') # as SNAPSHOT_HEADER, with a width or height of 0 for an unbounded one
+
+BACKENDS = ('python', 'jit')
+
+# A weights file, written by tune.py: {"format": WEIGHTS_FORMAT, "weights": [...], ...}, the weight of a chain of each
+# effective length m = len_chain - blocked - opponent blocks from 0, which score_board counts instead of its value 1 + m**2
+WEIGHTS_FORMAT = 'gomoku-weights'
+
+def splitmix64(x:int) -> int:
+    """ Mix an int into a well spread 64-bit hash, for Zobrist keys that need no table """
+    z = x + 0x9e3779b97f4a7c15
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & 0xffffffffffffffff
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & 0xffffffffffffffff
+    return z ^ (z >> 31)
+
+class _Decayed(dict):
+    """ Maps a chain value 1 + m**2 to 1 + (m - 1)**2, what it becomes when the opponent blocks the chain """
+    def __missing__(self, value:int) -> int:
+        m = round((value - 1) ** (1/2))
+        decayed = self[value] = 1 + (m - 1)**2
+        return decayed
+
+DECAYED = _Decayed()
+
+class _ChainWeights(dict):
+    """ Maps a chain value 1 + m**2 to the weight of chains of effective length m, and no chain (0) to 0 """
+    def __init__(self, weights:list) -> None:
+        super().__init__({0: 0.0})
+        self.weights = weights
+
+    def __missing__(self, value:int) -> float:
+        m = round((value - 1) ** (1/2))
+        weight = self[value] = self.weights[min(m, len(self.weights) - 1)] # longer chains weigh as the longest given
+        return weight
+
+def default_weights(lengths:int=10) -> list:
+    """ The weights that score chains by their values: 1 + m**2 for m below lengths """
+    return [1.0 + m**2 for m in range(lengths)]
+
+def load_weights(path:str) -> list:
+    """ Read the chain weights of a weights file """
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get('format') != WEIGHTS_FORMAT or not data.get('weights'):
+        raise ValueError(f'{path} is not a weights file!')
+    return [float(weight) for weight in data['weights']]
+
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)] # down, diagonal down, right, diagonal up, ... anti clockwise
+
+# Threats: for each side, empty tile and line (the first 4 DIRECTIONS), what the side playing there makes on that line.
+# Board.threats gives, per side, the tiles at each level with the number of lines they make it on.
+THREAT_FOUR = 1 # one tile that would then win: the opponent must block it
+THREAT_OPEN_FOUR = 2 # two or more such tiles: the tile completes an open three, or a split one, into a four that cannot be blocked
+THREAT_FIVE = 3 # the tile wins
+
+def threat_level(segment:list, k:int, stone:int, win_length:int) -> int:
+    """ The threat stone makes on a line by playing its empty cell k: THREAT_FIVE, THREAT_OPEN_FOUR, THREAT_FOUR or 0
+    :param segment: the cells of the line, with a WALL at both ends
+    """
+    start = k - 1
+    while segment[start] == stone:
+        start -= 1
+    end = k + 1
+    while segment[end] == stone:
+        end += 1
+    run = end - start - 1
+    if run >= win_length:
+        return THREAT_FIVE
+
+    fives = 0 # empty tiles at either end of the run that would then win
+    if segment[start] == EMPTY:
+        far = start - 1
+        while segment[far] == stone:
+            far -= 1
+        fives += run + start - far >= win_length
+    if segment[end] == EMPTY:
+        far = end + 1
+        while segment[far] == stone:
+            far += 1
+        fives += run + far - end >= win_length
+    return THREAT_OPEN_FOUR if fives == 2 else fives
+
 class Tile():
     """
     Holds values for each tile in the board.
     Helper class for Board class
     """
     def __init__(self) -> None:
-        self.len_chains_X = [0] * 8 # down, diagonal down, right, diagonal up, up, etc. anti-clockwise
-        self.len_chains_O = [0] * 8
+        self.chains = ([0] * 8, [0] * 8) # per side, down, diagonal down, right, diagonal up, up, etc. anti-clockwise
 
-    def get_value_mark_place(self, j, mark):
-        if mark == 'X':
-            return self.len_chains_X[j]
-        else:
-            return self.len_chains_O[j]
+    @property
+    def len_chains_O(self) -> list:
+        return self.chains[0]
+
+    @property
+    def len_chains_X(self) -> list:
+        return self.chains[1]
 
     def get_value(self) -> int:
         """ return the value of a tile """
-        return self.get_value_mark('O') + self.get_value_mark('X')
+        return sum(self.chains[0]) - sum(self.chains[1])
+
+    def get_value_side(self, side:int) -> int:
+        """ return the value of a tile with respect to one player only, negative for X """
+        return -sum(self.chains[1]) if side else sum(self.chains[0])
 
     def get_value_mark(self, mark:str) -> int:
         """ return the value of a tile with respect to one player only """
-        if mark == 'X':
-            return sum(self.len_chains_X) * -1
-        else:
-            return sum(self.len_chains_O) * 1
+        return self.get_value_side(SIDES[mark])
+
+    def get_max_value_side(self, side:int) -> float:
+        """ return the value of the strongest chain through a tile for one player """
+        return max(self.chains[side])
+
+    def get_max_value_mark(self, mark:str) -> float:
+        """ return the value of the strongest chain through a tile for one player """
+        return self.get_max_value_side(SIDES[mark])
+
+    def get_value_mark_place(self, j:int, mark:str) -> int:
+        """ return the value of one player's chain through a tile in direction j """
+        return self.chains[SIDES[mark]][j]
+
+    def get_weighted_value(self, weights:dict) -> float:
+        """ return the value of a tile with its chains weighted by a board's chain_weights """
+        return sum(map(weights.__getitem__, self.chains[0])) - sum(map(weights.__getitem__, self.chains[1]))
+
+    def set_value(self, direct:int, side:int_str, val:int) -> None:
+        """ Set the value of the chain_length
+        :param side: 0 for O, 1 for X, or the mark 'O' or 'X' as before moves were encoded
+        """
+        self.chains[SIDES.get(side, side)][direct] = val
 
-    def set_value(self, direct:int_str, mark:str, val:int) -> None:
-        """ Set the value of the chain_length """
-        if isinstance(direct, int):
-            if mark == 'O': self.len_chains_O[direct] = val
-            else: self.len_chains_X[direct] = val
-        else:
-            if mark == 'O': self.len_chains_O[directions[direct]] = val
-            else: self.len_chains_X[directions[direct]] = val
-        
 
 class Board():
     """
     The Board class to instantiate the game, record player's moves,
-    and return the internal logic state for AI players
+    and return the internal logic state for AI players.
+    Tiles are stored as a flat list of cells padded by a ring of walls, so the search
+    works on single int moves and never needs to bounds-check a chain walk.
     """
 
-    ### UTILITY FUNCTIONS ### 
+    ### UTILITY FUNCTIONS ###
     def coord_tile_to_grid(self, tile_x:int, tile_y:int) -> Tuple[int, int]:
         """ Get the tile location and return pixel location """
         return (int((tile_x + 0.5) * self.tile_size), int((tile_y+0.5)*self.tile_size))
 
-    def get_chains_mark(self, source:tuple, mark:str, extended:int=2) -> list:
-        """ 
-        From source, get consecutive chains of a certain mark until terminated by empty
-        tiles or by a different mark. Return all empty tiles reachable this way and the length of the chain to it.
-        :param source: (tile_x, tile_y)
-        :param mark: 'X' or 'O'
-        if extended == 0:
-        :return: [ 8 (len_chain, (tile_x, tile_y)) tuples, except (0, None) if chain is terminated by tiles with opposite mark
-        else:
-        :return: [ 8 (len_chain, [(tile_x, tile_y) * extended]) tuples, except (0, []) if chain is terminated by tiles with opposite mark]
+    def index(self, tile_x:int, tile_y:int) -> int:
+        """ Get the cell index of a tile """
+        return (tile_y + self.offset) * self.stride + tile_x + self.offset
+
+    def coords(self, idx:int) -> Tuple[int, int]:
+        """ Get the tile coordinates of a cell index """
+        return (idx % self.stride - self.offset, idx // self.stride - self.offset)
+
+    def encode_move(self, move:tuple) -> Tuple[int, int]:
+        """ (tile_x, tile_y, mark) -> (cell index, side) """
+        tile_x, tile_y, mark = move
+        return self.index(tile_x, tile_y), SIDES[mark]
+
+    def decode_move(self, idx:int, side:int) -> tuple:
+        """ (cell index, side) -> (tile_x, tile_y, mark) """
+        tile_x, tile_y = self.coords(idx)
+        return (tile_x, tile_y, MARKS[side])
+
+    def mark_at(self, tile_x:int, tile_y:int) -> int_str:
+        """ The mark on a tile, or 0 if it is empty """
+        return CELL_MARKS[self.cells[self.index(tile_x, tile_y)]]
+
+    @property
+    def tiles(self) -> list:
+        """ The marks on the board as rows of 'X', 'O' or 0. Rebuilt on every access, so not for the search """
+        if self.width is None or self.height is None:
+            raise ValueError('An unbounded board has no grid of tiles!')
+        return [[self.mark_at(tile_x, tile_y) for tile_x in range(self.width)] for tile_y in range(self.height)]
+
+    def get_chains(self, idx:int, stone:int, extended:int=2) -> Tuple[list, list]:
         """
-        tile_x, tile_y = source
-        in_grid = lambda x=None, y=None: (len(self.tiles[0]) > x >= 0) and (len(self.tiles) > y >= 0)
-        directions = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)] # down, diagonal down, right, diagonal up, ... anti clockwise
-        cands = [0 for i in range(len(directions))]
-
-        changed = [[] for i in range(len(directions))]
-
-        for direct in range(8):
-            i, (x, y), line_len, num_reached = 1, directions[direct], 0, 0
-            while in_grid(x=tile_x+i*x, y=tile_y+i*y) and self.tiles[tile_y+i*y][tile_x+i*x] == mark:
-                line_len += 1
-                i += 1
-            while num_reached < extended:
-                if in_grid(x=tile_x+i*x, y=tile_y+i*y) and self.tiles[tile_y+i*y][tile_x+i*x] == 0: # this tile's value will be adjusted
-                    changed[direct].append((tile_x+i*x, tile_y+i*y))
-                    num_reached += 1
-                    i += 1
-                else:
-                    break
-            cands[direct] = line_len
+        From a cell, get consecutive chains of a stone in each direction until terminated by an empty
+        cell, a different stone or a wall. Also return the empty cells reachable just after each chain.
+        :param idx: cell index
+        :param stone: the cell value to follow (side + 1)
+        :param extended: maximum number of empty cells to collect after each chain
+        :return: ([8 chain lengths], [8 lists of up to `extended` empty cell indices])
+        """
+        cells = self.cells
+        lengths = [0] * 8
+        changed = [None] * 8
+
+        for direct, step in enumerate(self.steps):
+            cur = idx + step
+            while cells[cur] == stone:
+                cur += step
+            lengths[direct] = (cur - idx) // step - 1
+
+            reached = []
+            while len(reached) < extended and cells[cur] == EMPTY: # this tile's value will be adjusted
+                reached.append(cur)
+                cur += step
+            changed[direct] = reached
 
-        return [(cands[i], changed[i]) for i in range(8)]
+        return lengths, changed
 
     def get_bit_repr(self):
         return (self.tiles_X, self.tiles_O)
 
+    @property
+    def side_to_move(self) -> int:
+        """ 0 if O plays next, 1 if X does """
+        return 1 - self.history[-1][1] if self.history else 0
+
+    def in_grid(self, tile_x:int, tile_y:int) -> bool:
+        """ Whether a tile coordinate is on the board """
+        return (self.width > tile_x >= 0) and (self.height > tile_y >= 0)
+
+    def cell_key(self, idx:int) -> int:
+        """ The bits a stone on this cell toggles in tiles_X or tiles_O """
+        return 1 << idx
+
+    def candidate_tiles(self):
+        """ Yield (cell index, tile) for every empty tile, the moves a player can consider """
+        cells = self.cells
+        for idx, tile in enumerate(self.logic):
+            if tile is not None and cells[idx] == EMPTY:
+                yield idx, tile
+
     ### INSTANCE LOGIC METHODS ###
 
-    def __init__(self, window_width:int, window_height:int, tile_size:int, win_length:int=5, verbose:bool=True) -> None:
-        """ Initialize the game board with width, height, and tile-size """
-        
+    def __new__(cls, *args, backend:str='python', **kwargs) -> 'Board':
+        """ Board(..., backend='jit') makes an ArrayBoard if Numba is installed """
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown board backend {backend}, expected one of {BACKENDS}!')
+        if cls is Board and backend == 'jit':
+            from kernels import HAVE_JIT
+            if HAVE_JIT:
+                return super().__new__(ArrayBoard)
+        return super().__new__(cls)
+
+    def __init__(self, window_width:int, window_height:int, tile_size:int, win_length:int=5, verbose:bool=True, \
+                 backend:str='python', weights=None) -> None:
+        """ Initialize the game board with width, height, and tile-size
+        :param backend: 'python', or 'jit' to play, undo, check wins and score with compiled kernels (see ArrayBoard).
+                        Without Numba, 'jit' quietly falls back to 'python'; the board's backend attribute says which it got
+        :param weights: a weights file or list of chain weights for score_board (see set_weights), None for chain values
+        """
+
         # Make sure tile size is even
         if verbose: print("Making sure tile size is even...")
         tile_size += tile_size % 2 == 1
@@ -108,11 +285,25 @@ class Board():
         window_height = (window_height // tile_size) * tile_size
 
         # Initialize...
-        self.tiles = [[0] * len(range(tile_size // 2, window_width, tile_size)) for i in range(tile_size // 2, window_height, tile_size)]
-        self.logic = [[Tile() for j in range(len(self.tiles[0]))] for i in self.tiles] # 4 values for 4 directions a chain can take
+        self.width = window_width // tile_size
+        self.height = window_height // tile_size
+        self.win_length = win_length
+
+        # one column of walls is shared between the end of a row and the start of the next
+        self.stride = self.width + 1
+        self.offset = 1
+        self.steps = [dy * self.stride + dx for dx, dy in DIRECTIONS]
+        self.tables = get_tables(self.width, self.height, win_length) # shared by every board of this size
+
+        self.cells = list(self.tables.cells)
+        self.logic = [None] * len(self.cells)
+        for idx in self.tables.playable:
+            self.logic[idx] = Tile()
 
         self.num_tiles_placed = 0
-        self.total_num_tiles = len(self.tiles) * len(self.tiles[0]) 
+        self.total_num_tiles = self.width * self.height
+        self.history = [] # (cell index, side) of every stone played, in order
+        self.reset_threats()
 
         self.tiles_X = 0
         self.tiles_O = 0
@@ -122,78 +313,223 @@ class Board():
         self.tile_size = tile_size
         self.window = None
         self.logic_window = None
+        self.backend = 'python'
+        self.set_weights(weights)
+
+    def set_weights(self, weights) -> None:
+        """ Make score_board count tuned chain weights instead of chain values. The chains themselves, and so
+        move ordering, threats and snapshots, are unchanged: a snapshot never holds the weights, a pickle does.
+        :param weights: a weights file written by tune.py, the weight of a chain of each effective length m from 0
+                        (default_weights gives the values 1 + m**2), or None to score chain values
+        """
+        if isinstance(weights, str):
+            weights = load_weights(weights)
+        self.weights = None if weights is None else [float(weight) for weight in weights]
+        self.chain_weights = None if weights is None else _ChainWeights(self.weights)
+
+    def copy(self) -> 'Board':
+        """ Return a copy of the board without its windows, e.g. for searching in another thread """
+        board = type(self).__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        board.cells = self.cells[:]
+        board.logic = deepcopy(self.logic)
+        board.history = self.history[:]
+        board.reset_threats()
+        board.window = None
+        board.logic_window = None
+        return board
 
-    def check_win(self, move:tuple, win_length:int=5) -> Tuple[bool, Tuple[tuple, tuple]]:
-        """ Check if a move wins the game 
+    @classmethod
+    def from_moves(cls, moves:list, width:int=15, height:int=15, tile_size:int=40, win_length:int=5) -> 'Board':
+        """ Build a board from a list of (tile_x, tile_y, mark) moves in one vectorized pass (see bulk.py).
+        The logic state is identical to playing the moves one by one with update_board.
+        :param width, height: size of the board in tiles
+        """
+        from bulk import load_boards
+        return load_boards([moves], width, height, tile_size, win_length)[0]
+
+    @classmethod
+    def from_grid(cls, grid:list, tile_size:int=40, win_length:int=5) -> 'Board':
+        """ Build a board from rows of 'X', 'O' or 0.
+        A grid does not say in which order its stones were played, so they are taken in reading order,
+        alternating O and X. O must have as many stones as X, or one more.
+        """
+        from bulk import grid_to_moves
+        return cls.from_moves(grid_to_moves(grid), len(grid[0]), len(grid), tile_size, win_length)
+
+    ### SERIALIZATION ###
+
+    def to_bytes(self, chains:bool=True) -> bytes:
+        """ Encode the position as a compact snapshot, a few hundred bytes for a 15x15 board
+        :param chains: include the logic state, about 18 bytes per tile near a stone. Without it, from_bytes
+                       replays the history instead, which is slower to decode but much smaller
+        """
+        width, height = self.width, self.height
+        if width * height > 1 << 15:
+            raise ValueError('Boards larger than 32768 tiles cannot be encoded!')
+
+        cells, logic, numbers = self.cells, self.logic, self.tables.numbers
+        rows = self.tables.playable[::width]
+
+        history = [numbers[idx] << 1 | side for idx, side in self.history]
+        touched, values = [], []
+        if chains:
+            for idx, tile in enumerate(logic):
+                if tile is not None and (any(tile.chains[0]) or any(tile.chains[1])):
+                    touched.append(numbers[idx])
+                    values += tile.chains[0]
+                    values += tile.chains[1]
+
+        try:
+            values = bytes(values)
+        except ValueError:
+            raise ValueError('A chain is too long to encode, use chains=False!') from None
+
+        return b''.join([
+            SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SNAPSHOT_CHAINS if chains else 0, width, height,
+                                 self.win_length, self.side_to_move, self.tile_size, len(history), len(touched)),
+            *[bytes(cells[row:row + width]) for row in rows],
+            struct.pack(f'<{len(history)}H', *history),
+            struct.pack(f'<{len(touched)}H', *touched),
+            values,
+        ])
+
+    @classmethod
+    def from_bytes(cls, data:bytes) -> 'Board':
+        """ Decode a snapshot made by to_bytes. data can be any buffer, e.g. a memoryview of shared memory """
+        data = memoryview(data)
+        magic, version, flags, width, height, win_length, _, tile_size, num_moves, num_touched = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f'Not a board snapshot (version {SNAPSHOT_VERSION})!')
+
+        board = cls.__new__(cls)
+        board.width, board.height, board.win_length = width, height, win_length
+        board.stride, board.offset = width + 1, 1
+        board.steps = [dy * board.stride + dx for dx, dy in DIRECTIONS]
+        board.tables = tables = get_tables(width, height, win_length)
+        board.total_num_tiles = width * height
+        board.tile_size = tile_size
+        board.window_width, board.window_height = width * tile_size, height * tile_size
+        board.window = None
+        board.logic_window = None
+        board.backend = 'python'
+        board.set_weights(None)
+        board.reset_threats()
+
+        playable = tables.playable # tile number -> cell index
+        cells = list(tables.cells)
+        logic = [None] * len(cells)
+        for idx in playable:
+            logic[idx] = Tile()
+
+        pos = SNAPSHOT_HEADER.size
+        stones = data[pos:pos + board.total_num_tiles]
+        pos += board.total_num_tiles
+        history = [(playable[move >> 1], move & 1) for move in struct.unpack_from(f'<{num_moves}H', data, pos)]
+        pos += 2 * num_moves
+
+        if flags & SNAPSHOT_CHAINS:
+            for number, stone in enumerate(stones):
+                if stone:
+                    cells[playable[number]] = stone
+            board.cells, board.logic = cells, logic
+            board.history = history
+            board.num_tiles_placed = len(history)
+            board.tiles_X = board.tiles_O = 0
+            for idx, side in history:
+                if side:
+                    board.tiles_X ^= board.cell_key(idx)
+                else:
+                    board.tiles_O ^= board.cell_key(idx)
+
+            touched = struct.unpack_from(f'<{num_touched}H', data, pos)
+            pos += 2 * num_touched
+            values = list(data[pos:pos + 16 * num_touched])
+            for i, number in enumerate(touched):
+                logic[playable[number]].chains = (values[16 * i:16 * i + 8], values[16 * i + 8:16 * i + 16])
+        else:
+            board.cells, board.logic = cells, logic
+            board.history = []
+            board.num_tiles_placed = 0
+            board.tiles_X = board.tiles_O = 0
+            for idx, side in history:
+                board.play(idx, side)
+
+        return board
+
+    def __getstate__(self):
+        """ Pickle as a snapshot, and the weights if any: no Tile objects, and no windows, which cannot be pickled """
+        return self.to_bytes() if self.weights is None else (self.to_bytes(), self.weights)
+
+    def __setstate__(self, state) -> None:
+        data, weights = state if isinstance(state, tuple) else (state, None)
+        self.__dict__.update(type(self).from_bytes(data).__dict__)
+        self.set_weights(weights)
+
+    def check_win(self, move:tuple, win_length:int=None) -> Tuple[bool, Tuple[tuple, tuple]]:
+        """ Check if a move wins the game
         :param move: a valid move: (selected_tile.x_pos, selected_tile.y_pos, player.mark)
-        :win_length: length of winning streak
+        :win_length: length of winning streak, defaults to the board's
         :return: a boolean value, a pair of tile-coordinates for the winning line (none if move doesn't win the game)
         """
-        tile_x, tile_y, mark = move
-        in_grid = lambda x=None, y=None: (len(self.tiles[0]) > x >= 0) and (len(self.tiles) > y >= 0)
-
-        for x, y in [(1, 0), (0, 1), (1, -1), (1, 1)]: # For each pattern: vertical (only y change), horizontal (only x change), diagonal ...
-            
-            cand = []
-            for i in range(-win_length+1, win_length):
-                new_y = tile_y + i*y
-                new_x = tile_x + i*x
-                if in_grid(x=new_x,y=new_y) :
-                    cand.append((self.tiles[new_y][new_x], (new_x, new_y)))
-
-            # check if there are consecutives of mark of win_length in cand:
-            if len(cand) >= win_length:
-                for i in range(win_length):
-                    seq = cand[i:i+win_length]
-                    seq_mark = [x[0] for x in seq]
-                    try:
-                        seq_start = seq[0][1]
-                        seq_end = seq[-1][1]
-                    except:
-                        breakpoint()
-                    
-                    if seq_mark == [mark] * win_length:
-                        return True, (seq_start, seq_end)
-        
-        return False, None
+        idx, side = self.encode_move(move)
+        line = self.winning_line(idx, side, win_length)
+        if line is None:
+            return False, None
+        return True, (self.coords(line[0]), self.coords(line[1]))
+
+    def winning_line(self, idx:int, side:int, win_length:int=None) -> Tuple[int, int]:
+        """ Return the end cells of the line of at least win_length stones through a cell, or None """
+        win_length = self.win_length if win_length is None else win_length
+        cells, stone = self.cells, side + 1
+
+        for direct in range(4): # the other four directions are the same lines walked backwards
+            step = self.steps[direct]
+            end = idx + step
+            while cells[end] == stone:
+                end += step
+            start = idx - step
+            while cells[start] == stone:
+                start -= step
+            if (end - start) // step - 1 >= win_length:
+                return (start + step, end - step)
+
+        return None
+
+    def is_win(self, idx:int, side:int) -> bool:
+        """ Whether the stone on a cell is part of a winning line """
+        return self.winning_line(idx, side) is not None
 
     def check_legal(self, move:T) -> bool:
         """ Check whether a move is legal
         :param move: any value
         :return: True if move is legal, False otherwise
         """
-        in_grid = lambda x, y: (len(self.tiles) > y >= 0) and (len(self.tiles[0]) > x >= 0)
+        in_grid = self.in_grid
         try:
             assert isinstance(move, tuple)
             assert len(move) == 3
-            assert isinstance(move[-1], str)
+            assert move[-1] in SIDES
             assert isinstance(move[0], int)
             assert isinstance(move[1], int)
 
-            assert in_grid(move[0], move[1]) == True 
+            assert in_grid(move[0], move[1]) == True
         except:
             return False
 
-        return self.tiles[move[1]][move[0]] == 0
+        return self.cells[self.index(move[0], move[1])] == EMPTY
 
     def check_full(self):
         return self.num_tiles_placed == self.total_num_tiles
 
     def update_board(self, move:tuple, graphic:bool=True, logic:bool=True) -> list:
-        """ Update the board based on a move. Can update graphically, logically, or either. 
+        """ Update the board based on a move. Can update graphically, logically, or either.
         :param move: a legal move: (selected_tile.x_pos, selected_tile.y_pos, player.mark)
         :param graphic: if true (and there is a window), draw move
         :param logic: if true, update the board's logic state
-        :return: List of update tiles and their original states (for the mark)
+        :return: List of updated cells and their original states, as returned by play
         """
-
-        tile_x, tile_y, mark = move
-        self.num_tiles_placed += 1
-    
-        if mark == 'O':
-            self.tiles_O |= 1 << (tile_y * (self.window_width // self.tile_size) + tile_x)
-        else:
-            self.tiles_X |= 1 << (tile_y * (self.window_width // self.tile_size) + tile_x)
+        idx, side = self.encode_move(move)
 
         # update graphic
         if graphic and self.window:
@@ -201,122 +537,242 @@ class Board():
 
         # update logic
         if logic:
-            self.tiles[tile_y][tile_x] = mark
-            nxt_mark = 'X' if mark == 'O' else 'O'
-            
-            same_chains = self.get_chains_mark((tile_x, tile_y), mark)
-            same_changed = [x[1] for x in same_chains]
-
-            diff_chains = self.get_chains_mark((tile_x, tile_y), nxt_mark)
-            diff_changed = [x[1] if 4 > x[0] > 0 else [] for x in diff_chains]
-
-            orig = []
-            
-            for i in range(8):
-                j = i + 4 if i < 4 else i - 4
-
-                same = len(same_changed[i]) != 0
-                changed = same_changed[i] if same else diff_changed[i]
-                if same:
-                    len_chain = same_chains[i][0] + same_chains[j][0] + 1 
-                    blocked = len(same_changed[j]) == 0
+            return self.play(idx, side)
+
+        self.num_tiles_placed += 1
+        if side:
+            self.tiles_X ^= self.cell_key(idx)
+        else:
+            self.tiles_O ^= self.cell_key(idx)
+        return [(None, None, None)]
+
+    def play(self, idx:int, side:int) -> list:
+        """ Place a stone of side on a cell and update the board's logic state
+        :param idx: cell index of an empty tile
+        :param side: 0 for O, 1 for X
+        :return: List of (cell index, original O chains, original X chains) for the updated tiles
+        """
+        cells, logic, decayed = self.cells, self.logic, DECAYED
+        stone, nxt_side = side + 1, 1 - side
+
+        cells[idx] = stone
+        self.num_tiles_placed += 1
+        self.history.append((idx, side))
+        if side:
+            self.tiles_X ^= self.cell_key(idx)
+        else:
+            self.tiles_O ^= self.cell_key(idx)
+
+        same_lens, same_changed = self.get_chains(idx, stone)
+        diff_lens, diff_changed = self.get_chains(idx, 2 - side)
 
-                for f in range(len(changed)):
-                    (c_x, c_y) = changed[f]
-                    tile = self.logic[c_y][c_x]
-                    orig.append(((c_x, c_y), [deepcopy(tile.len_chains_O), deepcopy(tile.len_chains_X)]))
+        orig = []
 
-                    if same:
-                        tile.set_value(j, mark, 1 + (len_chain - blocked)**2)
+        for i in range(8):
+            j = i + 4 if i < 4 else i - 4
 
-                    if tile.get_value_mark_place(i, nxt_mark)  > 0:
-                        n = (tile.get_value_mark_place(i, nxt_mark) - 1) ** (1/2)
-                        tile.set_value(i, nxt_mark, (n-1)**2 + 1)
-                    if tile.get_value_mark_place(j, nxt_mark)  > 0:
-                        n = (tile.get_value_mark_place(j, nxt_mark) - 1) ** (1/2)
-                        tile.set_value(j, nxt_mark, (n-1)**2 + 1)
+            changed = same_changed[i]
+            same = len(changed) != 0
+            if same:
+                len_chain = same_lens[i] + same_lens[j] + 1
+                blocked = len(same_changed[j]) == 0
+                value = 1 + (len_chain - blocked)**2
+            elif 4 > diff_lens[i] > 0:
+                changed = diff_changed[i]
 
-            return orig
+            for c_idx in changed:
+                chains = logic[c_idx].chains
+                orig.append((c_idx, chains[0][:], chains[1][:]))
+
+                if same:
+                    chains[side][j] = value
 
-        return [(None, None)]
+                nxt_chains = chains[nxt_side]
+                if nxt_chains[i] > 0:
+                    nxt_chains[i] = decayed[nxt_chains[i]]
+                if nxt_chains[j] > 0:
+                    nxt_chains[j] = decayed[nxt_chains[j]]
+
+        return orig
 
     def undo_change(self, change:list, move:tuple) -> None:
         """ Undo the list of changes made by update_board """
-        tile_x, tile_y, mark = move
-        self.tiles[tile_y][tile_x] = 0
+        self.undo(change, *self.encode_move(move))
+
+    def undo(self, change:list, idx:int, side:int) -> None:
+        """ Undo the list of changes made by play """
+        self.cells[idx] = EMPTY
         self.num_tiles_placed -= 1
-        
-        if mark == 'O':
-            self.tiles_O &= ~(1 << (tile_y * (self.window_width // self.tile_size) + tile_x))
+        self.history.pop()
+        if self.threat_done > len(self.history):
+            self.revert_threats()
+
+        if side:
+            self.tiles_X ^= self.cell_key(idx)
         else:
-            self.tiles_X &= ~(1 << (tile_y * (self.window_width // self.tile_size) + tile_x))
-        
-        for (tile_x, tile_y), [states_O, states_X] in change:
-            self.logic[tile_y][tile_x].len_chains_O = states_O
-            self.logic[tile_y][tile_x].len_chains_X = states_X
+            self.tiles_O ^= self.cell_key(idx)
+
+        logic = self.logic
+        for c_idx, states_O, states_X in change:
+            logic[c_idx].chains = (states_O, states_X)
 
         return
 
+    ### THREATS ###
+
+    def reset_threats(self) -> None:
+        """ Forget the threat state: threats rebuilds it from the whole history when next asked """
+        self.threat_levels = ({}, {}) # per side: cell index * 4 + line -> threat level, for the tiles above 0
+        self.threat_tiles = tuple(tuple({} for _ in range(THREAT_FIVE)) for _ in range(2)) # per side and level - 1: cell index -> lines
+        self.threat_done = 0 # moves of the history the threat state is up to date with
+        self.threat_updates = [] # (first move, [(side, key, old level)]) of each update, to undo it
+
+    def threats(self, side:int) -> Tuple[dict, dict, dict]:
+        """ The tiles where side would win, make an open four, and make a four, as dicts of cell index -> number of lines.
+        Kept up to date lazily: the moves played since the last call are taken into account now, so play stays as
+        cheap as it was and the positions a search only scores never pay for threats.
+        """
+        if self.threat_done < len(self.history):
+            self.update_threats()
+        fours, open_fours, fives = self.threat_tiles[side]
+        return fives, open_fours, fours
+
+    def update_threats(self) -> None:
+        """ Bring the threat state up to date with the moves played since the last update, as one undoable update """
+        changes = []
+        for idx, _ in self.history[self.threat_done:]:
+            self.update_lines(idx, changes)
+        self.threat_updates.append((self.threat_done, changes))
+        self.threat_done = len(self.history)
+
+    def revert_threats(self) -> None:
+        """ Undo the last update, whose moves are taken back or will be taken into account again by the next one """
+        self.threat_done, changes = self.threat_updates.pop()
+        for side, key, old in reversed(changes):
+            self.set_threat(side, key, self.threat_levels[side].get(key, 0), old)
+
+    def set_threat(self, side:int, key:int, old:int, new:int) -> None:
+        levels, tiles = self.threat_levels[side], self.threat_tiles[side]
+        idx = key >> 2
+        if old:
+            at_level = tiles[old - 1]
+            if at_level[idx] == 1:
+                del at_level[idx]
+            else:
+                at_level[idx] -= 1
+        if new:
+            levels[key] = new
+            at_level = tiles[new - 1]
+            at_level[idx] = at_level.get(idx, 0) + 1
+        else:
+            del levels[key]
+
+    def line_segment(self, idx:int, step:int, centre:int) -> list:
+        """ The cells less than centre steps away from a cell on its line, then walls: past the edges and at both ends """
+        cells = self.cells
+        segment = [WALL] * (2 * centre + 1)
+        segment[centre] = cells[idx]
+        for direction in (1, -1):
+            cur = idx
+            for k in range(1, centre):
+                cur += direction * step
+                cell = cells[cur]
+                if cell == WALL:
+                    break
+                segment[centre + direction * k] = cell
+        return segment
+
+    def update_lines(self, idx:int, changes:list) -> None:
+        """ Recompute the threat levels of the tiles on the four lines through a cell that was just played
+        :param changes: (side, key, old level) of every level changed are appended to it
+        """
+        win_length = self.win_length
+        reach = win_length - 1 # a threat at a tile only depends on the cells this close to it on its line
+        centre = 2 * reach + 1
+        for line, step in enumerate(self.steps[:4]):
+            segment = self.line_segment(idx, step, centre)
+            for side in (0, 1):
+                stone, levels = side + 1, self.threat_levels[side]
+                threatening = segment.count(stone) >= win_length - 2 # otherwise no tile on the line makes even a four
+                if not threatening and not levels:
+                    continue
+                for k in range(centre - reach, centre + reach + 1):
+                    cell = segment[k]
+                    if cell != EMPTY and k != centre: # walls, and stones, whose levels went when they were played
+                        continue
+                    key = (idx + (k - centre) * step) << 2 | line
+                    new = threat_level(segment, k, stone, win_length) if threatening and cell == EMPTY else 0
+                    old = levels.get(key, 0)
+                    if new != old:
+                        changes.append((side, key, old))
+                        self.set_threat(side, key, old, new)
+
     @staticmethod
     def score_board(board:'Board') -> float:
         """ Score the board value for the first player O. the higher the better """
         score = 0
-        for y in range(len(board.logic)):
-            for x in range(len(board.logic[0])):
-                score += board.logic[y][x].get_value() 
-        try:
+        weights = board.chain_weights
+        if weights is not None:
+            for tile in board.logic:
+                if tile is not None:
+                    score += tile.get_weighted_value(weights)
             return float(score)
-        except:
-            breakpoint()
+        for tile in board.logic:
+            if tile is not None:
+                score += tile.get_value()
+        return float(score)
 
     @staticmethod
     def score_move(board: 'Board', move: tuple) -> float:
         """ Score the value of a move """
-        changed = board.update_board(move, graphic=False)
-        # res = Board.score_board(board)
-        res = sum([board.logic[change[0][1]][change[0][0]].get_value() for change in changed])
-        board.undo_change(changed, move)
+        idx, side = board.encode_move(move)
+        changed = board.play(idx, side)
+        res = sum([board.logic[change[0]].get_value() for change in changed])
+        board.undo(changed, idx, side)
         return res
 
     ### INSTANCE DRAW METHODS ###
 
     def draw_grid(self, logic:bool=False) -> None:
         """ Draw the board's grid """
+        from graphics import Point, Line
         window = self.window if not logic else self.logic_window
         if window is not None:
-            # draw horizontals:
-            for i in range(self.tile_size, self.window_height, self.tile_size):
-                row_y = i
-                line = Line(Point(0,row_y), Point(self.window_width, row_y))
-                line.setOutline('black')
-                line.setWidth(2)
-                line.draw(window)
-
-            # draw verticals
-            for i in range(self.tile_size, self.window_width, self.tile_size):
-                col_x = i
-                line = Line(Point(col_x, 0), Point(col_x, self.window_height))
-                line.setOutline('black')
-                line.setWidth(2)
-                line.draw(window)
+            with window.batch(): # one window update for the whole grid, not one per line
+                # draw horizontals:
+                for i in range(self.tile_size, self.window_height, self.tile_size):
+                    row_y = i
+                    line = Line(Point(0,row_y), Point(self.window_width, row_y))
+                    line.setOutline('black')
+                    line.setWidth(2)
+                    line.draw(window)
+
+                # draw verticals
+                for i in range(self.tile_size, self.window_width, self.tile_size):
+                    col_x = i
+                    line = Line(Point(col_x, 0), Point(col_x, self.window_height))
+                    line.setOutline('black')
+                    line.setWidth(2)
+                    line.draw(window)
 
     def draw_mark(self, move:tuple) -> None:
-        """ Draw a mark as specified by a move 
+        """ Draw a mark as specified by a move
         :param move: a legal move: (selected_tile.x_pos, selected_tile.y_pos, player.mark)
         :return: none
         """
+        from graphics import Point, Circle, Line
 
         if self.window is None:
             raise ValueError('Board has no open window!')
 
         tile_x, tile_y, mark = move
-        
+
         grid_x, grid_y = self.coord_tile_to_grid(tile_x, tile_y)
 
         rad = self.tile_size * 0.3
 
         if mark == 'O':
-            cir = Circle(Point(grid_x, grid_y), rad) 
+            cir = Circle(Point(grid_x, grid_y), rad)
             cir.setOutline('blue')
             cir.setWidth(3)
             cir.draw(self.window)
@@ -327,18 +783,20 @@ class Board():
             downstroke.setWidth(3)
             upstroke.setOutline('red')
             upstroke.setWidth(3)
-            upstroke.draw(self.window)
-            downstroke.draw(self.window)
-    
+            with self.window.batch():
+                upstroke.draw(self.window)
+                downstroke.draw(self.window)
+
     def draw_winning_line(self, start:tuple, end:tuple) -> None:
         """ Draw a line through the winning series of marks """
+        from graphics import Point, Line
 
         if self.window is None:
             raise ValueError("Board does not have an open window!")
 
         start_x, start_y = self.coord_tile_to_grid(start[0], start[1])
         end_x, end_y = self.coord_tile_to_grid(end[0], end[1])
-        
+
         pt1 = Point(start_x, start_y)
         pt2 = Point(end_x, end_y)
 
@@ -349,22 +807,427 @@ class Board():
 
     def draw_logic_state(self) -> None:
         """ Draw the logic state of the board """
+        from graphics import Point, GraphWin, Text
         self.logic_window = GraphWin("Logic states", self.window_width, self.window_height)
-        self.draw_grid(logic=True)
-        for y in range(len(self.tiles)):
-            for x in range(len(self.tiles[0])):
-                grid_x, grid_y = self.coord_tile_to_grid(x, y)
+        with self.logic_window.batch():
+            self.draw_grid(logic=True)
+            for y in range(self.height):
+                for x in range(self.width):
+                    grid_x, grid_y = self.coord_tile_to_grid(x, y)
+                    tile = self.logic[self.index(x, y)]
 
-                # tile_val_txt = Text(Point(grid_x, grid_y), "{:.1f}".format(sum(self.logic[y][x])))
-                tile_val_txt = Text(Point(grid_x, grid_y), "{}, {}".format(int(sum(self.logic[y][x].len_chains_O)), -int(sum(self.logic[y][x].len_chains_X))))
-                tile_val_txt.setSize(15)
-                tile_val_txt.setFace('courier')
-                tile_val_txt.draw(self.logic_window)
+                    tile_val_txt = Text(Point(grid_x, grid_y), "{}, {}".format(int(sum(tile.len_chains_O)), -int(sum(tile.len_chains_X))))
+                    tile_val_txt.setSize(15)
+                    tile_val_txt.setFace('courier')
 
-                if isinstance(self.tiles[y][x], str):
-                    color = 'red' if self.tiles[y][x] == 'X' else 'blue'
-                    tile_val_txt.setTextColor(color)
+                    mark = self.mark_at(x, y)
+                    if isinstance(mark, str):
+                        color = 'red' if mark == 'X' else 'blue'
+                        tile_val_txt.setTextColor(color)
 
+                    tile_val_txt.draw(self.logic_window)
 
         self.logic_window.getMouse()
-        self.logic_window.close()
\ No newline at end of file
+        self.logic_window.close()
+
+
+class _ArrayTile(Tile):
+    """ ArrayBoard.logic: a Tile whose chains are a row of its board's arrays """
+    def __init__(self, values, sums, idx:int) -> None:
+        self.values = values # the board's chain_values and chain_sums
+        self.sums = sums
+        self.idx = idx
+
+    @property
+    def chains(self) -> tuple:
+        """ A copy of the chains as lists: assign to chains to change them """
+        return (self.values[self.idx, 0].tolist(), self.values[self.idx, 1].tolist())
+
+    @chains.setter
+    def chains(self, chains:tuple) -> None:
+        self.values[self.idx] = chains
+        self.sums[self.idx] = self.values[self.idx].sum(axis=1)
+
+    def get_value(self) -> int:
+        return self.sums.item(self.idx, 0) - self.sums.item(self.idx, 1)
+
+    def get_value_side(self, side:int) -> int:
+        return -self.sums.item(self.idx, 1) if side else self.sums.item(self.idx, 0)
+
+    def get_max_value_side(self, side:int) -> float:
+        return max(self.values[self.idx, side].tolist())
+
+    def set_value(self, direct:int, side:int_str, val:int) -> None:
+        side = SIDES.get(side, side)
+        self.sums[self.idx, side] += val - self.values[self.idx, side, direct]
+        self.values[self.idx, side, direct] = val
+
+
+class ArrayBoard(Board):
+    """
+    A Board whose cells and chains are numpy arrays, so that play, undo, is_win and score_board run as
+    kernels compiled by Numba (see kernels.py), with the same results as Board.
+    Made by Board(..., backend='jit'). Its logic holds views that read and write the arrays, so code
+    written for Board works unchanged. Like Board, it expects moves to be undone last played first.
+    """
+    def __init__(self, window_width:int, window_height:int, tile_size:int, win_length:int=5, verbose:bool=True, \
+                 backend:str='jit', weights=None) -> None:
+        super().__init__(window_width, window_height, tile_size, win_length, verbose, weights=weights)
+        self.to_arrays()
+
+    @classmethod
+    def from_board(cls, board:Board) -> 'ArrayBoard':
+        """ An ArrayBoard in the same position as a Board """
+        array_board = cls.__new__(cls)
+        array_board.__dict__.update(board.__dict__)
+        array_board.history = board.history[:]
+        array_board.reset_threats()
+        array_board.window = None
+        array_board.logic_window = None
+        array_board.to_arrays()
+        return array_board
+
+    @classmethod
+    def from_bytes(cls, data:bytes) -> 'ArrayBoard':
+        return cls.from_board(Board.from_bytes(data))
+
+    def to_arrays(self) -> None:
+        """ Replace the cell and Tile lists Board keeps with arrays """
+        import numpy as np
+        import kernels
+
+        self.kernels = kernels
+        self.backend = 'jit'
+        self.cells = np.array(self.cells, dtype=np.int8)
+        self.chain_values = np.zeros((len(self.cells), 2, 8), dtype=np.int64) # cell index, side, direction -> chain value
+        for idx, tile in enumerate(self.logic):
+            if tile is not None:
+                self.chain_values[idx] = tile.chains
+        self.chain_sums = self.chain_values.sum(axis=2) # cell index, side -> tile value
+        self.logic = self.array_tiles()
+        self.step_array = np.array(self.steps, dtype=np.int64)
+
+        self.undo_stack = np.zeros((1024, kernels.UNDO_ROW), dtype=np.int64) # rows pushed by the kernels' play
+        self.undo_frames = [] # (first row, change list) of each move whose rows are on the stack, oldest first
+        self.set_weights(self.weights)
+
+    def set_weights(self, weights) -> None:
+        import numpy as np
+        super().set_weights(weights)
+        self.weight_array = None # chain value -> weight, for every value a chain on this board can have
+        if self.chain_weights is not None:
+            longest = max(self.width, self.height)
+            self.weight_array = np.array([self.chain_weights[value] for value in range(2 + longest**2)])
+
+    def array_tiles(self) -> list:
+        values, sums = self.chain_values, self.chain_sums
+        return [None if tile is None else _ArrayTile(values, sums, idx) for idx, tile in enumerate(self.logic)]
+
+    def copy(self) -> 'ArrayBoard':
+        board = type(self).__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        board.cells = self.cells.copy()
+        board.chain_values = self.chain_values.copy()
+        board.chain_sums = self.chain_sums.copy()
+        board.logic = board.array_tiles()
+        board.undo_stack = self.undo_stack.copy()
+        board.undo_frames = self.undo_frames[:]
+        board.history = self.history[:]
+        board.reset_threats()
+        board.window = None
+        board.logic_window = None
+        return board
+
+    def get_chains(self, idx:int, stone:int, extended:int=2) -> Tuple[list, list]:
+        import numpy as np
+        lengths, num_reached = np.empty(8, dtype=np.int64), np.empty(8, dtype=np.int64)
+        reached = np.empty((8, max(extended, 1)), dtype=np.int64)
+        self.kernels.get_chains(self.cells, self.step_array, idx, stone, extended, lengths, reached, num_reached)
+        return lengths.tolist(), [reached[direct, :count].tolist() for direct, count in enumerate(num_reached.tolist())]
+
+    def candidate_tiles(self):
+        logic = self.logic
+        for idx in (self.cells == EMPTY).nonzero()[0].tolist():
+            yield idx, logic[idx]
+
+    def play(self, idx:int, side:int) -> list:
+        self.num_tiles_placed += 1
+        self.history.append((idx, side))
+        if side:
+            self.tiles_X ^= self.cell_key(idx)
+        else:
+            self.tiles_O ^= self.cell_key(idx)
+
+        frames = self.undo_frames
+        top = frames[-1][0] + len(frames[-1][1]) if frames else 0
+        if top + 16 > len(self.undo_stack): # a move changes at most 2 tiles in each of 8 directions
+            self.undo_stack.resize((2 * len(self.undo_stack), self.undo_stack.shape[1]), refcheck=False)
+        count = self.kernels.play(self.cells, self.chain_values, self.chain_sums, self.step_array, idx, side, self.undo_stack, top)
+
+        change = [(row[0], row[1:9], row[9:17]) for row in self.undo_stack[top:top + count].tolist()]
+        frames.append((top, change))
+        return change
+
+    def undo(self, change:list, idx:int, side:int) -> None:
+        self.num_tiles_placed -= 1
+        self.history.pop()
+        if self.threat_done > len(self.history):
+            self.revert_threats()
+        if side:
+            self.tiles_X ^= self.cell_key(idx)
+        else:
+            self.tiles_O ^= self.cell_key(idx)
+
+        frames = self.undo_frames
+        if frames and frames[-1][1] is change:
+            start, _ = frames.pop()
+            self.kernels.undo(self.cells, self.chain_values, self.chain_sums, idx, self.undo_stack, start, start + len(change))
+        else: # played before the board had arrays
+            self.cells[idx] = EMPTY
+            logic = self.logic
+            for c_idx, states_O, states_X in change:
+                logic[c_idx].chains = (states_O, states_X)
+
+    def line_segment(self, idx:int, step:int, centre:int) -> list:
+        read = self.cells.item # a plain int, which the threat code compares much faster than a numpy one
+        segment = [WALL] * (2 * centre + 1)
+        segment[centre] = read(idx)
+        for direction in (1, -1):
+            cur = idx
+            for k in range(1, centre):
+                cur += direction * step
+                cell = read(cur)
+                if cell == WALL:
+                    break
+                segment[centre + direction * k] = cell
+        return segment
+
+    def winning_line(self, idx:int, side:int, win_length:int=None) -> Tuple[int, int]:
+        win_length = self.win_length if win_length is None else win_length
+        start, end = self.kernels.winning_line(self.cells, self.step_array, idx, side + 1, win_length)
+        return None if start < 0 else (start, end)
+
+    @staticmethod
+    def score_board(board:'ArrayBoard') -> float:
+        if board.weight_array is not None:
+            return float(board.kernels.score_weighted(board.chain_values, board.weight_array))
+        return float(board.kernels.score_board(board.chain_sums))
+
+
+class _SparseCells(dict):
+    """ SparseBoard.cells: missing cells read as empty (or as walls past the edges), and emptied cells are dropped """
+    def __init__(self, board:'SparseBoard') -> None:
+        super().__init__()
+        self.board = board
+
+    def __missing__(self, idx:int) -> int:
+        if self.board.bounded and not self.board.in_grid(*self.board.coords(idx)):
+            return WALL
+        return EMPTY
+
+    def __setitem__(self, idx:int, stone:int) -> None:
+        if stone == EMPTY:
+            self.pop(idx, None)
+        else:
+            super().__setitem__(idx, stone)
+
+class _SparseLogic(dict):
+    """ SparseBoard.logic: a Tile is only created once something touches it. order keeps the indices sorted """
+    def __init__(self) -> None:
+        super().__init__()
+        self.order = []
+
+    def __missing__(self, idx:int) -> Tile:
+        tile = self[idx] = Tile()
+        insort(self.order, idx)
+        return tile
+
+
+class SparseBoard(Board):
+    """
+    A board that only stores occupied tiles and the tiles their chains reach, for very large
+    or unbounded games. Every operation the search uses costs O(stones) or O(touched tiles)
+    instead of O(width * height), so a 1000x1000 game plays like a 15x15 one.
+    Cell indices use a fixed stride of 2**21, so coordinates must stay within +-2**20.
+    tiles_X and tiles_O hold 64-bit Zobrist hashes instead of bitboards.
+    """
+
+    def __init__(self, width:int=None, height:int=None, tile_size:int=40, win_length:int=5, weights=None) -> None:
+        """ Initialize the board
+        :param width, height: number of tiles, or None for a board unbounded in that direction
+        :param tile_size: in pixels, only used to draw bounded boards
+        :param weights: chain weights for score_board, as for Board
+        """
+        self.width = width
+        self.height = height
+        self.bounded = width is not None or height is not None
+        self.win_length = win_length
+
+        self.stride = 1 << 21
+        self.offset = 1 << 20
+        self.steps = [dy * self.stride + dx for dx, dy in DIRECTIONS]
+
+        self.cells = _SparseCells(self)
+        self.logic = _SparseLogic()
+
+        self.num_tiles_placed = 0
+        self.total_num_tiles = width * height if width is not None and height is not None else None
+        self.history = []
+        self.reset_threats()
+
+        self.tiles_X = 0
+        self.tiles_O = 0
+
+        # occupied area as (min_x, min_y, max_x, max_y), with the previous ones for undos
+        self.bounds = None
+        self.bounds_history = []
+
+        self.tile_size = tile_size
+        self.window_width = width * tile_size if width is not None else None
+        self.window_height = height * tile_size if height is not None else None
+        self.window = None
+        self.logic_window = None
+        self.backend = 'python'
+        self.set_weights(weights)
+
+    def in_grid(self, tile_x:int, tile_y:int) -> bool:
+        return (self.width is None or self.width > tile_x >= 0) and (self.height is None or self.height > tile_y >= 0)
+
+    @classmethod
+    def from_moves(cls, moves:list, width:int=15, height:int=15, tile_size:int=40, win_length:int=5) -> 'SparseBoard':
+        """ Build a board by playing the moves one by one, as the bulk rebuild only lays out dense boards
+        :param width, height: size of the board in tiles, None for a board unbounded in that direction
+        """
+        board = cls(width, height, tile_size, win_length)
+        for move in moves:
+            board.update_board(move, graphic=False)
+        return board
+
+    def cell_key(self, idx:int) -> int:
+        """ Zobrist key of a cell, mixed from its index so every board agrees on it """
+        return splitmix64(idx)
+
+    def candidate_tiles(self):
+        """ Yield (cell index, tile) for every empty tile a chain has reached, in the same order as Board """
+        cells, logic = self.cells, self.logic
+        for idx in logic.order:
+            if idx not in cells:
+                yield idx, logic[idx]
+
+    def copy(self) -> 'SparseBoard':
+        board = type(self).__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        board.cells = _SparseCells(board)
+        dict.update(board.cells, self.cells)
+        board.logic = deepcopy(self.logic)
+        board.history = self.history[:]
+        board.reset_threats()
+        board.bounds_history = self.bounds_history[:]
+        board.window = None
+        board.logic_window = None
+        return board
+
+    def play(self, idx:int, side:int) -> list:
+        tile_x, tile_y = self.coords(idx)
+        self.bounds_history.append(self.bounds)
+        if self.bounds is None:
+            self.bounds = (tile_x, tile_y, tile_x, tile_y)
+        else:
+            min_x, min_y, max_x, max_y = self.bounds
+            self.bounds = (min(min_x, tile_x), min(min_y, tile_y), max(max_x, tile_x), max(max_y, tile_y))
+
+        return super().play(idx, side)
+
+    def undo(self, change:list, idx:int, side:int) -> None:
+        self.bounds = self.bounds_history.pop()
+        super().undo(change, idx, side)
+
+    def to_bytes(self, chains:bool=True) -> bytes:
+        """ Encode the position as a compact snapshot: the moves as coordinates, and the chains of every touched tile
+        :param chains: as for Board.to_bytes
+        """
+        coords = self.coords
+        moves, sides = [], bytes(side for _, side in self.history)
+        for idx, _ in self.history:
+            moves += coords(idx)
+        touched, values = [], []
+        if chains:
+            for idx in self.logic.order: # every tile, so the decoded board yields the same candidates
+                tile = self.logic[idx]
+                touched += coords(idx)
+                values += tile.chains[0]
+                values += tile.chains[1]
+
+        try:
+            values = bytes(values)
+        except ValueError:
+            raise ValueError('A chain is too long to encode, use chains=False!') from None
+
+        return b''.join([
+            SPARSE_HEADER.pack(SPARSE_MAGIC, SNAPSHOT_VERSION, SNAPSHOT_CHAINS if chains else 0, self.width or 0,
+                               self.height or 0, self.win_length, self.side_to_move, self.tile_size, len(sides),
+                               len(touched) // 2),
+            struct.pack(f'<{len(moves)}i', *moves),
+            sides,
+            struct.pack(f'<{len(touched)}i', *touched),
+            values,
+        ])
+
+    @classmethod
+    def from_bytes(cls, data:bytes) -> 'SparseBoard':
+        """ Decode a snapshot made by to_bytes """
+        data = memoryview(data)
+        magic, version, flags, width, height, win_length, _, tile_size, num_moves, num_touched = SPARSE_HEADER.unpack_from(data)
+        if magic != SPARSE_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f'Not a sparse board snapshot (version {SNAPSHOT_VERSION})!')
+
+        board = cls(width or None, height or None, tile_size, win_length)
+        pos = SPARSE_HEADER.size
+        moves = struct.unpack_from(f'<{2 * num_moves}i', data, pos)
+        pos += 8 * num_moves
+        history = [(board.index(moves[2 * i], moves[2 * i + 1]), side) for i, side in enumerate(data[pos:pos + num_moves])]
+        pos += num_moves
+
+        if flags & SNAPSHOT_CHAINS:
+            for idx, side in history:
+                board.cells[idx] = side + 1
+                if side:
+                    board.tiles_X ^= board.cell_key(idx)
+                else:
+                    board.tiles_O ^= board.cell_key(idx)
+                tile_x, tile_y = board.coords(idx)
+                board.bounds_history.append(board.bounds)
+                min_x, min_y, max_x, max_y = board.bounds or (tile_x, tile_y, tile_x, tile_y)
+                board.bounds = (min(min_x, tile_x), min(min_y, tile_y), max(max_x, tile_x), max(max_y, tile_y))
+            board.history = history
+            board.num_tiles_placed = len(history)
+
+            touched = struct.unpack_from(f'<{2 * num_touched}i', data, pos)
+            pos += 8 * num_touched
+            values = list(data[pos:pos + 16 * num_touched])
+            for i in range(num_touched):
+                tile = board.logic[board.index(touched[2 * i], touched[2 * i + 1])]
+                tile.chains = (values[16 * i:16 * i + 8], values[16 * i + 8:16 * i + 16])
+        else:
+            for idx, side in history:
+                board.play(idx, side)
+
+        return board
+
+    def __getstate__(self) -> dict:
+        """ Pickle everything but the windows """
+        state = self.__dict__.copy()
+        state['window'] = state['logic_window'] = None
+        return state
+
+    def __setstate__(self, state:dict) -> None:
+        self.__dict__.update(state)
+
+    @staticmethod
+    def score_board(board:'SparseBoard') -> float:
+        """ Score the board value for the first player O. the higher the better """
+        score = 0
+        weights = board.chain_weights
+        for tile in board.logic.values():
+            score += tile.get_value() if weights is None else tile.get_weighted_value(weights)
+        return float(score)
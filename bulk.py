@@ -0,0 +1,204 @@
+""" Loads board positions in bulk, rebuilding their logic state for many games in one NumPy pass """
+
+import gc
+import numpy as np
+from typing import Iterable, Iterator, List, Tuple
+from board import Board, Tile, EMPTY, WALL, SIDES
+
+# The logic state of a board depends on the order its stones were played, not only on where they are,
+# so it cannot be read off the final grid. It can still be rebuilt without replaying the game:
+# * the chain walks of a move only depend on which stones were played before it, so the walks of every
+#   move of every game are done at once, treating a stone as absent until its turn.
+# * each chain value a move writes is 1 + m**2, and each opponent update along that line decays it to
+#   1 + (m - 1)**2 (m -> |m - 1|), so the final value of a tile's chain is the last value written to it,
+#   decayed once for every opponent update since.
+
+def grid_to_moves(grid:list) -> list:
+    """ Turn rows of 'X', 'O' or 0 into moves, in reading order, alternating O and X """
+    marks = {'O': [], 'X': []}
+    for tile_y, row in enumerate(grid):
+        for tile_x, mark in enumerate(row):
+            if mark in marks:
+                marks[mark].append((tile_x, tile_y, mark))
+
+    if len(marks['O']) - len(marks['X']) not in (0, 1):
+        raise ValueError('O must have as many stones as X, or one more!')
+
+    moves = []
+    for i, move in enumerate(marks['O']):
+        moves.append(move)
+        if i < len(marks['X']):
+            moves.append(marks['X'][i])
+    return moves
+
+def rebuild_logic(histories:List[list], template:Board) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the cells and chain values of many games at once.
+    :param histories: for each game, its (cell index, side) moves in order, as in Board.history
+    :param template: a board of the right size, only used for its layout
+    :return: cells as (games, cells) int8, and chains as (games, cells, side, direction) float64,
+             equal to what playing each game move by move would leave in Board.cells and Tile.chains
+    """
+    size = len(template.cells)
+    num_games = len(histories)
+    lengths = np.array([len(history) for history in histories], dtype=np.int64)
+    num_moves = int(lengths.sum())
+
+    base = np.array(template.cells, dtype=np.int8)
+    base = np.where(base == WALL, WALL, EMPTY).astype(np.int8)
+    owner = np.tile(base, num_games)
+    chains = np.zeros(num_games * size * 16)
+
+    if num_moves == 0:
+        return owner.reshape(num_games, size), chains.reshape(num_games, size, 2, 8)
+
+    moves = np.array([move for history in histories for move in history], dtype=np.int64).reshape(-1, 2)
+    game = np.repeat(np.arange(num_games), lengths)
+    ply = np.arange(num_moves) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    side = moves[:, 1]
+    cell = game * size + moves[:, 0] # index into all games' cells laid end to end
+
+    if (owner[cell] != EMPTY).any() or len(np.unique(cell)) != num_moves:
+        raise ValueError('A game plays outside the board or on an occupied tile!')
+
+    owner[cell] = side + 1
+    played_at = np.full(num_games * size, num_moves, dtype=np.int64)
+    played_at[cell] = ply
+    last = len(owner) - 1
+
+    def walk(stone:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Board.get_chains for every move, as it stood when the move was played """
+        lengths = np.empty((num_moves, 8), dtype=np.int64)
+        reached_at = np.empty((num_moves, 8, 2), dtype=np.int64)
+        reached = np.empty((num_moves, 8, 2), dtype=bool)
+
+        for direct, step in enumerate(template.steps):
+            cur = cell + step
+            going = (owner[cur] == stone) & (played_at[cur] < ply)
+            while going.any():
+                cur = cur + step * going
+                going = (owner[cur] == stone) & (played_at[cur] < ply)
+            lengths[:, direct] = (cur - cell) // step - 1
+
+            empty = np.ones(num_moves, dtype=bool)
+            for k in range(2):
+                empty &= (owner[cur] != WALL) & (played_at[cur] > ply)
+                reached[:, direct, k] = empty
+                reached_at[:, direct, k] = cur
+                cur = np.clip(cur + step, 0, last) # only matters while the previous tile was empty
+
+        return lengths, reached_at, reached
+
+    same_lens, same_at, same_reached = walk(side + 1)
+    diff_lens, diff_at, diff_reached = walk(2 - side)
+
+    set_channel, set_ply, set_m = [], [], []
+    decay_channel, decay_ply = [], []
+    channel = lambda tile, side, direct: (tile * 2 + side) * 8 + direct # flat index into chains
+
+    for i in range(8):
+        j = i + 4 if i < 4 else i - 4
+
+        same = same_reached[:, i, 0]
+        m = same_lens[:, i] + same_lens[:, j] + 1 - (~same_reached[:, j, 0])
+        diff = ~same & (diff_lens[:, i] > 0) & (diff_lens[:, i] < 4)
+
+        for k in range(2):
+            same_ok = same & same_reached[:, i, k]
+            changed = same_ok | (diff & diff_reached[:, i, k])
+            tile = np.where(same, same_at[:, i, k], diff_at[:, i, k])
+
+            set_channel.append(channel(tile[same_ok], side[same_ok], j))
+            set_ply.append(ply[same_ok])
+            set_m.append(m[same_ok])
+
+            for direct in (i, j):
+                decay_channel.append(channel(tile[changed], 1 - side[changed], direct))
+                decay_ply.append(ply[changed])
+
+    set_channel, set_ply, set_m = np.concatenate(set_channel), np.concatenate(set_ply), np.concatenate(set_m)
+    decay_channel, decay_ply = np.concatenate(decay_channel), np.concatenate(decay_ply)
+
+    # the last value written to each channel: a channel is written at most once per ply,
+    # so the largest ply * stride + m picks out the last write
+    stride = 1 << 16
+    last_write = np.full(len(chains), -1, dtype=np.int64)
+    np.maximum.at(last_write, set_channel, set_ply * stride + set_m)
+    written = np.flatnonzero(last_write >= 0)
+    last_ply, last_m = last_write[written] // stride, last_write[written] % stride
+
+    # the decays since then. Decays before the first write leave the value at 0
+    written_at = last_write[decay_channel]
+    after = (written_at >= 0) & (decay_ply * stride > written_at)
+    decays = np.bincount(decay_channel[after], minlength=len(chains))[written]
+
+    m = np.where(decays <= last_m, last_m - decays, (decays - last_m) % 2)
+    chains[written] = 1 + m**2
+
+    return owner.reshape(num_games, size), chains.reshape(num_games, size, 2, 8)
+
+def iter_boards(games:Iterable[list], width:int=15, height:int=15, tile_size:int=40, win_length:int=5, \
+                chunk_size:int=1024) -> Iterator[Board]:
+    """
+    Build a Board for the final position of each game, rebuilding chunk_size games at a time.
+    :param games: lists of (tile_x, tile_y, mark) moves
+    """
+    template = Board(width * tile_size, height * tile_size, tile_size, win_length, verbose=False)
+
+    chunk = []
+    for moves in games:
+        chunk.append([(template.index(tile_x, tile_y), SIDES[mark]) for tile_x, tile_y, mark in moves])
+        if len(chunk) == chunk_size:
+            yield from _to_boards(chunk, template)
+            chunk = []
+    if chunk:
+        yield from _to_boards(chunk, template)
+
+def load_boards(games:Iterable[list], width:int=15, height:int=15, tile_size:int=40, win_length:int=5, \
+                chunk_size:int=1024) -> List[Board]:
+    """ Build a Board for the final position of each game """
+    return list(iter_boards(games, width, height, tile_size, win_length, chunk_size))
+
+def _to_boards(histories:List[list], template:Board) -> List[Board]:
+    """ Rebuild a chunk of games and wrap each one in a Board """
+    cells, chains = rebuild_logic(histories, template)
+    playable = template.tables.playable
+    touched = chains.reshape(len(histories), len(template.cells), 16).any(axis=2)
+    chains = chains.astype(np.int64) # every chain value is a whole number: 1 + m**2
+
+    # creating this many tiles would otherwise trigger a garbage collection pass every few boards
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        boards = []
+        for game, history in enumerate(histories):
+            board = Board.__new__(Board)
+            board.__dict__.update(template.__dict__)
+            board.cells = cells[game].tolist()
+            board.history = [tuple(move) for move in history]
+            board.reset_threats()
+            board.num_tiles_placed = len(history)
+            board.tiles_O = int.from_bytes(np.packbits(cells[game] == 1, bitorder='little').tobytes(), 'little')
+            board.tiles_X = int.from_bytes(np.packbits(cells[game] == 2, bitorder='little').tobytes(), 'little')
+
+            # only tiles some chain reached need their values converted
+            logic = [None] * len(board.cells)
+            for idx in playable:
+                logic[idx] = Tile()
+            changed = np.flatnonzero(touched[game])
+            for idx, (values_O, values_X) in zip(changed.tolist(), chains[game, changed].tolist()):
+                logic[idx].chains = (values_O, values_X)
+            board.logic = logic
+            boards.append(board)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return boards
+
+def check_logic(board:Board) -> list:
+    """ Rebuild a board's logic state from its history and return the (tile_x, tile_y) of tiles that disagree """
+    _, chains = rebuild_logic([board.history], board)
+    values = chains[0].tolist()
+    return [board.coords(idx) for idx, tile in enumerate(board.logic)
+            if tile is not None and (tile.chains[0] != values[idx][0] or tile.chains[1] != values[idx][1])]
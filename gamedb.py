@@ -0,0 +1,273 @@
+""" Implements a compact, append-only game database with a memory-mapped position index """
+
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+from board import Board, MARKS, SIDES, splitmix64
+
+# games file: HEADER, then one record per game: RECORD, then a uint16 per move (tile number * 2 + side)
+# index file: INDEX_HEADER, a uint64 file offset per indexed game, then ENTRY per position, sorted by key
+MAGIC = b'GDB1'
+INDEX_MAGIC = b'GDX1'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHHH') # magic, format version, width, height, win length
+RECORD = struct.Struct('<HH') # number of moves, result
+INDEX_HEADER = struct.Struct('<4sHQQQ') # magic, format version, indexed games, end of the indexed games in the games file, entries
+ENTRY = struct.Struct('<QIHB') # position key, game, ply, result
+
+RESULTS = (None, 'O', 'X', 'draw') # result codes: unknown, a win for either mark, or a draw
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+
+
+def position_key(tile_number:int, side:int) -> int:
+    """ Zobrist key of a stone. The key of a position is the XOR of the keys of its stones """
+    return splitmix64(tile_number * 2 + side)
+
+def board_key(board:Board) -> int:
+    """ Key of a board's position, whatever order its stones were played in """
+    key = 0
+    numbers = board.tables.numbers
+    for idx, side in board.history:
+        key ^= position_key(numbers[idx], side)
+    return key
+
+
+class GameDB():
+    """
+    Games stored as a few bytes per move in one append-only file, read through a memory map.
+    build_index writes a sorted index of every position reached, so looking up the games that reached
+    a position is a binary search in a second mapped file, however many games there are.
+    Games appended after the last build_index are still found, by replaying them.
+    """
+    def __init__(self, path:str, width:int=15, height:int=15, win_length:int=5) -> None:
+        """ Open the database at path, creating it for this board size if it does not exist """
+        self.path = path
+        self.index_path = path + '.idx'
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, width, height, win_length))
+
+        self.file = open(path, 'r+b')
+        magic, version, self.width, self.height, self.win_length = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.file.close()
+            raise ValueError(f'{path} is not a game database (version {FORMAT_VERSION})')
+
+        self.data = None
+        self.index = None
+        self.index_games = 0
+        self.index_end = HEADER.size
+        self.index_entries = 0
+        self.indexed_offsets = [] # file offset of each indexed game's record, mapped from the index
+        self.offsets = [] # file offset of each game appended since
+        self.load_index()
+        self.scan()
+
+    ### READING ###
+
+    def remap(self) -> memoryview:
+        """ Map the games file again if it has grown since it was last mapped """
+        self.file.flush()
+        size = os.fstat(self.file.fileno()).st_size
+        if self.data is None or len(self.data) != size:
+            if self.data is not None:
+                self.data.close()
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.data
+
+    def scan(self) -> None:
+        """ Find the records of the games the index does not cover """
+        data = self.remap()
+        offset = self.index_end
+        while offset < len(data):
+            self.offsets.append(offset)
+            num_moves, _ = RECORD.unpack_from(data, offset)
+            offset += RECORD.size + 2 * num_moves
+
+    def __len__(self) -> int:
+        return self.index_games + len(self.offsets)
+
+    def offset(self, game:int) -> int:
+        """ File offset of a game's record """
+        return self.indexed_offsets[game] if game < self.index_games else self.offsets[game - self.index_games]
+
+    def raw_game(self, game:int) -> Tuple[tuple, int]:
+        """ (the moves of a game as tile number * 2 + side, its result code) """
+        data = self.remap()
+        offset = self.offset(game)
+        num_moves, result = RECORD.unpack_from(data, offset)
+        return struct.unpack_from(f'<{num_moves}H', data, offset + RECORD.size), result
+
+    def game(self, game:int) -> Tuple[list, Optional[str]]:
+        """ (the moves of a game as (tile_x, tile_y, mark), its result: 'O', 'X', 'draw' or None) """
+        moves, result = self.raw_game(game)
+        width = self.width
+        return [((move >> 1) % width, (move >> 1) // width, MARKS[move & 1]) for move in moves], RESULTS[result]
+
+    def __iter__(self) -> Iterator[Tuple[list, Optional[str]]]:
+        for game in range(len(self)):
+            yield self.game(game)
+
+    ### WRITING ###
+
+    def append(self, moves:list, result:Optional[str]=None) -> int:
+        """ Store a game
+        :param moves: (tile_x, tile_y, mark) moves in the order they were played
+        :param result: 'O', 'X', 'draw' or None if unknown
+        :return: the game's number
+        """
+        encoded = []
+        for tile_x, tile_y, mark in moves:
+            if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+                raise ValueError(f'Move {(tile_x, tile_y)} is off the {self.width}x{self.height} board!')
+            encoded.append((tile_y * self.width + tile_x) << 1 | SIDES[mark])
+
+        self.file.seek(0, os.SEEK_END)
+        self.offsets.append(self.file.tell())
+        self.file.write(RECORD.pack(len(encoded), RESULT_CODES[result]) + struct.pack(f'<{len(encoded)}H', *encoded))
+        return len(self) - 1
+
+    ### POSITION INDEX ###
+
+    def load_index(self) -> None:
+        """ Map the index file, if there is one that matches the games file """
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, games, end, entries = INDEX_HEADER.unpack_from(index)
+        if magic != INDEX_MAGIC or version != FORMAT_VERSION or end > os.path.getsize(self.path):
+            index.close()
+            return
+
+        self.index = index
+        self.index_games, self.index_end, self.index_entries = games, end, entries
+        self.indexed_offsets = memoryview(index)[INDEX_HEADER.size:INDEX_HEADER.size + 8 * games].cast('Q')
+        self.offsets = []
+        self.entries_start = INDEX_HEADER.size + 8 * games
+
+    def build_index(self) -> int:
+        """ Index every position of every game, replacing the old index. Needs numpy
+        :return: number of positions indexed
+        """
+        import numpy as np
+
+        data = self.remap()
+        offsets = np.array(list(self.indexed_offsets) + self.offsets, dtype=np.uint64)
+        records = [RECORD.unpack_from(data, offset) for offset in offsets.tolist()]
+        lengths = np.array([num_moves for num_moves, _ in records], dtype=np.int64)
+        results = np.array([result for _, result in records], dtype=np.uint8)
+        end = int(offsets[-1]) + RECORD.size + 2 * int(lengths[-1]) if len(self) else HEADER.size
+
+        # every game's moves in one array, gathered straight from the mapped file
+        words = np.frombuffer(data, dtype='<u2', count=(end - HEADER.size) // 2, offset=HEADER.size)
+        starts = (offsets - HEADER.size) // 2 + RECORD.size // 2
+        game = np.repeat(np.arange(len(self), dtype=np.int64), lengths)
+        first = np.cumsum(lengths) - lengths
+        ply = np.arange(len(game), dtype=np.int64) - np.repeat(first, lengths)
+        moves = words[starts.astype(np.int64)[game] + ply]
+
+        # position keys: XOR of the stones so far, an XOR prefix sum restarted at each game
+        zobrist = np.array([position_key(code >> 1, code & 1) for code in range(2 * self.width * self.height)], dtype=np.uint64)
+        running = np.bitwise_xor.accumulate(zobrist[moves]) if len(moves) else np.zeros(0, dtype=np.uint64)
+        before = np.zeros(len(self), dtype=np.uint64)
+        has_moves = lengths > 0
+        before[has_moves & (first > 0)] = running[first[has_moves & (first > 0)] - 1]
+        keys = running ^ np.repeat(before, lengths)
+
+        entries = np.empty(len(keys), dtype=np.dtype([('key', '<u8'), ('game', '<u4'), ('ply', '<u2'), ('result', 'u1')]))
+        entries['key'], entries['game'], entries['ply'], entries['result'] = keys, game, ply + 1, results[game]
+        entries = entries[np.argsort(keys, kind='stable')]
+
+        if self.index is not None:
+            self.indexed_offsets.release()
+            self.index.close()
+            self.index = None
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, FORMAT_VERSION, len(self), end, len(entries)))
+            f.write(offsets.astype('<u8').tobytes())
+            f.write(entries.tobytes())
+        os.replace(tmp_path, self.index_path)
+
+        self.load_index()
+        return len(entries)
+
+    def key_range(self, key:int) -> Tuple[int, int]:
+        """ [first, last) entries of the index with this key """
+        if self.index is None:
+            return 0, 0
+        index, start, size = self.index, self.entries_start, ENTRY.size
+        key_at = lambda i: struct.unpack_from('<Q', index, start + i * size)[0]
+
+        lo, hi = 0, self.index_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        first, hi = lo, self.index_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_at(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return first, lo
+
+    def unindexed(self, key:int) -> Iterator[Tuple[int, int, int]]:
+        """ Replay the games appended since the index was built, yielding (game, ply, result code) where key occurs """
+        for game in range(self.index_games, len(self)):
+            moves, result = self.raw_game(game)
+            position = 0
+            for ply, move in enumerate(moves, 1):
+                position ^= position_key(move >> 1, move & 1)
+                if position == key:
+                    yield game, ply, result
+
+    def find(self, position, limit:int=None) -> List[Tuple[int, int]]:
+        """ The (game, ply) of every time a position occurred, ply being the number of moves played to reach it
+        :param position: a Board, or a key from board_key
+        :param limit: stop after this many
+        """
+        key = board_key(position) if isinstance(position, Board) else position
+        first, last = self.key_range(key)
+        if limit is not None:
+            last = min(last, first + limit)
+
+        found = []
+        for i in range(first, last):
+            _, game, ply, _ = ENTRY.unpack_from(self.index, self.entries_start + i * ENTRY.size)
+            found.append((game, ply))
+        for game, ply, _ in self.unindexed(key):
+            if limit is not None and len(found) >= limit:
+                break
+            found.append((game, ply))
+        return found
+
+    def results(self, position) -> dict:
+        """ How the games that reached a position ended: {'O': wins, 'X': wins, 'draw': n, None: unknown} """
+        key = board_key(position) if isinstance(position, Board) else position
+        first, last = self.key_range(key)
+
+        counts = {result: 0 for result in RESULTS}
+        if last > first:
+            # the result bytes of the matching entries, one strided slice of the mapped index
+            start = self.entries_start + first * ENTRY.size + ENTRY.size - 1
+            codes = self.index[start:start + (last - first) * ENTRY.size:ENTRY.size]
+            for code, result in enumerate(RESULTS):
+                counts[result] = codes.count(code)
+        for _, _, code in self.unindexed(key):
+            counts[RESULTS[code]] += 1
+        return counts
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+        if self.index is not None:
+            self.indexed_offsets.release()
+            self.index.close()
+        self.file.close()
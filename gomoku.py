@@ -1,7 +1,10 @@
 from board import Board
 from players import Player, AI
-from graphics import GraphWin
+from graphics import GraphWin, update
+from gamedb import GameDB
+from heatmap import HeatMap
 
+from threading import Thread
 from time import time
 
 # TODO
@@ -13,6 +16,39 @@ from time import time
 # create undo features
 
 
+def think(board:Board, ai:AI, time_lim:float=5) -> tuple:
+    """ Search for the AI's move in a thread, keeping the window responsive and showing the search's
+    progress in its title. Pressing space plays the best move found so far.
+    """
+    result = dict()
+    def search():
+        try:
+            result['move'] = ai.get_move_iterative_deepening(board.copy(), ai.minimax_depth, ai.branch_factor, time_lim)
+        except Exception as e:
+            result['error'] = e
+
+    window = board.window
+    title = window.master.title()
+    worker = Thread(target=search, daemon=True)
+    window.checkKey() # forget keys pressed before the search
+    start = time()
+    worker.start()
+    while worker.is_alive():
+        update(20)
+        if window.checkKey() == 'space':
+            ai.stop_search = True
+        elapsed = time() - start
+        best = '' if ai.best_move is None else ', best so far {}, {}'.format(*ai.best_move[:2])
+        window.master.title("{}: thinking at depth {}{}, {:.0f} states/s (space to play now)".format(
+            title, ai.searching_depth, best, ai.num_states_searched / max(elapsed, 1e-3)))
+    worker.join()
+    window.master.title(title)
+
+    if 'error' in result:
+        raise result['error']
+    return result['move']
+
+
 def main():
     """ run the game """
     # Board init
@@ -25,13 +61,16 @@ def main():
     if play_AI == 'y':
         minimax_depth = int(input("\nEnter AI player maximum depth for minimax: "))
         branch_factor = int(input("Enter AI player branch factor: "))
-        player2 = AI(minimax_depth, branch_factor)
+        selective = input("Use selective search (late move reductions, null move pruning)? [y/n]: ") == 'y'
+        player2 = AI(minimax_depth, branch_factor, late_move_reductions=selective, null_move=selective)
     else:
         player2 = Player()
+    show_heat_map = input("Show a live heat map of tile values? [y/n]: ") == 'y'
 
     # Run game
     board.window = GraphWin('Tic Tac Toe', board.window_height, board.window_width)
     board.draw_grid()
+    heat_map = HeatMap(board) if show_heat_map else None
     print("Begin Game!")
     
     turn = 0
@@ -43,16 +82,16 @@ def main():
             if play_AI == 'y':
                 start = time()
                 # move = player2.get_move(board, depth=player2.minimax_depth, branch_factor=player2.branch_factor)
-                move = player2.get_move_iterative_deepening(board, player2.minimax_depth, player2.branch_factor, 5)
+                move = think(board, player2, 5)
                 end = time()
                 print("Time elapsed for move {} is {:2f}s".format(turn + 1, end - start))
             else:
                 move = player2.get_move(board)
         changed = board.update_board(move)
+        (player1 if turn % 2 == 0 else player2).moves.append(move)
+        if heat_map is not None:
+            heat_map.update(board, changed, move)
         win, pos = board.check_win(move)
-        
-        if turn == 6:
-            breakpoint()
 
         if win:
             board.draw_winning_line(pos[0], pos[1])
@@ -63,10 +102,27 @@ def main():
         else:
             break
 
+        # think about the human's likely replies while waiting for their click
+        if play_AI == 'y' and turn % 2 == 0:
+            player2.start_pondering(board)
+
+    if play_AI == 'y':
+        player2.stop_pondering()
+
     if board.check_full() is False:
         print("Player {} wins!".format(2 - int(turn % 2 == 0)))
+        result = move[2]
     else:
         print("The game is a tie!")
+        result = 'draw'
+
+    if input("Save the game to games.gdb? [y/n]: ") == 'y':
+        db = GameDB('games.gdb', board.width, board.height, board.win_length)
+        if (db.width, db.height) == (board.width, board.height):
+            db.append([board.decode_move(idx, side) for idx, side in board.history], result)
+        else:
+            print("games.gdb holds games of another board size, not saving")
+        db.close()
 
     board.window.getMouse()
     board.window.close()
@@ -285,6 +285,14 @@ class GraphWin(tk.Canvas):
         if self.autoflush:
             _root.update()
 
+    def batch(self):
+        """Return a context manager that turns autoflush off while
+        drawing many objects, then updates the window once:
+            with win.batch():
+                for line in lines: line.draw(win)
+        Batches can be nested; only the outermost one updates."""
+        return _Batch(self)
+
     
     def plot(self, x, y, color="black"):
         """Set pixel (x,y) to the given color"""
@@ -399,6 +407,25 @@ class GraphWin(tk.Canvas):
         self.update()
         
                       
+class _Batch:
+
+    """Context manager returned by GraphWin.batch"""
+
+    def __init__(self, win):
+        self.win = win
+
+    def __enter__(self):
+        self.autoflush = self.win.autoflush
+        self.win.autoflush = False
+        return self.win
+
+    def __exit__(self, *exc):
+        self.win.autoflush = self.autoflush
+        if self.autoflush and not self.win.isClosed():
+            _root.update()
+        return False
+
+                      
 class Transform:
 
     """Internal class for 2-D coordinate transformations"""
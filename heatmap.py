@@ -0,0 +1,66 @@
+""" Implements a live heat map of the board's tile values, in a window of its own """
+
+from board import Board, EMPTY
+
+O_COLOR = (48, 96, 255) # tiles good for O shade towards blue
+X_COLOR = (255, 64, 48) # and tiles good for X towards red
+STONE_COLOR = '#808080'
+
+class HeatMap():
+    """
+    A second window with one square per tile, shaded by the tile's value: blue where O's chains
+    are worth more, red where X's are. Stones are grey. It is drawn once, then update() only
+    recolours the tiles a move changed, so a move costs the same on any size of board.
+    """
+    def __init__(self, board:Board, scale:float=20) -> None:
+        """ Open the window and draw every tile
+        :param scale: tile value at which a tile is shaded halfway to full colour
+        """
+        from graphics import GraphWin, Point, Rectangle
+
+        self.scale = scale
+        self.window = GraphWin("Tile values", board.window_width, board.window_height)
+        self.squares = dict() # cell index -> Rectangle
+        self.colors = dict() # cell index -> colour shown
+
+        size = board.tile_size
+        with self.window.batch():
+            for tile_y in range(board.height):
+                for tile_x in range(board.width):
+                    idx = board.index(tile_x, tile_y)
+                    square = Rectangle(Point(tile_x * size, tile_y * size), Point((tile_x + 1) * size, (tile_y + 1) * size))
+                    square.setOutline('white')
+                    self.colors[idx] = self.color(board, idx)
+                    square.setFill(self.colors[idx])
+                    square.draw(self.window)
+                    self.squares[idx] = square
+
+    def color(self, board:Board, idx:int) -> str:
+        """ The colour of a tile: grey for a stone, else white shaded by its value """
+        if board.cells[idx] != EMPTY:
+            return STONE_COLOR
+        value = board.logic[idx].get_value()
+        shade = abs(value) / (abs(value) + self.scale)
+        target = O_COLOR if value > 0 else X_COLOR
+        return '#{:02x}{:02x}{:02x}'.format(*[round(255 + (c - 255) * shade) for c in target])
+
+    def update(self, board:Board, changed:list, move:tuple=None) -> None:
+        """ Recolour the tiles a move changed
+        :param changed: the change list returned by update_board or play
+        :param move: the move itself, whose tile now holds a stone
+        """
+        if self.window.isClosed():
+            return
+        cells = [idx for idx, _, _ in changed if idx is not None]
+        if move is not None:
+            cells.append(board.index(move[0], move[1]))
+
+        with self.window.batch():
+            for idx in cells:
+                color = self.color(board, idx)
+                if color != self.colors[idx]:
+                    self.colors[idx] = color
+                    self.squares[idx].setFill(color)
+
+    def close(self) -> None:
+        self.window.close()
@@ -0,0 +1,133 @@
+""" Compiled kernels for ArrayBoard: chain walking, playing and undoing moves, win checks and scoring """
+
+# Each kernel works on the arrays of an ArrayBoard and does exactly what the Board method of the same name
+# does on lists, so the two backends give identical results. They are compiled with Numba when it is
+# installed (HAVE_JIT), and are plain, slow Python otherwise: Board only builds an ArrayBoard if HAVE_JIT.
+
+import numpy as np
+
+try:
+    import numba
+    HAVE_JIT = True
+    jit = numba.njit(cache=True, nogil=True)
+except ImportError:
+    HAVE_JIT = False
+    jit = lambda function: function
+
+EMPTY = 0
+UNDO_ROW = 17 # an undo stack row: cell index, then its 8 O chains and 8 X chains before the move
+
+@jit
+def decayed(value):
+    """ A chain value 1 + m**2 once the opponent blocks it: 1 + (m - 1)**2, as board.DECAYED """
+    m = np.int64(round((value - 1) ** 0.5))
+    return 1 + (m - 1) ** 2
+
+@jit
+def get_chains(cells, steps, idx, stone, extended, lengths, reached, num_reached):
+    """ Board.get_chains, into lengths[8], reached[8, extended] and num_reached[8] """
+    for direct in range(8):
+        step = steps[direct]
+        cur = idx + step
+        while cells[cur] == stone:
+            cur += step
+        lengths[direct] = (cur - idx) // step - 1
+
+        count = 0
+        while count < extended and cells[cur] == EMPTY:
+            reached[direct, count] = cur
+            count += 1
+            cur += step
+        num_reached[direct] = count
+
+@jit
+def play(cells, chains, sums, steps, idx, side, stack, top):
+    """ Board.play: place a stone and update the chains and their sums per tile and side.
+    The tiles changed are pushed on stack from row top, with their chains before the move
+    :return: the number of rows pushed
+    """
+    stone, nxt_side = side + 1, 1 - side
+    cells[idx] = stone
+
+    same_lens = np.empty(8, np.int64)
+    same_changed = np.empty((8, 2), np.int64)
+    same_count = np.empty(8, np.int64)
+    diff_lens = np.empty(8, np.int64)
+    diff_changed = np.empty((8, 2), np.int64)
+    diff_count = np.empty(8, np.int64)
+    get_chains(cells, steps, idx, stone, 2, same_lens, same_changed, same_count)
+    get_chains(cells, steps, idx, 2 - side, 2, diff_lens, diff_changed, diff_count)
+
+    row = top
+    for i in range(8):
+        j = i + 4 if i < 4 else i - 4
+
+        changed, count = same_changed, same_count[i]
+        same = count != 0
+        value = 0
+        if same:
+            len_chain = same_lens[i] + same_lens[j] + 1
+            blocked = 1 if same_count[j] == 0 else 0
+            value = 1 + (len_chain - blocked) ** 2
+        elif 4 > diff_lens[i] > 0:
+            changed, count = diff_changed, diff_count[i]
+
+        for k in range(count):
+            c_idx = changed[i, k]
+            stack[row, 0] = c_idx
+            stack[row, 1:9] = chains[c_idx, 0]
+            stack[row, 9:17] = chains[c_idx, 1]
+            row += 1
+
+            if same:
+                sums[c_idx, side] += value - chains[c_idx, side, j]
+                chains[c_idx, side, j] = value
+
+            for direct in (i, j):
+                old = chains[c_idx, nxt_side, direct]
+                if old > 0:
+                    new = decayed(old)
+                    chains[c_idx, nxt_side, direct] = new
+                    sums[c_idx, nxt_side] += new - old
+
+    return row - top
+
+@jit
+def undo(cells, chains, sums, idx, stack, start, stop):
+    """ Board.undo: empty the cell and restore the chains in rows [start, stop) of the stack """
+    cells[idx] = EMPTY
+    for row in range(start, stop):
+        c_idx = stack[row, 0]
+        chains[c_idx, 0] = stack[row, 1:9]
+        chains[c_idx, 1] = stack[row, 9:17]
+        sums[c_idx, 0] = chains[c_idx, 0].sum()
+        sums[c_idx, 1] = chains[c_idx, 1].sum()
+
+@jit
+def winning_line(cells, steps, idx, stone, win_length):
+    """ Board.winning_line, returning (-1, -1) instead of None """
+    for direct in range(4):
+        step = steps[direct]
+        end = idx + step
+        while cells[end] == stone:
+            end += step
+        start = idx - step
+        while cells[start] == stone:
+            start -= step
+        if (end - start) // step - 1 >= win_length:
+            return start + step, end - step
+    return -1, -1
+
+@jit
+def score_board(sums):
+    """ Board.score_board: the value of every tile for O minus for X """
+    return sums[:, 0].sum() - sums[:, 1].sum()
+
+@jit
+def score_weighted(chains, weights):
+    """ Board.score_board with chain weights: weights[value] summed over O's chains, minus over X's """
+    score = 0.0
+    for idx in range(chains.shape[0]):
+        for direct in range(8):
+            score += weights[chains[idx, 0, direct]] - weights[chains[idx, 1, direct]]
+    return score
@@ -0,0 +1,218 @@
+""" A Gomocup (Piskvork protocol) brain: plays the AI through stdin/stdout, for tournament managers """
+
+import argparse
+import io
+import sys
+from contextlib import redirect_stdout
+from time import time
+from typing import Optional, TextIO
+
+from board import Board, MARKS, load_weights
+from players import AI
+
+# Protocol: the manager sends one command per line and the brain answers on stdout, coordinates being 0-based "x,y".
+#   START size / RECTSTART width,height / RESTART    -> OK
+#   BEGIN                                            -> the brain's first move
+#   TURN x,y                                         -> the brain's reply to the opponent's move
+#   BOARD, then x,y,field lines (1 own, 2 opponent), then DONE -> the brain's move
+#   TAKEBACK x,y                                     -> OK
+#   INFO key value: timeout_turn, timeout_match, time_left (ms), max_memory (bytes), ...
+#   ABOUT, END
+# The brain never thinks during the opponent's turn, and only ever writes protocol to stdout.
+
+TILE_SIZE = 40 # never drawn, but Board wants a tile size
+TT_ENTRY_BYTES = 320 # memory a transposition table entry costs, with its share of the best replies
+TT_MEMORY_SHARE = 0.5 # of max_memory, for the transposition table
+MOVES_LEFT = 25 # moves the remaining match time is shared between
+TIME_MARGIN = 0.85 # of the time available, to leave room for process overhead and a late abort
+OVERHEAD = 0.05 # seconds kept back from every move
+
+ABOUT = 'name="Gomoku-AI", version="1.0", author="Gomoku-AI authors", country="-"'
+
+
+class Brain():
+    """
+    The state of a game played through the protocol: the board, the AI and the manager's limits.
+    Every answer is written to out and flushed at once.
+    """
+    def __init__(self, depth:int=20, branch_factor:int=10, selective:bool=True, out:TextIO=sys.stdout, weights=None) -> None:
+        """ :param weights: chain weights for the board's score_board, e.g. a weights file written by tune.py """
+        self.depth = depth
+        self.branch_factor = branch_factor
+        self.out = out
+        self.weights = load_weights(weights) if isinstance(weights, str) else weights
+        self.ai = AI(depth, branch_factor, ponder_width=0, late_move_reductions=selective, null_move=selective)
+
+        self.board = None
+        self.own_side = None # 0 if the brain plays first, 1 if second, None until it is known
+        self.played = [] # (change list, cell index, side) of each stone, for TAKEBACK
+        self.timeout_turn = 5000 # ms, 0 to play at once
+        self.timeout_match = 0 # ms, 0 for no limit
+        self.time_left = None # ms of match time left, if the manager says
+        self.max_memory = 0 # bytes, 0 for no limit
+
+    def send(self, line:str) -> None:
+        self.out.write(line + '\n')
+        self.out.flush()
+
+    ### GAME STATE ###
+
+    def start(self, width:int, height:int) -> Optional[str]:
+        """ Start a new game, or return why not """
+        if not (5 <= width <= 100 and 5 <= height <= 100):
+            return f'unsupported board size {width}x{height}'
+        self.clear(width, height)
+        self.ai.transposition_table.clear()
+        return None
+
+    def clear(self, width:int, height:int) -> None:
+        """ Empty the board, keeping what the AI has learnt """
+        self.board = Board(width * TILE_SIZE, height * TILE_SIZE, TILE_SIZE, verbose=False, weights=self.weights)
+        self.own_side = None
+        self.played = []
+
+    def place(self, tile_x:int, tile_y:int, side:int) -> None:
+        """ Put a stone on the board, raising ValueError if the tile is taken or off the board """
+        move = (tile_x, tile_y, MARKS[side])
+        if not self.board.check_legal(move):
+            raise ValueError(f'illegal move {tile_x},{tile_y}')
+        idx, _ = self.board.encode_move(move)
+        self.played.append((self.board.play(idx, side), idx, side))
+
+    def takeback(self, tile_x:int, tile_y:int) -> None:
+        """ Remove the last stone played, which must be the one on this tile """
+        if not self.played or self.played[-1][1] != self.board.index(tile_x, tile_y):
+            raise ValueError(f'{tile_x},{tile_y} is not the last move')
+        change, idx, side = self.played.pop()
+        self.board.undo(change, idx, side)
+
+    def load(self, stones:list) -> None:
+        """ Set up a BOARD position, the brain to move, from (tile_x, tile_y, field) in the order given """
+        self.clear(self.board.width, self.board.height)
+        own = sum(1 for _, _, field in stones if field == 1)
+        # the brain is to move, so it played first if it has as many stones as the opponent
+        self.own_side = 0 if own * 2 == len(stones) else 1
+        for tile_x, tile_y, field in stones:
+            self.place(tile_x, tile_y, self.own_side if field == 1 else 1 - self.own_side)
+
+    ### SEARCH ###
+
+    def time_budget(self) -> float:
+        """ Seconds to spend on this move """
+        budget = self.timeout_turn / 1000 if self.timeout_turn > 0 else 0
+        if self.timeout_match > 0 and self.time_left is not None:
+            budget = min(budget, self.time_left / 1000 / MOVES_LEFT)
+        return max(budget * TIME_MARGIN - OVERHEAD, 0)
+
+    def think(self) -> None:
+        """ Search for the brain's move, play it and send it """
+        start = time()
+        board, side = self.board, self.own_side
+        if board.num_tiles_placed == 0:
+            tile_x, tile_y = board.width // 2, board.height // 2
+        else:
+            budget = self.time_budget()
+            self.ai.mark = MARKS[side]
+            result = None
+            with redirect_stdout(io.StringIO()): # the search prints its statistics
+                # an iteration takes a few times longer than the one before: only start one early in the budget
+                for result in self.ai.iter_search(board, self.depth, self.branch_factor, budget / 3, hard_time_lim=budget):
+                    pass
+            if result is None:
+                raise ValueError('the board is full')
+            tile_x, tile_y, _ = result.move
+            self.send(f'MESSAGE depth {result.depth} score {result.score} nodes {result.nodes} in {time() - start:.2f}s')
+            self.limit_memory()
+
+        self.place(tile_x, tile_y, side)
+        self.send(f'{tile_x},{tile_y}')
+
+    def limit_memory(self) -> None:
+        """ Clear the transposition table once it outgrows its share of max_memory """
+        if self.max_memory > 0 and len(self.ai.transposition_table) * TT_ENTRY_BYTES > self.max_memory * TT_MEMORY_SHARE:
+            self.ai.transposition_table.clear()
+
+    ### PROTOCOL ###
+
+    def info(self, key:str, value:str) -> None:
+        key = key.lower()
+        if key == 'timeout_turn':
+            self.timeout_turn = int(value)
+        elif key == 'timeout_match':
+            self.timeout_match = int(value)
+        elif key == 'time_left':
+            self.time_left = int(value)
+        elif key == 'max_memory':
+            self.max_memory = int(value)
+            self.limit_memory()
+        # game_type, rule, evaluate, folder: nothing to do
+
+    def run(self, commands:TextIO) -> None:
+        """ Answer commands until END or the end of input """
+        lines = iter(commands)
+        for line in lines:
+            words = line.strip().split(maxsplit=1)
+            if not words:
+                continue
+            command, arg = words[0].upper(), words[1] if len(words) > 1 else ''
+            try:
+                if command == 'END':
+                    break
+                elif command == 'START':
+                    error = self.start(int(arg), int(arg))
+                    self.send('OK' if error is None else f'ERROR {error}')
+                elif command == 'RECTSTART':
+                    width, height = (int(n) for n in arg.split(','))
+                    error = self.start(width, height)
+                    self.send('OK' if error is None else f'ERROR {error}')
+                elif command == 'INFO':
+                    key, _, value = arg.partition(' ')
+                    self.info(key, value.strip())
+                elif command == 'ABOUT':
+                    self.send(ABOUT)
+                elif self.board is None:
+                    self.send('ERROR no game started')
+                elif command == 'RESTART':
+                    self.start(self.board.width, self.board.height)
+                    self.send('OK')
+                elif command == 'BEGIN':
+                    self.own_side = 0
+                    self.think()
+                elif command == 'TURN':
+                    tile_x, tile_y = (int(n) for n in arg.split(','))
+                    if self.own_side is None:
+                        self.own_side = 1
+                    self.place(tile_x, tile_y, 1 - self.own_side)
+                    self.think()
+                elif command == 'BOARD':
+                    stones = []
+                    for stone in lines:
+                        if stone.strip().upper() == 'DONE':
+                            break
+                        tile_x, tile_y, field = (int(n) for n in stone.split(','))
+                        stones.append((tile_x, tile_y, field))
+                    self.load(stones)
+                    self.think()
+                elif command == 'TAKEBACK':
+                    tile_x, tile_y = (int(n) for n in arg.split(','))
+                    self.takeback(tile_x, tile_y)
+                    self.send('OK')
+                else:
+                    self.send(f'UNKNOWN {command}')
+            except ValueError as e:
+                self.send(f'ERROR {e}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gomocup protocol brain: reads commands on stdin, answers on stdout')
+    parser.add_argument('-d', '--depth', type=int, default=20, help='deepest search, time allowing')
+    parser.add_argument('-b', '--branch-factor', type=int, default=10)
+    parser.add_argument('--full-width', action='store_true', help='no late move reductions or null move pruning')
+    parser.add_argument('--weights', default=None, help='weights file written by tune.py, to score positions with')
+    args = parser.parse_args()
+
+    Brain(args.depth, args.branch_factor, not args.full_width, weights=args.weights).run(sys.stdin)
+
+
+if __name__ == '__main__':
+    main()
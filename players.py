@@ -1,9 +1,40 @@
 """ Implements the Player and AI classes """
 
-from typing import Tuple
-from random import randint
-from board import Board
+from typing import Iterator, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from random import Random
+from board import Board, MARKS, SIDES, EMPTY
 from time import time
+from threading import Thread, Timer
+from concurrent.futures import ProcessPoolExecutor
+from transposition import Snapshot, board_signature, save_snapshot
+from contextlib import redirect_stdout
+import atexit
+import io
+import math
+import os
+
+# how a transposition table score relates to the true one, for the side the entry's score is for (O)
+EXACT, LOWER, UPPER = 0, 1, -1 # it is the true score, or the true score is at least / at most it
+
+_search_ais = OrderedDict() # per process: (depth, branch factor, selective) -> AI, for search_position, least recently used first
+MAX_SEARCH_AIS = 4 # AIs search_position keeps per process
+SEARCH_TABLE_ENTRIES = 2_000_000 # transposition table entries they hold between them
+
+class SearchResult(NamedTuple):
+    """ What an iterative deepening search knows after finishing a depth """
+    depth: int
+    move: tuple # (tile_x, tile_y, mark)
+    score: float # for the side to move, None if not searched yet (e.g. a pondered move)
+    pv: list # principal variation: the expected line of play, starting with move
+    nodes: int
+    elapsed: float # seconds
+    lines: list # (move, score, pv) of the best root moves, best first: just this one unless searching for several
+    choices: list = None # (move, score) of every root move searched at this depth, bounds for all but the best
+
+class SearchAborted(Exception):
+    """ Raised inside negamaxAB when a search is asked to stop early """
+    pass
 
 class Player():
     """
@@ -37,117 +68,595 @@ class Player():
 
 class AI(Player):
     
-    def __init__(self, depth:int, branch_factor:int) -> None:
-        """ Initialize the AI player """
+    lmr_full_moves = 3 # moves searched at full depth before late move reductions kick in
+    null_reduction = 2 # extra plies cut from the search after a null move
+    narrow_ratio = 0.75 # in quiet nodes of an adaptive search, moves rated below this share of the best are dropped
+    min_width = 4 # but at least this many moves are kept
+    max_extensions = 4 # plies an adaptive search may extend a line by
+
+    def __init__(self, depth:int, branch_factor:int, ponder_width:int=3, tt_path:str=None, tt_save_every:int=0, \
+                late_move_reductions:bool=False, null_move:bool=False, adaptive:bool=False, node_budget:int=0) -> None:
+        """ Initialize the AI player
+        :param ponder_width: number of expected replies to search during the opponent's turn (0 disables pondering)
+        :param tt_path: transposition table snapshot to warm-start from, and to save to on exit
+        :param tt_save_every: also save the snapshot every this many searches (0 to only save on exit)
+        :param late_move_reductions: search moves late in the ordering one ply shallower, re-searching those that beat alpha
+        :param null_move: prune nodes where passing still scores above beta
+        :param adaptive: narrow quiet nodes to their best rated moves, and spend what that saves on forcing lines:
+                         add the moves that make a four beyond the branch factor, and search one ply deeper after a four
+        :param node_budget: nodes a search may spend on those forcing lines on top of what the narrowing saved
+        """
         super().__init__()
         self.minimax_depth = depth
         self.branch_factor = branch_factor
-        self.transposition_table = dict()
+        self.transposition_table = dict() # ((tiles_X, tiles_O), depth) -> (score, generation, bound)
+        self.generation = 0 # counts searches, to age transposition table entries
 
-    def get_possible_moves(self, board:Board, maximizer:bool) -> Tuple[list, list]:
-        """ Get the possible moves AI can take on a given board position """        
+        self.tt_path = tt_path
+        self.tt_save_every = tt_save_every
+        self.tt_snapshot = None
+        self.tt_signature = None # board_signature of the boards searched, which the table's entries are for
+        if tt_path is not None:
+            if os.path.exists(tt_path):
+                try:
+                    self.tt_snapshot = Snapshot(tt_path)
+                    self.generation = self.tt_snapshot.generation + 1
+                except ValueError as e:
+                    print(f"Ignoring {e}")
+            atexit.register(self.save_transposition_table)
+        self.late_move_reductions = late_move_reductions
+        self.null_move = null_move
+        self.adaptive = adaptive
+        self.node_budget = node_budget
+        self.reset_stats()
+
+        self.ponder_width = ponder_width
+        self.ponder_results = dict() # board bit representation -> (depth reached, (poss_x, poss_o), best move)
+        self.ponder_states_searched = 0
+        self.pondered_nodes = 0 # states pondered since our last search, which the next one has to do without
+        self.pondered_time = 0.0 # seconds they took
+        self.ponder_thread = None
+        self.stop_search = False
+        self.node_limit = float('inf') # negamaxAB aborts once num_states_searched reaches this, to cap pondering
+        self.search_nodes = 0 # states our moves took, the pondering before them included
+        self.num_searches = 0 # moves counted in search_nodes
+        self.best_replies = dict() # board bit representation -> best move found there, for principal variations
+
+    def reset_stats(self) -> None:
+        """ Reset the search statistics """
+        self.last_score = None # score of the last move played, for the side that played it (None if unknown)
+        self.last_depth = 0 # depth of the deepest finished search behind it
+        self.best_move = None # while searching, the best (tile_x, tile_y, mark) of the deepest finished iteration
+        self.searching_depth = 0 # while searching, the depth of the iteration under way
+        self.hash_queries_success = 0
+        self.num_states_searched = 0
+        self.num_reductions = 0
+        self.num_researches = 0
+        self.num_null_cutoffs = 0
+        self.num_forced = 0 # nodes where a five on the board left only the winning or the blocking moves
+        self.num_forced_skipped = 0 # moves those nodes did not search
+        self.num_narrowed = 0 # quiet nodes an adaptive search narrowed
+        self.num_dropped = 0 # moves they dropped
+        self.nodes_saved = 0 # about how many nodes those moves would have cost
+        self.num_widened = 0 # nodes given the moves that make a four beyond the branch factor
+        self.num_added = 0 # moves they were given
+        self.num_extensions = 0 # fours searched one ply deeper
+        self.nodes_extra = 0 # nodes spent on added moves and extensions
+        self.extra_depth = 0 # added moves and extensions under way, one inside the other
+        self.extra_start = 0 # num_states_searched when the outermost of them started
 
-        mark = 'O' if maximizer else 'X'
-        possible_moves = []
+    def print_stats(self) -> None:
+        print(f"Searched {self.num_states_searched} states, of which {self.hash_queries_success} are retrieved from the transposition table")
+        if self.num_forced:
+            print(f"{self.num_forced} forced nodes, skipping {self.num_forced_skipped} moves")
+        if self.late_move_reductions or self.null_move:
+            print(f"Reduced {self.num_reductions} moves ({self.num_researches} re-searched), {self.num_null_cutoffs} null move cutoffs")
+        if self.adaptive:
+            print(f"Narrowed {self.num_narrowed} quiet nodes by {self.num_dropped} moves, saving about {self.nodes_saved} states; "
+                  f"added {self.num_added} moves to {self.num_widened} nodes and extended {self.num_extensions} fours, "
+                  f"spending {self.nodes_extra} states")
+
+    def get_possible_moves(self, board:Board, maximizer:bool) -> Tuple[list, list]:
+        """ 
+        Get the possible moves AI can take on a given board position.
+        Moves are cell indices; the side playing them is implied by maximizer.
+        :return: (x_fav, o_fav): lists of ((score_X, score_O), cell index), sorted by score_X and score_O
+        """
         x_fav = []
         o_fav = []
-        both_fav = []
-
-        for tile_y in range(len(board.tiles)):
-            for tile_x in range(len(board.tiles[tile_y])):
-                if board.check_legal((tile_x, tile_y, mark)):
-                    score_X = board.logic[tile_y][tile_x].get_value_mark('X')
-                    score_O = board.logic[tile_y][tile_x].get_value_mark('O') 
-                    if score_X != 0 or score_O != 0:
-                        if -score_X > score_O:
-                            x_fav.append(((score_X, score_O), (tile_x, tile_y, mark)))
-                        else:
-                            o_fav.append(((score_X, score_O), (tile_x, tile_y, mark)))
-
-        x_fav = [move for move in sorted(x_fav, key=lambda x: x[0][0])]
-        o_fav = [move for move in sorted(o_fav, key=lambda o: o[0][1])]
+
+        for idx, tile in board.candidate_tiles():
+            score_X = tile.get_value_side(1)
+            score_O = tile.get_value_side(0)
+            if score_X != 0 or score_O != 0:
+                if -score_X > score_O:
+                    x_fav.append(((score_X, score_O), idx))
+                else:
+                    o_fav.append(((score_X, score_O), idx))
+
+        x_fav.sort(key=lambda x: (x[0][0], x[1]))
+        o_fav.sort(key=lambda o: (o[0][1], o[1]))
 
         return (x_fav, o_fav)
 
-    def update_possible_moves(self, curr_poss: list, changed: list, move: tuple, board: Board) -> list:
+    def update_possible_moves(self, curr_poss: list, changed: list, move: int, board: Board) -> list:
         """
         Update possible moves for player to try.
         :param changed: constant 16 tiles whose values were changed
         :curr_pos: constant branch_factor number of moves
+        :param move: cell index of the move just played
         """
-        new_poss_moves = []
         poss_x, poss_o = curr_poss
-        move_x, move_o = move[0], move[1]
-        nxt_mark = 'X' if move[2] == 'O' else 'O'
 
         x_fav = []
         o_fav = []
-        to_remove = {(move_x, move_o): 1}
-
-        for (tile_x, tile_y), _ in changed:
-            tile = board.logic[tile_y][tile_x]
-            to_remove[(tile_x, tile_y)] = 1
+        to_remove = {move}
 
-            score_X = tile.get_value_mark('X')
-            score_O = tile.get_value_mark('O') 
+        logic = board.logic
+        changed_poss = []
+        for idx, _, _ in changed:
+            tile = logic[idx]
+            to_remove.add(idx)
+            changed_poss.append(((tile.get_value_side(1), tile.get_value_side(0)), idx))
 
+        # split and sort the moves afresh, as get_possible_moves would: a position then gets the same moves whichever
+        # way it was reached (and however the caller reordered curr_poss), so the transposition table holds for it
+        for poss in [poss for poss in poss_x + poss_o if poss[1] not in to_remove] + changed_poss:
+            (score_X, score_O), _ = poss
             if score_X != 0 or score_O != 0:
                 if -score_X > score_O:
-                    x_fav.append(((score_X, score_O), (tile_x, tile_y, nxt_mark)))
+                    x_fav.append(poss)
                 else:
-                    o_fav.append(((score_X, score_O), (tile_x, tile_y, nxt_mark)))
-            
-            # new_poss_moves.append(((-sum(tile.len_chains_X), sum(tile.len_chains_O)), (tile_x, tile_y, nxt_mark)))
-        
-        poss_x = [poss for poss in poss_x if (poss[1][0], poss[1][1]) not in to_remove]
-        poss_o = [poss for poss in poss_o if (poss[1][0], poss[1][1]) not in to_remove]
+                    o_fav.append(poss)
 
-        # breakpoint()
-        x_fav = [(poss[0], (poss[1][0], poss[1][1], nxt_mark)) for poss in sorted(poss_x + x_fav, key=lambda x: x[0][0])]
-        o_fav = [(poss[0], (poss[1][0], poss[1][1], nxt_mark)) for poss in sorted(poss_o + o_fav, key=lambda o: o[0][1])]
+        x_fav.sort(key=lambda x: (x[0][0], x[1]))
+        o_fav.sort(key=lambda o: (o[0][1], o[1]))
         
         return (x_fav, o_fav)
                 
     def get_move(self, board:Board, depth:int=5, branch_factor:int=20) -> tuple:
         """ Let the AI make a move given a board configuration """
+        self.stop_pondering()
+        self.check_signature(board)
         maximizer = self.mark == 'O'
         poss_x, poss_o = self.get_possible_moves(board, maximizer)
-        self.hash_queries_success = 0
-        self.num_states_searched = 0
+        self.reset_stats()
 
-        (move, _), _ = self.negamaxAB(board, maximizer, depth, branch_factor, poss_moves=(poss_x, poss_o))
-        print(f"Searched {self.num_states_searched} states, of which {self.hash_queries_success} are retrieved from the transposition table")
+        self.new_generation()
+        (move, self.last_score), _ = self.negamaxAB(board, maximizer, depth, branch_factor, poss_moves=(poss_x, poss_o))
+        self.last_depth = depth
+        self.search_nodes += self.num_states_searched
+        self.num_searches += 1
+        self.print_stats()
 
-        return move
+        return board.decode_move(move, 0 if maximizer else 1)
     
-    def get_move_iterative_deepening(self, board: Board, depth: int=5, branch_factor: int=20, time_lim: float=5) -> tuple:
-        
+    def get_move_iterative_deepening(self, board: Board, depth: int=5, branch_factor: int=20, time_lim: float=5, \
+                                     hard_time_lim: float=None) -> tuple:
+        """ Deepen the search one ply at a time until depth is reached or time_lim has passed
+        :param hard_time_lim: also abort the current iteration after this many seconds, playing the best move of
+                              the deepest finished one. By default an iteration started before time_lim runs to the end
+        """
+        for result in self.iter_search(board, depth, branch_factor, time_lim, hard_time_lim):
+            pass
+        self.print_stats()
+
+        return result.move
+
+    def get_top_moves(self, board: Board, n: int=3, depth: int=5, branch_factor: int=20, time_lim: float=5, \
+                      hard_time_lim: float=None) -> list:
+        """ The n best moves with their exact scores, from one iterative deepening search
+        :return: [(move, score for the side to move, principal variation)], best first
+        """
+        for result in self.iter_search(board, depth, branch_factor, time_lim, hard_time_lim, multi_pv=n):
+            pass
+        self.print_stats()
+
+        return result.lines
+
+    def iter_search(self, board: Board, depth: int=5, branch_factor: int=20, time_lim: float=5, \
+                    hard_time_lim: float=None, multi_pv: int=1) -> Iterator[SearchResult]:
+        """
+        Iterative deepening as a generator: yield a SearchResult after each finished depth, best first.
+        Stop iterating at any point to keep the last result; set stop_search from another thread to also
+        abort the iteration under way. At least one result is always yielded unless the board is full: with no move
+        worth searching (an empty board, say), it is the free tile nearest the centre.
+        The states and seconds spent pondering since our last move come out of this search: after its first
+        result, it stops once it has searched as many states as our moves take on average less the pondered ones,
+        and time_lim is cut by the time pondering took.
+        :param hard_time_lim: abort the iteration under way after this many seconds
+        :param multi_pv: score this many of the best moves exactly, and give each its line in the results
+        """
+        self.stop_search = False # a stop left over from an earlier search is not for this one
+        self.stop_pondering()
+        self.check_signature(board)
+
         maximizer = self.mark == 'O'
+        side = 0 if maximizer else 1
         max_depth = depth
         cur_depth = 1
+        move = None
 
-        poss_x, poss_o = self.get_possible_moves(board, maximizer)
+        pondered = self.ponder_results.get(board.get_bit_repr())
+        self.ponder_results = dict()
+        pondered_nodes, pondered_time = self.pondered_nodes, self.pondered_time
+        self.pondered_nodes, self.pondered_time = 0, 0.0
+        node_limit = max(self.typical_search_nodes() - pondered_nodes, 0) if pondered_nodes else float('inf')
+        time_lim = max(time_lim - pondered_time, 0)
+        self.reset_stats()
+        if pondered is not None:
+            # the opponent played a reply we searched during their turn: continue from there
+            done_depth, (poss_x, poss_o), move = pondered
+            cur_depth = done_depth + 1
+            print(f"Pondered reply hit, resuming from depth {cur_depth}")
+        else:
+            poss_x, poss_o = self.get_possible_moves(board, maximizer)
+            self.best_replies = dict()
 
-        self.hash_queries_success = 0
-        self.num_states_searched = 0
+        self.new_generation()
+
+        timer = None
+        if hard_time_lim is not None:
+            timer = Timer(hard_time_lim, setattr, args=(self, 'stop_search', True))
+            timer.start()
 
         start = time()
-        while time() - start < time_lim and cur_depth <= max_depth:
-            (move, _), choices = self.negamaxAB(board, maximizer, cur_depth, branch_factor, poss_moves=(poss_x, poss_o), move_is_ordered=cur_depth != 1)
+        self.last_score, self.last_depth = None, cur_depth - 1
+        def result(top: list, choices: list=None) -> SearchResult:
+            """ top: [(cell index, score)] of the best moves, best first. choices: [(cell index, score)] of the root moves """
+            lines = [(board.decode_move(idx, side), score, self.principal_variation(board, idx, side)) for idx, score in top]
+            if choices is not None:
+                choices = [(board.decode_move(idx, side), score) for idx, score in choices]
+            return SearchResult(self.last_depth, self.best_move, top[0][1], lines[0][2], self.num_states_searched, time() - start,
+                                lines, choices)
 
-            cur_depth += 1
-            # reorder possible moves for better pruning
-            choice_dict = {move: state_score * (1 if maximizer else -1) for move, state_score in choices}
-            poss = sorted(poss_x + poss_o, key=lambda poss: choice_dict[poss[1]] if poss[1] in choice_dict else 0)
-            poss_x, poss_o = poss[:len(poss) // 2], poss[len(poss)//2:]
+        yielded = False
+        try:
+            if move is None and not self.select_moves((poss_x, poss_o), maximizer, branch_factor):
+                # an empty board, or a branch factor too small to keep a move: there is nothing to search
+                move, max_depth = self.fallback_move(board, side), 0
+            if move is not None:
+                self.best_move = board.decode_move(move, side)
+                yielded = True
+                self.node_limit = node_limit
+                yield result([(move, None)])
 
-        print(f"Searched {self.num_states_searched} states, of which {self.hash_queries_success} are retrieved from the transposition table")
+            while cur_depth <= max_depth and (not yielded or time() - start < time_lim):
+                self.searching_depth = cur_depth
+                (move, score), choices = self.search_root(board, maximizer, cur_depth, branch_factor, (poss_x, poss_o), cur_depth != 1, multi_pv)
+                self.last_score, self.last_depth = score, cur_depth
+                self.best_move = board.decode_move(move, side)
 
-        return move
+                cur_depth += 1
+                # reorder possible moves for better pruning
+                poss_x, poss_o = self.order_moves((poss_x, poss_o), choices, maximizer)
+                yielded = True
+                self.node_limit = node_limit
+                top = [(move, score)] if multi_pv <= 1 else sorted(choices, key=lambda choice: choice[1], reverse=True)[:multi_pv]
+                yield result(top, choices)
+        except SearchAborted:
+            if not yielded: # not even depth 1 finished: play the most promising candidate
+                move = self.select_moves((poss_x, poss_o), maximizer, branch_factor)[0][1]
+                self.best_move = board.decode_move(move, side)
+                yield result([(move, None)])
+        finally:
+            if timer is not None:
+                timer.cancel()
+                timer.join() # one already firing sets stop_search before it is cleared, not during the next search
+            self.stop_search = False
+            # the work of this move, pondering included. One cut short would have taken more, but count it at the average
+            self.search_nodes += self.num_states_searched + pondered_nodes if self.num_states_searched < node_limit \
+                                 else self.typical_search_nodes()
+            self.num_searches += 1
+            self.node_limit = float('inf')
+
+    def principal_variation(self, board: Board, move: int, side: int) -> list:
+        """ The line of best play starting with move, as (tile_x, tile_y, mark), following the best replies of the last search """
+        line, played = [], []
+        seen = set()
+        while move is not None and board.cells[move] == EMPTY and len(line) < max(self.last_depth, 1):
+            line.append(board.decode_move(move, side))
+            played.append((board.play(move, side), move, side))
+            if board.is_win(move, side) or board.get_bit_repr() in seen:
+                break
+            seen.add(board.get_bit_repr())
+            side = 1 - side
+            move = self.best_replies.get(board.get_bit_repr())
+        for change, idx, played_side in reversed(played):
+            board.undo(change, idx, played_side)
+        return line
+
+    def typical_search_nodes(self) -> int:
+        """ The states our moves take on average, pondering included, 0 before the first """
+        return self.search_nodes // self.num_searches if self.num_searches else 0
+
+    def order_moves(self, poss_moves: tuple, choices: list, maximizer: bool) -> Tuple[list, list]:
+        """ Reorder possible moves by the scores of the last search, for better pruning in the next one """
+        poss_x, poss_o = poss_moves
+        choice_dict = {move: state_score * (1 if maximizer else -1) for move, state_score in choices}
+        poss = sorted(poss_x + poss_o, key=lambda poss: choice_dict[poss[1]] if poss[1] in choice_dict else 0)
+        return poss[:len(poss) // 2], poss[len(poss)//2:]
+
+    ### TRANSPOSITION TABLE ###
+
+    def new_generation(self) -> None:
+        """ Start a new search generation, saving the transposition table if one is due """
+        self.generation += 1
+        if self.tt_path is not None and self.tt_save_every > 0 and self.generation % self.tt_save_every == 0:
+            self.save_transposition_table()
+
+    def check_signature(self, board:Board) -> None:
+        """
+        Make sure the transposition table is for boards like this one: its keys are bitboards over the board's
+        cells and its scores depend on the weights. On a board of another size, win length or weights,
+        the table is cleared and a snapshot taken on different boards is no longer used
+        """
+        signature = board_signature(board)
+        if signature == self.tt_signature:
+            return
+        if self.tt_signature is not None:
+            self.transposition_table.clear()
+            self.best_replies = dict()
+        self.tt_signature = signature
+        if self.tt_snapshot is not None and not self.tt_snapshot.matches(board):
+            print(f"Ignoring {self.tt_snapshot.path}: a transposition table snapshot of another board size, win length or weights")
+            self.tt_snapshot.close()
+            self.tt_snapshot = None
+
+    def lookup_transposition(self, key:tuple):
+        """ Look a position up in the transposition table, then in the snapshot it was warm-started from """
+        entry = self.transposition_table.get(key)
+        if entry is None and self.tt_snapshot is not None:
+            entry = self.tt_snapshot.get(key)
+            if entry is not None:
+                self.transposition_table[key] = entry
+        return entry
+
+    def save_transposition_table(self, path:str=None, min_depth:int=2, max_age:int=64) -> int:
+        """ 
+        Save the transposition table, merged with the snapshot it started from, as a new snapshot.
+        :param path: where to save, defaults to tt_path
+        :param min_depth: drop shallow entries, which are cheap to recompute
+        :param max_age: drop entries more than this many generations old
+        :return: number of entries saved
+        """
+        path = self.tt_path if path is None else path
+        if path is None:
+            raise ValueError('No path to save the transposition table to!')
+        signature = self.tt_signature if self.tt_signature is not None else \
+                    self.tt_snapshot.signature if self.tt_snapshot is not None else None
+        if signature is None: # nothing searched, nothing loaded
+            return 0
+
+        table = dict(self.tt_snapshot.items()) if self.tt_snapshot is not None else dict()
+        table.update(self.transposition_table)
+        saved = save_snapshot(path, table, self.generation, signature, min_depth=min_depth,
+                              min_generation=self.generation - max_age)
+
+        if path == self.tt_path:
+            # the merged entries are in the new file now: map it instead of the old one
+            if self.tt_snapshot is not None:
+                self.tt_snapshot.close()
+            self.tt_snapshot = Snapshot(path)
+
+        return saved
+
+    ### PONDERING ###
+
+    def start_pondering(self, board: Board, depth: int=None, branch_factor: int=None) -> None:
+        """ 
+        Search the opponent's most likely replies in a background thread while they think.
+        Results are kept in the transposition table and in ponder_results, so that
+        get_move_iterative_deepening can resume from them if the opponent plays one of these replies.
+        Pondering stops after half the states our moves take on average, and iter_search takes the states and
+        time it spent out of our next search, so a game costs no more work than without pondering.
+        """
+        self.stop_pondering()
+        if self.ponder_width <= 0 or self.typical_search_nodes() <= 0:
+            return
+        self.check_signature(board)
+
+        depth = self.minimax_depth if depth is None else depth
+        branch_factor = self.branch_factor if branch_factor is None else branch_factor
+
+        opponent_maximizer = self.mark != 'O'
+        poss = self.select_moves(self.get_possible_moves(board, opponent_maximizer), opponent_maximizer, branch_factor)
+        replies = [idx for _, idx in poss[:self.ponder_width]]
+
+        self.new_generation()
+        self.node_limit = self.num_states_searched + self.typical_search_nodes() // 2
+        self.ponder_thread = Thread(target=self.ponder, args=(board.copy(), replies, depth, branch_factor), daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self) -> None:
+        """ Stop the background search, if any, and wait for it to unwind.
+        Only the node limit is used to stop it, so a stop_search set meanwhile for the search under way is kept """
+        if self.ponder_thread is not None:
+            self.node_limit = 0
+            self.ponder_thread.join()
+            self.ponder_thread = None
+        self.node_limit = float('inf')
+
+    def ponder(self, board: Board, replies: list, depth: int, branch_factor: int) -> None:
+        """ Worker: deepen the search below each expected reply in turn until done or stopped """
+        maximizer = self.mark == 'O'
+        opponent = 1 if maximizer else 0
+        lines = []
+        for reply in replies:
+            line_board = board.copy()
+            line_board.play(reply, opponent)
+            if line_board.is_win(reply, opponent) or line_board.check_full():
+                continue
+            lines.append([line_board, self.get_possible_moves(line_board, maximizer)])
+
+        states_searched = self.num_states_searched
+        start = time()
+        try:
+            for cur_depth in range(1, depth + 1):
+                for line in lines:
+                    line_board, (poss_x, poss_o) = line
+                    (move, _), choices = self.negamaxAB(line_board, maximizer, cur_depth, branch_factor, poss_moves=(poss_x, poss_o), move_is_ordered=cur_depth != 1)
+                    line[1] = self.order_moves((poss_x, poss_o), choices, maximizer)
+                    self.ponder_results[line_board.get_bit_repr()] = (cur_depth, line[1], move)
+        except SearchAborted:
+            pass
+        finally:
+            self.ponder_states_searched += self.num_states_searched - states_searched
+            self.pondered_nodes += self.num_states_searched - states_searched
+            self.pondered_time += time() - start
     
+    def fallback_move(self, board: Board, side: int) -> Optional[int]:
+        """ The cell index of the free tile nearest the centre, for when no move is worth searching. None if the board is full """
+        centre_x, centre_y = (board.width or 0) // 2, (board.height or 0) // 2
+        radius = 0
+        while True:
+            ring = [(centre_x + dx, centre_y + dy) for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1) \
+                    if max(abs(dx), abs(dy)) == radius]
+            for tile_x, tile_y in ring:
+                if board.check_legal((tile_x, tile_y, MARKS[side])):
+                    return board.index(tile_x, tile_y)
+            if not any(board.in_grid(tile_x, tile_y) for tile_x, tile_y in ring):
+                return None
+            radius += 1
+
+    def select_moves(self, poss_moves: tuple, maximizer: bool, branch_factor: int) -> list:
+        """ Cut the possible moves down to branch_factor and order them for the player to move """
+        poss_x, poss_o = poss_moves # determines branching factor
+
+        if len(poss_x) + len(poss_o) >= branch_factor:
+            if len(poss_x) < branch_factor // 2:
+                poss_o = poss_o[-(branch_factor - len(poss_x)):]
+            elif len(poss_o) < branch_factor // 2:
+                poss_x = poss_x[:(branch_factor - len(poss_o))]
+            else:
+                poss_x = poss_x[:(branch_factor // 2)]
+                poss_o = poss_o[-(branch_factor // 2):]
+
+        # for a better move ordering
+        if maximizer:
+            return poss_o[::-1] + poss_x[::-1] 
+        else:
+            return poss_x + poss_o
+
+    def adapt_moves(self, board:Board, side:int, poss:list) -> Tuple[list, int, int]:
+        """
+        Fit the moves selected by the branch factor to the node, for an adaptive search. In a quiet node, where neither
+        side can make a four, keep the moves rated at least narrow_ratio of the best (and the min_width best rated
+        ones). Where side can make a four, add those of its fours the branch factor left out, while the budget lasts.
+        :return: (the moves to search, how many were dropped, how many at the end were added)
+        """
+        _, open_fours, fours = board.threats(side)
+        _, opp_open_fours, opp_fours = board.threats(1 - side)
+        if not (open_fours or fours or opp_open_fours or opp_fours):
+            ratings = sorted((abs(score_x) + abs(score_o) for (score_x, score_o), _ in poss), reverse=True)
+            if len(ratings) <= self.min_width:
+                return poss, 0, 0
+            least = min(self.narrow_ratio * ratings[0], ratings[self.min_width - 1])
+            kept = [move for move in poss if abs(move[0][0]) + abs(move[0][1]) >= least]
+            return kept, len(poss) - len(kept), 0
+
+        if not (open_fours or fours) or not self.extra_allowed():
+            return poss, 0, 0
+        selected = {idx for _, idx in poss}
+        logic = board.logic
+        added = [((logic[idx].get_value_side(1), logic[idx].get_value_side(0)), idx)
+                 for idx in sorted(set(open_fours) | set(fours), key=lambda idx: (idx not in open_fours, idx)) if idx not in selected]
+        return poss + added, 0, len(added)
+
+    def extra_allowed(self) -> bool:
+        """ Whether an adaptive search may still add moves or extend lines: their nodes so far, counting those under
+        way, are within what narrowing saved plus node_budget """
+        under_way = self.num_states_searched - self.extra_start if self.extra_depth else 0
+        return self.nodes_extra + under_way < self.nodes_saved + self.node_budget
+
+    def has_threat(self, board:Board, side:int) -> bool:
+        """ Whether side has a four or an open three """
+        fives, open_fours, _ = board.threats(side)
+        return bool(fives or open_fours)
+
+    def is_tactical(self, board:Board, move:int) -> bool:
+        """ Whether a move makes or blocks a four or an open three """
+        return any(move in tiles for side in (0, 1) for tiles in board.threats(side))
+
+    def forced_moves(self, board:Board, side:int) -> Optional[list]:
+        """
+        The only moves worth searching for side, from the threats on the board: its winning move, else the tiles
+        that block the opponent's fives (if there are several, every move loses and these show it soonest).
+        Against an open three, only the moves that block it or make a four of side's own.
+        :return: ((score_X, score_O), cell index) of the moves, strongest tile first, or None if nothing is forced
+        """
+        fives, open_fours, fours = board.threats(side)
+        if fives:
+            moves = [min(fives)]
+        else:
+            opp_fives, opp_open_fours, opp_fours = board.threats(1 - side)
+            if opp_fives:
+                moves = list(opp_fives)
+            elif opp_open_fours:
+                # it becomes an open four unless a tile it needs is taken first, or side keeps the opponent busy
+                moves = list(set(opp_open_fours) | set(opp_fours) | set(open_fours) | set(fours))
+            else:
+                return None
+
+        logic = board.logic
+        poss = [((logic[idx].get_value_side(1), logic[idx].get_value_side(0)), idx) for idx in moves]
+        poss.sort(key=lambda poss: (poss[0][0] - poss[0][1], poss[1]))
+        return poss
+
+    def search_root(self, board:Board, maximizer:bool, depth:int, branch_factor:int, poss_moves:tuple, \
+                    move_is_ordered:bool=False, multi_pv:int=1) -> Tuple[tuple, list]:
+        """
+        Search the root of an iterative deepening iteration. With multi_pv > 1, each move is searched with
+        alpha at the multi_pv-th best score found so far rather than the best, so the best multi_pv moves
+        all get exact scores while the rest are still cut off as soon as they cannot make the list.
+        :return: like negamaxAB. Scores outside the best multi_pv are upper bounds
+        """
+        if multi_pv <= 1:
+            return self.negamaxAB(board, maximizer, depth, branch_factor, poss_moves=poss_moves, move_is_ordered=move_is_ordered)
+        if self.stop_search or self.num_states_searched >= self.node_limit:
+            raise SearchAborted()
+
+        side = 0 if maximizer else 1
+        poss = self.forced_moves(board, side)
+        if poss is None:
+            poss = poss_moves[0] + poss_moves[1] if move_is_ordered else self.select_moves(poss_moves, maximizer, branch_factor)
+        sign = 1 if maximizer else -1
+        alpha = float('-inf') # the multi_pv-th best score so far: moves must beat it to make the list
+        choices = []
+
+        for _, move in poss:
+            self.num_states_searched += 1
+            orig_states = board.play(move, side)
+            board_hash = board.get_bit_repr()
+            try:
+                if board.is_win(move, side):
+                    state_score = float('inf')
+                elif board.check_full():
+                    state_score = 0
+                elif depth == 1:
+                    state_score = board.score_board(board) * sign
+                else:
+                    new_poss_moves = self.update_possible_moves(poss_moves, orig_states, move, board)
+                    (_, state_score), _ = self.negamaxAB(board, maximizer=(not maximizer), depth=depth-1, branch_factor=branch_factor, \
+                                                         poss_moves=new_poss_moves, beta=-alpha)
+                    state_score *= -1
+            finally:
+                board.undo(orig_states, move, side)
+
+            if depth > 1:
+                bound = UPPER if state_score <= alpha else EXACT # the move was searched with alpha as its only limit
+                self.transposition_table[(board_hash, depth)] = (state_score * sign, self.generation, bound * sign)
+            choices.append((move, state_score))
+            if len(choices) >= multi_pv:
+                alpha = sorted(score for _, score in choices)[-multi_pv]
+
+        best = max(choices, key=lambda x: x[1])
+        self.best_replies[board.get_bit_repr()] = best[0]
+        return best, choices
+
     def negamaxAB(self, board:Board, maximizer:bool, depth:int=5, branch_factor:int=10, \
                 poss_moves:tuple=(None, None), alpha=float('-inf'), beta=float('inf'), \
-                move_is_ordered: bool=False) -> Tuple[float, tuple]: 
+                move_is_ordered: bool=False, in_null: bool=False, extensions: int=0) -> Tuple[float, tuple]: 
 
         """ Return the score the player can achieve at that state with curr_depth
         :param board: the current board
@@ -156,75 +665,414 @@ class AI(Player):
         :param maximizer: whether the player want to maximize or minimize the board's score
         :param depth: the maximum depth the player can see ahead
         :param branch_factor: the number of moves the player can consider at any given depth
-        :param poss_moves: the moves the player will choose and search from
+        :param poss_moves: the moves the player will choose and search from, as (x_fav, o_fav) of ((score_X, score_O), cell index)
         :param move_is_ordered: whether the given poss_moves is already ordered or not
-        :return: the score the player think they can achieve.
+        :param in_null: whether this node is below a null move. Such positions have the wrong player to move
+                        for their stones, so they skip the transposition table and do not pass again
+        :param extensions: plies an adaptive search has extended this line by
+        :return: ((best cell index, the score the player think they can achieve), [(cell index, score) for each move searched])
         """
-        if move_is_ordered is False:
-            poss_x, poss_o = poss_moves # determines branching factor
-
-            if len(poss_x) + len(poss_o) >= branch_factor:
-                if len(poss_x) < branch_factor // 2:
-                    poss_o = poss_o[-(branch_factor - len(poss_x)):]
-                elif len(poss_o) < branch_factor // 2:
-                    poss_x = poss_x[:(branch_factor - len(poss_o))]
-                else:
-                    poss_x = poss_x[:(branch_factor // 2)]
-                    poss_o = poss_o[-(branch_factor // 2):]
+        if self.stop_search or self.num_states_searched >= self.node_limit:
+            raise SearchAborted()
 
-            # for a better move ordering
-            if maximizer:
-                poss = poss_o[::-1] + poss_x[::-1] 
-            else:
-                poss = poss_x + poss_o
+        side = 0 if maximizer else 1
+        dropped = added = 0
+        forced = self.forced_moves(board, side)
+        if forced is not None:
+            poss = forced
+            self.num_forced += 1
+            self.num_forced_skipped += max(min(branch_factor, len(poss_moves[0]) + len(poss_moves[1])) - len(forced), 0)
+        elif move_is_ordered is False:
+            poss = self.select_moves(poss_moves, maximizer, branch_factor)
+            if self.adaptive:
+                poss, dropped, added = self.adapt_moves(board, side, poss)
+                if dropped:
+                    self.num_narrowed += 1
+                    self.num_dropped += dropped
+                if added:
+                    self.num_widened += 1
+                    self.num_added += added
         else:
             poss = poss_moves[0] + poss_moves[1]
 
+        # selective search is only safe when the opponent has no four or open three to exploit
+        selective = (self.late_move_reductions or self.null_move) and depth >= 3 and forced is None
+        if selective:
+            selective = not self.has_threat(board, 1 - side)
+
+        # null move: let the opponent move twice. If we are still above beta, this node is not worth searching
+        if selective and self.null_move and not in_null and beta < float('inf') and depth - 1 - self.null_reduction >= 1:
+            (_, null_score), _ = self.negamaxAB(board, maximizer=(not maximizer), depth=depth-1-self.null_reduction, \
+                                                branch_factor=branch_factor, poss_moves=poss_moves, alpha=-beta, beta=-beta+1, in_null=True, \
+                                                extensions=extensions)
+            if -null_score >= beta:
+                self.num_null_cutoffs += 1
+                return (None, beta), []
+
         choices = []
-        has_no_board = True
-        
-        for (score_x, score_y), move in poss:
-            mark = move[2]
-            nxt_mark = 'O' if mark == 'X' else 'X'
+        first_added = len(poss) - added
+        start_states = self.num_states_searched
+        cut = False
+        if self.adaptive and extensions < self.max_extensions:
+            _, open_fours, fours = board.threats(side)
+            makes_four = fours.keys() | open_fours.keys() # the moves searched one ply further, as the reply is forced
+        else:
+            makes_four = ()
+
+        sign = 1 if maximizer else -1
+        # a leaf's score depends on the order its stones were played in, as the tile values are updated move by move,
+        # so leaves (depth 1) are not kept: another order reaching the same stones would take a score not its own
+        use_table = not in_null and depth > 1
+        for i, ((score_x, score_y), move) in enumerate(poss):
+            # late moves in the ordering are searched one ply shallower first
+            reduce = selective and self.late_move_reductions and i >= self.lmr_full_moves \
+                    and alpha > float('-inf') and not self.is_tactical(board, move)
 
             self.num_states_searched += 1            
-            orig_states = board.update_board(move, graphic=False)
+            orig_states = board.play(move, side)
             board_hash = board.get_bit_repr()
 
-            try:
-                state_score = self.transposition_table[(board_hash, depth)] * (1 if maximizer else -1)
+            entry = self.lookup_transposition((board_hash, depth)) if use_table else None
+            if entry is not None:
+                state_score, bound = entry[0] * sign, entry[2] * sign
+                # a bound only settles the move if it falls outside the window
+                if bound == LOWER and state_score < beta or bound == UPPER and state_score > alpha:
+                    entry = None
+            if entry is not None:
                 self.hash_queries_success += 1
-            except KeyError:
+                searched_depth = depth
+            else:
 
-                if board.check_win(move)[0]:
-                    self.transposition_table[(board_hash, depth)] = float('inf') if maximizer else -float('inf')
-                    board.undo_change(orig_states, move)
+                if board.is_win(move, side):
+                    if use_table:
+                        self.transposition_table[(board_hash, depth)] = (float('inf') * sign, self.generation, EXACT)
+                    board.undo(orig_states, move, side)
                     choices.append((move, float('inf')))
                     return (move, float('inf')), choices
                 elif board.check_full():
-                    self.transposition_table[(board_hash, depth)] = 0 
-                    board.undo_change(orig_states, move)
+                    if use_table:
+                        self.transposition_table[(board_hash, depth)] = (0, self.generation, EXACT)
+                    board.undo(orig_states, move, side)
                     choices.append((move, 0))
                     return (move, 0), choices
 
-                if depth == 1:
-                    state_score = Board.score_board(board) * (1 if maximizer else -1)
+                searched_depth = depth
+                extend = move in makes_four and self.extra_allowed()
+                extra = extend or i >= first_added # effort beyond the fixed depth and branch factor
+                if extra:
+                    if self.extra_depth == 0:
+                        self.extra_start = self.num_states_searched
+                    self.extra_depth += 1
+                    self.num_extensions += extend
+                child_depth = depth - 1 + extend
+
+                if child_depth == 0:
+                    state_score = board.score_board(board) * sign
+                    bound = EXACT
                 else:
                     new_poss_moves = self.update_possible_moves(poss_moves, orig_states, move, board)
 
-                    (_ , state_score), _ = \
-                        self.negamaxAB(board, maximizer=(not maximizer), depth=depth-1, branch_factor=branch_factor, \
-                                    poss_moves=new_poss_moves, alpha=-beta, beta=-alpha)
-                    
-                    state_score *= -1
+                    try:
+                        if reduce:
+                            self.num_reductions += 1
+                            searched_depth = depth - 1
+                            (_ , state_score), _ = \
+                                self.negamaxAB(board, maximizer=(not maximizer), depth=child_depth-1, branch_factor=branch_factor, \
+                                            poss_moves=new_poss_moves, alpha=-alpha-1, beta=-alpha, in_null=in_null, \
+                                            extensions=extensions)
+                            state_score *= -1
+                            window_beta = alpha + 1
+
+                        if not reduce or state_score > alpha:
+                            if reduce:
+                                self.num_researches += 1
+                            searched_depth = depth
+                            (_ , state_score), _ = \
+                                self.negamaxAB(board, maximizer=(not maximizer), depth=child_depth, branch_factor=branch_factor, \
+                                            poss_moves=new_poss_moves, alpha=-beta, beta=-alpha, in_null=in_null, \
+                                            extensions=extensions + extend)
+                        
+                            state_score *= -1
+                            window_beta = beta
+                    except SearchAborted:
+                        board.undo(orig_states, move, side) # leave the board as it was found
+                        raise
+                    # outside the window it was searched with, the score is only a bound
+                    bound = UPPER if state_score <= alpha else LOWER if state_score >= window_beta else EXACT
+
+                if extra:
+                    self.extra_depth -= 1
+                    if self.extra_depth == 0:
+                        self.nodes_extra += self.num_states_searched - self.extra_start
                 
-            self.transposition_table[(board_hash, depth)] = state_score if maximizer else -state_score
+            if use_table and searched_depth > 1:
+                self.transposition_table[(board_hash, searched_depth)] = (state_score * sign, self.generation, bound * sign)
             choices.append((move, state_score))
-            board.undo_change(orig_states, move)
+            board.undo(orig_states, move, side)
 
             if state_score > alpha:
                 alpha = state_score
             if alpha > beta:
+                cut = True
                 break
-        
-        return max(choices, key=lambda x: x[1]), choices
\ No newline at end of file
+
+        if dropped and not cut:
+            # the dropped moves would have been searched too: count them at the average cost of those that were
+            self.nodes_saved += dropped * (self.num_states_searched - start_states) // len(choices)
+        best = max(choices, key=lambda x: x[1])
+        if not in_null:
+            self.best_replies[board.get_bit_repr()] = best[0]
+        return best, choices
+
+class MCTSNode():
+    """ A node of the MCTS tree: the position after move, played by side """
+    __slots__ = ('move', 'side', 'parent', 'children', 'untried', 'prior', 'visits', 'wins', 'won')
+
+    def __init__(self, move:int, side:int, parent:'MCTSNode'=None, prior:float=1.0) -> None:
+        self.move = move # cell index, None at the root
+        self.side = side
+        self.parent = parent
+        self.children = []
+        self.untried = None # [(prior, cell index)] not expanded yet, strongest last; None until the node is first expanded
+        self.prior = prior
+        self.visits = 0
+        self.wins = 0.0 # total reward for side, 1 a win, 0 a loss
+        self.won = False # move wins the game
+
+
+class MCTSPlayer(Player):
+    """
+    Monte Carlo tree search: UCT selection with a bonus for the moves the tile values favour,
+    which are also expanded first, and short greedy playouts cut off by the board's score.
+    The tree is kept between moves, and with workers > 1 several independent trees are searched in
+    processes and their root visits added up, so strength grows with both time and cores.
+    """
+    def __init__(self, time_lim:float=5, max_playouts:int=None, branch_factor:int=12, exploration:float=1.0, \
+                 prior_weight:float=2.0, rollout_depth:int=20, score_scale:float=50, workers:int=1, seed:int=None) -> None:
+        """ Initialize the MCTS player
+        :param time_lim: seconds per move
+        :param max_playouts: also stop after this many playouts (None: only time_lim)
+        :param branch_factor: moves considered at a node, the ones with the highest tile values
+        :param exploration: UCT exploration constant
+        :param prior_weight: weight of the tile value bonus, which fades as a move is visited
+        :param rollout_depth: plies played out before the board's score decides the playout
+        :param score_scale: board score at which a cut off playout counts as about 0.88 of a win
+        :param workers: processes searching trees of their own (tree reuse only applies with one)
+        """
+        super().__init__()
+        self.time_lim = time_lim
+        self.max_playouts = max_playouts
+        self.branch_factor = branch_factor
+        self.exploration = exploration
+        self.prior_weight = prior_weight
+        self.rollout_depth = rollout_depth
+        self.score_scale = score_scale
+        self.workers = workers
+        self.rng = Random(seed)
+        self.pool = None
+
+        self.root = None # the tree, kept for the next move
+        self.root_history = [] # board history at the root
+        self.num_playouts = 0
+        self.reused_visits = 0
+
+    def get_move(self, board:Board) -> tuple:
+        """ Search the position for time_lim seconds or max_playouts playouts, and play the most visited move """
+        side = SIDES[self.mark]
+        if board.num_tiles_placed == 0:
+            return (board.width // 2, board.height // 2, self.mark)
+
+        if self.workers > 1:
+            stats = self.search_parallel(board)
+        else:
+            root = self.search(board, side)
+            stats = [(child.move, child.visits, child.wins) for child in root.children]
+        move = max(stats, key=lambda stat: stat[1])[0]
+        print(f"Ran {self.num_playouts} playouts ({self.reused_visits} reused from the last move)")
+        return board.decode_move(move, side)
+
+    def search(self, board:Board, side:int, time_lim:float=None, max_playouts:int=None) -> MCTSNode:
+        """ Grow the tree of the position, reusing the last one if the board continues it, and return its root """
+        time_lim = self.time_lim if time_lim is None else time_lim
+        max_playouts = self.max_playouts if max_playouts is None else max_playouts
+
+        root = self.reuse_tree(board)
+        if root is None or root.side == side:
+            root = MCTSNode(None, 1 - side)
+        self.root, self.root_history = root, board.history[:]
+        self.reused_visits = root.visits
+        self.num_playouts = 0
+
+        start = time()
+        while time() - start < time_lim and (max_playouts is None or self.num_playouts < max_playouts):
+            self.playout(board, root)
+            self.num_playouts += 1
+            if root.children and len(root.children) == 1 and not root.untried and root.visits > 1:
+                break # only one move to play
+        return root
+
+    def reuse_tree(self, board:Board):
+        """ The node of the last tree that the board's position is in, or None """
+        history, known = board.history, len(self.root_history)
+        if self.root is None or len(history) < known or history[:known] != self.root_history:
+            return None
+        node = self.root
+        for idx, _ in history[known:]:
+            node = next((child for child in node.children if child.move == idx), None)
+            if node is None:
+                return None
+        node.parent = None
+        return node
+
+    def expand_moves(self, board:Board, side:int) -> list:
+        """ The branch_factor strongest moves for side with their priors, weakest first """
+        moves = []
+        for idx, tile in board.candidate_tiles():
+            strength = abs(tile.get_value_side(side)) + abs(tile.get_value_side(1 - side))
+            if strength > 0:
+                moves.append((strength, idx))
+        moves.sort()
+        moves = moves[-self.branch_factor:]
+        total = sum(strength for strength, _ in moves) or 1
+        return [(strength / total, idx) for strength, idx in moves]
+
+    def select(self, node:MCTSNode) -> MCTSNode:
+        """ UCT with a tile value bonus that fades with visits """
+        log_visits = math.log(node.visits)
+        exploration, prior_weight = self.exploration, self.prior_weight
+        return max(node.children, key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits) + prior_weight * child.prior / (1 + child.visits))
+
+    def playout(self, board:Board, root:MCTSNode) -> None:
+        """ Select down the tree, expand one move, play out from it and back the result up """
+        node = root
+        played = []
+        while True:
+            if node.won:
+                value_O = 1.0 if node.side == 0 else 0.0
+                break
+            side = 1 - node.side
+            if node.untried is None:
+                node.untried = self.expand_moves(board, side)
+            if node.untried: # expand the strongest move not tried yet
+                prior, move = node.untried.pop()
+                played.append((board.play(move, side), move, side))
+                child = MCTSNode(move, side, node, prior)
+                child.won = board.is_win(move, side)
+                node.children.append(child)
+                node = child
+                value_O = (1.0 if side == 0 else 0.0) if child.won else self.rollout(board, 1 - side)
+                break
+            if not node.children: # board full
+                value_O = 0.5
+                break
+            node = self.select(node)
+            played.append((board.play(node.move, node.side), node.move, node.side))
+
+        while node is not None:
+            node.visits += 1
+            node.wins += value_O if node.side == 0 else 1 - value_O
+            node = node.parent
+        for change, idx, side in reversed(played):
+            board.undo(change, idx, side)
+
+    def rollout(self, board:Board, side:int) -> float:
+        """ Play greedy, slightly random moves from the position, side first
+        :return: the result for O: 1 a win, 0 a loss, and in between by the board's score if no one won in time
+        """
+        logic, random = board.logic, self.rng.random
+        candidates = {idx for idx, tile in board.candidate_tiles() if tile.get_value_side(0) != 0 or tile.get_value_side(1) != 0}
+        played = []
+        value_O = None
+        for _ in range(self.rollout_depth):
+            if not candidates:
+                break
+            move = max(candidates, key=lambda idx: (abs(logic[idx].get_value_side(0)) + abs(logic[idx].get_value_side(1))) * (1 + random()))
+            change = board.play(move, side)
+            played.append((change, move, side))
+            if board.is_win(move, side):
+                value_O = 1.0 if side == 0 else 0.0
+                break
+            candidates.discard(move)
+            candidates.update(idx for idx, _, _ in change)
+            side = 1 - side
+
+        if value_O is None:
+            value_O = 0.5 + 0.5 * math.tanh(board.score_board(board) / self.score_scale)
+        for change, idx, played_side in reversed(played):
+            board.undo(change, idx, played_side)
+        return value_O
+
+    def search_parallel(self, board:Board) -> list:
+        """ Search independent trees in worker processes and add up their root statistics """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        settings = dict(time_lim=self.time_lim, max_playouts=self.max_playouts, branch_factor=self.branch_factor,
+                        exploration=self.exploration, prior_weight=self.prior_weight, rollout_depth=self.rollout_depth,
+                        score_scale=self.score_scale)
+        snapshot = board.to_bytes()
+        futures = [self.pool.submit(mcts_root_stats, snapshot, self.mark, settings, self.rng.getrandbits(32)) for _ in range(self.workers)]
+
+        totals = dict()
+        self.num_playouts = self.reused_visits = 0
+        for future in futures:
+            stats, playouts = future.result()
+            self.num_playouts += playouts
+            for move, visits, wins in stats:
+                old_visits, old_wins = totals.get(move, (0, 0.0))
+                totals[move] = (old_visits + visits, old_wins + wins)
+        return [(move, visits, wins) for move, (visits, wins) in totals.items()]
+
+    def close(self) -> None:
+        """ Shut the worker processes down """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def search_position(snapshot:bytes, depth:int, branch_factor:int, time_limit:float, selective:bool=False, \
+                    keep_table:bool=True, multi_pv:int=1) -> dict:
+    """
+    Find the move of the side to move in a Board.to_bytes snapshot. Meant to run in worker processes:
+    each process keeps one AI for each of the last MAX_SEARCH_AIS settings it was asked for, so their
+    transposition tables carry over from one search to the next.
+    :param time_limit: seconds, enforced even in the middle of an iteration
+    :param keep_table: reuse the transposition table of earlier searches in this process. Faster, but the result
+                       then depends on which positions the process searched before
+    :param multi_pv: also score this many of the best moves exactly
+    :return: {'move': (tile_x, tile_y, mark), 'score': for the side to move, 'depth': deepest finished, 'nodes', 'search_time',
+              'lines': [(move, score, principal variation)] of the best moves, best first}
+    """
+    board = Board.from_bytes(snapshot)
+    start = time()
+    side = board.side_to_move
+    if board.num_tiles_placed == 0:
+        move = (board.width // 2, board.height // 2, MARKS[side])
+        return {'move': move, 'score': None, 'depth': 0, 'nodes': 0, 'search_time': 0.0, 'lines': [(move, None, [move])]}
+
+    key = (depth, branch_factor, selective)
+    ai = _search_ais.pop(key, None)
+    if ai is None:
+        ai = AI(depth, branch_factor, ponder_width=0, late_move_reductions=selective, null_move=selective)
+        if len(_search_ais) >= MAX_SEARCH_AIS:
+            _search_ais.popitem(last=False)
+    _search_ais[key] = ai
+    ai.mark = MARKS[side]
+    if not keep_table or len(ai.transposition_table) > SEARCH_TABLE_ENTRIES // MAX_SEARCH_AIS:
+        ai.transposition_table.clear()
+
+    with redirect_stdout(io.StringIO()): # the search prints its statistics
+        for result in ai.iter_search(board, depth, branch_factor, time_limit, hard_time_lim=time_limit, multi_pv=multi_pv):
+            pass
+
+    return {'move': result.move, 'score': ai.last_score, 'depth': ai.last_depth, 'nodes': ai.num_states_searched,
+            'search_time': time() - start, 'lines': result.lines}
+
+def mcts_root_stats(snapshot:bytes, mark:str, settings:dict, seed:int) -> Tuple[list, int]:
+    """ Worker for MCTSPlayer.search_parallel: search a Board.to_bytes snapshot with a tree of its own
+    :return: ([(cell index, visits, wins) of each root move], number of playouts)
+    """
+    board = Board.from_bytes(snapshot)
+    player = MCTSPlayer(seed=seed, **settings)
+    root = player.search(board, SIDES[mark])
+    return [(child.move, child.visits, child.wins) for child in root.children], player.num_playouts
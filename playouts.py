@@ -0,0 +1,166 @@
+""" Plays many random games at once as NumPy arrays, for fast playouts and statistics """
+
+import argparse
+import numpy as np
+from time import perf_counter
+from typing import Optional, Tuple
+
+from board import Board, EMPTY
+
+# A batch is B independent games on the same board size. stones is (B, height, width) with the cell values
+# of Board (EMPTY, or side + 1), side the side to move in each game, done whether it has ended and
+# winner its winning side, or -1 for a draw or a game still going. Every move of every game is made
+# at once: each game draws a move from its own weights, and wins are found by comparing shifted boards.
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1)) # as (dy, dx): right, down and both diagonals
+POLICIES = ('weighted', 'uniform')
+REACH = 2 # moves are drawn from the tiles within this many tiles of a stone
+NEARBY = np.ones((2 * REACH + 1, 2 * REACH + 1), dtype=np.int32) # what a stone adds to the weights around it:
+NEARBY[1:-1, 1:-1] = 5 # 1 up to two tiles away, 5 next to it
+
+def box_sum(grid:np.ndarray, radius:int) -> np.ndarray:
+    """ For each tile of each (height, width) grid, the sum over the square of the given radius around it """
+    batch, height, width = grid.shape
+    size = 2 * radius + 1
+    padded = np.zeros((batch, height + size, width + size), dtype=np.int32)
+    padded[:, radius + 1:radius + 1 + height, radius + 1:radius + 1 + width] = grid
+    integral = padded.cumsum(axis=1).cumsum(axis=2)
+    return integral[:, size:, size:] - integral[:, :height, size:] - integral[:, size:, :width] + integral[:, :height, :width]
+
+def shifted(grid:np.ndarray, dy:int, dx:int) -> np.ndarray:
+    """ out[:, y, x] = grid[:, y + dy, x + dx], False past the edges """
+    out = np.zeros_like(grid)
+    height, width = grid.shape[1:]
+    out[:, max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] = \
+        grid[:, max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+    return out
+
+def has_line(own:np.ndarray, win_length:int) -> np.ndarray:
+    """ Which (height, width) boolean grids have win_length Trues in a row in any direction """
+    found = np.zeros(len(own), dtype=bool)
+    for dy, dx in DIRECTIONS:
+        line = own.copy()
+        for offset in range(1, win_length):
+            line &= shifted(own, offset * dy, offset * dx)
+        found |= line.any(axis=(1, 2))
+    return found
+
+
+class Playouts():
+    """
+    A batch of games played out at once with a random policy over the tiles near the stones:
+    'uniform' picks any empty tile within two tiles of a stone, 'weighted' favours tiles with more
+    stones around them. The first move of an empty board is anywhere.
+    """
+    def __init__(self, stones:np.ndarray, side:np.ndarray, win_length:int=5, policy:str='weighted', seed:int=None) -> None:
+        """
+        :param stones: (games, height, width) cell values
+        :param side: side to move in each game
+        """
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown policy {policy}, expected one of {POLICIES}!')
+        self.stones = np.array(stones, dtype=np.int8)
+        self.side = np.array(side, dtype=np.int8)
+        self.win_length = win_length
+        self.policy = policy
+        self.rng = np.random.default_rng(seed)
+
+        games, height, width = self.stones.shape
+        # the weights of the weighted policy, kept up to date as stones are added, padded by REACH on each side
+        occupied = self.stones != EMPTY
+        self.nearby = np.zeros((games, height + 2 * REACH, width + 2 * REACH), dtype=np.int32)
+        self.nearby[:, REACH:-REACH, REACH:-REACH] = 4 * box_sum(occupied, 1) + box_sum(occupied, REACH)
+
+        self.done = np.zeros(games, dtype=bool)
+        self.winner = np.full(games, -1, dtype=np.int8)
+        self.moves = np.zeros(games, dtype=np.int64) # moves played by each game in the batch
+        self.moves_played = 0 # by all of them
+
+    @classmethod
+    def from_board(cls, board:Board, games:int, policy:str='weighted', seed:int=None) -> 'Playouts':
+        """ games copies of a board's position """
+        grid = np.asarray(board.cells, dtype=np.int8)[np.asarray(board.tables.playable)].reshape(board.height, board.width)
+        return cls(np.broadcast_to(grid, (games, board.height, board.width)), np.full(games, board.side_to_move),
+                   board.win_length, policy, seed)
+
+    def weights(self, active:np.ndarray, stones:np.ndarray) -> np.ndarray:
+        """ How likely each tile is to be played, for the active games with these stones """
+        occupied = stones != EMPTY
+        weights = self.nearby[active, REACH:-REACH, REACH:-REACH]
+        if self.policy == 'uniform':
+            weights = (weights > 0).astype(np.int32)
+        weights[occupied] = 0
+        first = ~occupied.any(axis=(1, 2)) # empty boards: any tile
+        weights[first] = 1
+        return weights
+
+    def step(self) -> None:
+        """ Play one move in every game still going """
+        active = np.flatnonzero(~self.done)
+        if len(active) == 0:
+            return
+        stones, side = self.stones[active], self.side[active]
+        games, height, width = stones.shape
+
+        cumulative = self.weights(active, stones).reshape(games, -1).cumsum(axis=1)
+        full = cumulative[:, -1] == 0
+        pick = self.rng.random(games) * cumulative[:, -1]
+        move = (cumulative <= pick[:, None]).sum(axis=1)
+        move[full] = 0
+
+        flat = stones.reshape(games, -1)
+        playing = ~full
+        flat[playing, move[playing]] = side[playing] + 1
+        won = playing & has_line(stones == (side + 1)[:, None, None], self.win_length)
+
+        self.stones[active] = stones
+        placed = active[playing]
+        tile_y, tile_x = np.divmod(move[playing], width)
+        patch = np.arange(2 * REACH + 1)
+        self.nearby[placed[:, None, None], tile_y[:, None, None] + patch[None, :, None], tile_x[:, None, None] + patch] += NEARBY
+        self.moves[active] += playing
+        self.moves_played += int(playing.sum())
+        self.winner[active[won]] = side[won]
+        self.done[active[won | full | ~(flat == EMPTY).any(axis=1)]] = True
+        self.side[active] = 1 - side
+
+    def run(self, max_moves:int=None) -> np.ndarray:
+        """ Play until every game ends, or for at most max_moves more moves
+        :return: the winner of each game, -1 for a draw or a game cut short
+        """
+        step = 0
+        while not self.done.all() and (max_moves is None or step < max_moves):
+            self.step()
+            step += 1
+        return self.winner
+
+
+def evaluate(board:Board, games:int=256, max_moves:int=None, policy:str='weighted', seed:int=None) -> float:
+    """ O's score over games random playouts from a board: 1 for a win, 0.5 for a draw or an unfinished game """
+    winner = Playouts.from_board(board, games, policy, seed).run(max_moves)
+    return float(np.mean(np.where(winner == 0, 1.0, np.where(winner == 1, 0.0, 0.5))))
+
+def benchmark(games:int, size:int, policy:str, seed:Optional[int]=None) -> Tuple[np.ndarray, float, int]:
+    """ Play games playouts from an empty board: (winners, seconds, moves played) """
+    board = Board(size * 40, size * 40, 40, verbose=False)
+    playouts = Playouts.from_board(board, games, policy, seed)
+    start = perf_counter()
+    winner = playouts.run()
+    return winner, perf_counter() - start, playouts.moves_played
+
+def main():
+    parser = argparse.ArgumentParser(description='Time batched random playouts from an empty board')
+    parser.add_argument('-n', '--games', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--policy', choices=POLICIES, default='weighted')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    winner, seconds, moves = benchmark(args.games, args.size, args.policy, args.seed)
+    print(f'{args.games} playouts in {seconds:.2f}s: {args.games / seconds:.0f} playouts/s, {moves / seconds:.0f} moves/s')
+    print(f'O won {np.mean(winner == 0):.1%}, X {np.mean(winner == 1):.1%}, drawn {np.mean(winner == -1):.1%}, '
+          f'{moves / args.games:.1f} moves per game')
+
+
+if __name__ == '__main__':
+    main()
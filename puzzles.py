@@ -0,0 +1,207 @@
+""" Solves a suite of positions with known correct moves and reports how often, how fast and in how many nodes the AI does """
+
+import argparse
+import io
+import json
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+from typing import Iterable, Iterator, NamedTuple
+
+from board import Board, BACKENDS, MARKS
+from players import AI
+
+# A puzzle is one line: name | kind | correct moves | game record
+# The game record is the moves leading to the position, O first, then alternating, as x,y pairs like in analyse.py.
+# The side to move should play one of the correct moves, also x,y pairs separated by spaces. The kinds:
+#   win1    complete five
+#   block   the opponent has a four: block its one empty tile
+#   win3    make two fives at once (an open four, or two fours), to win in three plies
+#   vcf     win by continuous fours: every move makes a four, so every reply is forced. The correct moves start one
+#   defend  the opponent wins if left alone, by an open four or by continuous fours: the correct moves stop every such win
+# Lines that are empty or start with # are skipped.
+
+KINDS = ('win1', 'block', 'win3', 'vcf', 'defend')
+
+
+class Puzzle(NamedTuple):
+    name: str
+    kind: str
+    solutions: list # (tile_x, tile_y) of the correct moves
+    moves: list # (tile_x, tile_y, mark) leading to the position
+    line: int # in the puzzle file
+
+def parse_coords(text:str) -> list:
+    return [tuple(int(c) for c in token.split(',')) for token in text.split()]
+
+def parse_puzzles(lines:Iterable[str]) -> Iterator[Puzzle]:
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) != 4:
+            raise ValueError(f'line {line_no}: expected name | kind | correct moves | game record')
+        name, kind, solutions, record = fields
+        if kind not in KINDS:
+            raise ValueError(f'line {line_no}: unknown kind {kind}, expected one of {KINDS}')
+        try:
+            solutions, coords = parse_coords(solutions), parse_coords(record)
+        except ValueError as e:
+            raise ValueError(f'line {line_no}: not a list of x,y moves ({e})') from None
+        if not solutions:
+            raise ValueError(f'line {line_no}: no correct moves')
+        yield Puzzle(name, kind, solutions, [(x, y, MARKS[ply % 2]) for ply, (x, y) in enumerate(coords)], line_no)
+
+def load_puzzles(path:str) -> list:
+    with open(path) as f:
+        return list(parse_puzzles(f))
+
+def setup_board(puzzle:Puzzle, size:int=15, backend:str='python') -> Board:
+    """ The position of a puzzle, checked to be a game still going with empty tiles for its correct moves """
+    board = Board(size * 40, size * 40, 40, verbose=False, backend=backend)
+    for ply, move in enumerate(puzzle.moves):
+        if not board.check_legal(move):
+            raise ValueError(f'{puzzle.name}: illegal move {move[:2]} at ply {ply + 1}')
+        board.update_board(move, graphic=False)
+        if board.check_win(move)[0]:
+            raise ValueError(f'{puzzle.name}: the game is over at ply {ply + 1}')
+    mark = MARKS[board.side_to_move]
+    for x, y in puzzle.solutions:
+        if not board.check_legal((x, y, mark)):
+            raise ValueError(f'{puzzle.name}: correct move {x},{y} is not a legal move')
+    return board
+
+def new_ai(depth:int, branch_factor:int, selective:bool=False, adaptive:bool=False, node_budget:int=0) -> AI:
+    return AI(depth, branch_factor, ponder_width=0, late_move_reductions=selective, null_move=selective,
+              adaptive=adaptive, node_budget=node_budget)
+
+def solve_depth(puzzle:Puzzle, board:Board, depth:int, branch_factor:int, **settings) -> dict:
+    """ One AI.get_move search to a fixed depth, from an empty transposition table
+    :param settings: for new_ai
+    """
+    ai = new_ai(depth, branch_factor, **settings)
+    ai.mark = MARKS[board.side_to_move]
+    start = perf_counter()
+    with redirect_stdout(io.StringIO()): # the search prints its statistics
+        move = ai.get_move(board, depth, branch_factor)
+    seconds = perf_counter() - start
+    solved = move[:2] in puzzle.solutions
+    return {'name': puzzle.name, 'kind': puzzle.kind, 'move': list(move[:2]), 'solved': solved, 'depth': depth,
+            'nodes': ai.num_states_searched, 'time': round(seconds, 4),
+            'first_correct': {'depth': depth, 'nodes': ai.num_states_searched, 'time': round(seconds, 4)} if solved else None}
+
+def solve_timed(puzzle:Puzzle, board:Board, time_lim:float, branch_factor:int, max_depth:int=20, **settings) -> dict:
+    """
+    An iterative deepening search, as get_move_iterative_deepening, aborted after time_lim seconds.
+    first_correct is where the best move turned correct for good: the depth, nodes and seconds of the first
+    iteration from which on every iteration found a correct move, None if the last one did not
+    """
+    ai = new_ai(max_depth, branch_factor, **settings)
+    ai.mark = MARKS[board.side_to_move]
+    first_correct = None
+    start = perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for result in ai.iter_search(board, max_depth, branch_factor, time_lim, hard_time_lim=time_lim):
+            if result.move[:2] not in puzzle.solutions:
+                first_correct = None
+            elif first_correct is None:
+                first_correct = {'depth': result.depth, 'nodes': result.nodes, 'time': round(result.elapsed, 4)}
+    seconds = perf_counter() - start
+    return {'name': puzzle.name, 'kind': puzzle.kind, 'move': list(result.move[:2]), 'solved': first_correct is not None,
+            'depth': ai.last_depth, 'nodes': ai.num_states_searched, 'time': round(seconds, 4), 'first_correct': first_correct}
+
+def run(puzzles:list, depth:int=None, time_lim:float=None, branch_factor:int=10, size:int=15, backend:str='python',
+        max_depth:int=20, verbose:bool=True, **settings) -> dict:
+    """ Solve every puzzle to a fixed depth, or else with a fixed time budget each
+    :param settings: for new_ai
+    :return: the results of every puzzle, with their solve rate, nodes and time, overall and by kind
+    """
+    results = []
+    for puzzle in puzzles:
+        board = setup_board(puzzle, size, backend)
+        if depth is not None:
+            result = solve_depth(puzzle, board, depth, branch_factor, **settings)
+        else:
+            result = solve_timed(puzzle, board, time_lim, branch_factor, max_depth, **settings)
+        results.append(result)
+        if verbose:
+            print(f'{puzzle.name}: {"solved" if result["solved"] else "missed"}, played {result["move"]} '
+                  f'({result["nodes"]} nodes, {result["time"]:.2f}s)', file=sys.stderr, flush=True)
+
+    kinds = {}
+    for result in results:
+        solved, total = kinds.get(result['kind'], (0, 0))
+        kinds[result['kind']] = (solved + result['solved'], total + 1)
+    solved = sum(result['solved'] for result in results)
+    return {'budget': f'depth={depth}' if depth is not None else f'time={time_lim:g}', 'depth': depth, 'time_limit': time_lim,
+            'solved': solved, 'total': len(results), 'solve_rate': round(solved / max(len(results), 1), 4),
+            'nodes': sum(result['nodes'] for result in results),
+            'time': round(sum(result['time'] for result in results), 4),
+            'kinds': {kind: {'solved': solved, 'total': total} for kind, (solved, total) in kinds.items()},
+            'results': results}
+
+def compare(old:dict, new:dict) -> Iterator[str]:
+    """ What changed between two reports, budget by budget """
+    old_runs = {run['budget']: run for run in old['runs']}
+    for run in new['runs']:
+        before = old_runs.get(run['budget'])
+        if before is None:
+            continue
+        yield (f"{run['budget']}: solved {before['solved']}/{before['total']} -> {run['solved']}/{run['total']}, "
+               f"nodes {before['nodes']} -> {run['nodes']}, {before['time']:.2f}s -> {run['time']:.2f}s")
+        earlier = {result['name']: result for result in before['results']}
+        for result in run['results']:
+            was = earlier.get(result['name'])
+            if was is not None and was['solved'] != result['solved']:
+                yield f"  {result['name']}: {'now solved' if result['solved'] else 'no longer solved'}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve positions with known correct moves and report the results as JSON')
+    parser.add_argument('puzzles', nargs='?', default='puzzles.txt', help='puzzle file, one per line')
+    parser.add_argument('-o', '--output', default='-', help='JSON report to write, - for stdout')
+    parser.add_argument('-d', '--depth', type=int, action='append', help='search every puzzle to this depth (repeatable)')
+    parser.add_argument('-t', '--time', type=float, action='append', help='seconds per puzzle, deepening (repeatable)')
+    parser.add_argument('-b', '--branch-factor', type=int, default=10)
+    parser.add_argument('-s', '--selective', action='store_true', help='late move reductions and null move pruning')
+    parser.add_argument('-a', '--adaptive', action='store_true', help='narrow quiet nodes, widen and extend forcing lines')
+    parser.add_argument('--node-budget', type=int, default=0, help='nodes an adaptive search may add on top of what it saves')
+    parser.add_argument('-k', '--kind', choices=KINDS, action='append', help='only puzzles of this kind (repeatable)')
+    parser.add_argument('--max-depth', type=int, default=20, help='deepest iteration of the timed searches')
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--backend', choices=BACKENDS, default='python')
+    parser.add_argument('--compare', default=None, help='earlier report to print the differences from')
+    args = parser.parse_args()
+
+    puzzles = [puzzle for puzzle in load_puzzles(args.puzzles) if args.kind is None or puzzle.kind in args.kind]
+    depths, times = args.depth or [], args.time or []
+    if not depths and not times:
+        depths, times = [4], [1.0]
+
+    settings = {'selective': args.selective, 'adaptive': args.adaptive, 'node_budget': args.node_budget}
+    runs = [run(puzzles, depth=depth, branch_factor=args.branch_factor, size=args.size, backend=args.backend, **settings)
+            for depth in depths]
+    runs += [run(puzzles, time_lim=time_lim, branch_factor=args.branch_factor, size=args.size, backend=args.backend,
+                 max_depth=args.max_depth, **settings) for time_lim in times]
+    report = {'puzzles': args.puzzles, 'branch_factor': args.branch_factor, **settings, 'backend': args.backend, 'runs': runs}
+
+    for result in runs:
+        kinds = ', '.join(f"{kind} {counts['solved']}/{counts['total']}" for kind, counts in result['kinds'].items())
+        print(f"{result['budget']}: solved {result['solved']}/{result['total']} ({kinds}), {result['nodes']} nodes, "
+              f"{result['time']:.2f}s", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), report):
+                print(line, file=sys.stderr)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        json.dump(report, output, indent=1)
+        output.write('\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+""" Plays engine games against themselves and streams every position to memory-mappable .npy shards """
+
+import argparse
+import glob
+import io
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from time import time
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from board import Board, MARKS
+from players import MCTSPlayer, Player
+from tournament import make_player, random_opening
+
+# A shard is a plain .npy file holding a 1-d array of records (see record_dtype), so np.load(path, mmap_mode='r')
+# reads any part of it without loading the rest. ShardWriter appends to it in place: its header reserves room
+# for the largest count and is rewritten after every write, so a shard is a valid array at any time, even
+# if the writer is killed, and memory only holds the game being written. Each process writes shards of
+# its own, which are named prefix-00000.npy, prefix-00001.npy, ... and never shared.
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+SCORE_CLIP = 1e4 # scores past this (wins and losses) are clipped before turning choices into a policy
+
+def record_dtype(width:int, height:int) -> np.dtype:
+    """ One position of a self-play game:
+    stones: 1 where O (plane 0) or X (plane 1) has a stone. side: to move, 0 for O. score: of the search, for the
+    side to move (the AI's score, or MCTS's mean reward for the move in [-1, 1]). move: tile number played
+    (tile_y * width + tile_x). policy: share of the root visits (MCTS) or softmax of the root choice scores (AI)
+    per tile. result: of the game for the side to move, 1 a win, 0 a draw, -1 a loss. ply: stones on the board
+    """
+    return np.dtype([('stones', np.uint8, (2, height, width)), ('side', np.int8), ('score', np.float32), ('move', np.int16),
+                     ('policy', np.float32, (height, width)), ('result', np.int8), ('ply', np.int16)])
+
+def header_dict(dtype:np.dtype, count:int) -> bytes:
+    return repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (count,)}).encode('latin1')
+
+def header_length(dtype:np.dtype, count:int) -> int:
+    """ Bytes of the shortest .npy header for count records """
+    return len(NPY_MAGIC) + 2 + len(header_dict(dtype, count)) + 1
+
+def npy_header(dtype:np.dtype, count:int, size:int) -> bytes:
+    """ A version 1.0 .npy header for count records, padded with spaces to size bytes """
+    header = header_dict(dtype, count)
+    padding = size - len(NPY_MAGIC) - 2 - len(header) - 1
+    if padding < 0:
+        raise ValueError('The .npy header does not fit!')
+    return NPY_MAGIC + struct.pack('<H', size - len(NPY_MAGIC) - 2) + header + b' ' * padding + b'\n'
+
+
+class ShardWriter():
+    """
+    Streams records to numbered .npy shards of at most shard_size records in a directory, starting a new
+    shard when one is full. Shards already there with the same prefix are kept, and numbering continues after them.
+    """
+    def __init__(self, directory:str, prefix:str, dtype:np.dtype, shard_size:int=65536) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.dtype = dtype
+        self.shard_size = shard_size
+        # room for the header of a full shard, rounded up to keep the records 64-byte aligned
+        self.header_size = (header_length(dtype, shard_size) + 63) // 64 * 64
+
+        existing = glob.glob(os.path.join(glob.escape(directory), glob.escape(prefix) + '-*.npy'))
+        self.shard = max((int(path[-9:-4]) for path in existing if path[-9:-4].isdigit()), default=-1) + 1
+        self.file = None
+        self.count = 0 # records in the current shard
+        self.written = 0 # records in all shards of this writer
+
+    def path(self, shard:int) -> str:
+        return os.path.join(self.directory, f'{self.prefix}-{shard:05d}.npy')
+
+    def write(self, records:np.ndarray) -> None:
+        """ Append records of the writer's dtype """
+        records = np.ascontiguousarray(records, dtype=self.dtype)
+        while len(records):
+            if self.file is None:
+                self.file = open(self.path(self.shard), 'wb')
+                self.file.write(npy_header(self.dtype, 0, self.header_size))
+                self.count = 0
+            chunk, records = records[:self.shard_size - self.count], records[self.shard_size - self.count:]
+            self.file.write(chunk.tobytes())
+            self.count += len(chunk)
+            self.written += len(chunk)
+            self.file.seek(0)
+            self.file.write(npy_header(self.dtype, self.count, self.header_size))
+            self.file.seek(0, os.SEEK_END)
+            if self.count == self.shard_size:
+                self.close()
+
+    def close(self) -> None:
+        """ Finish the current shard; the next write starts a new one """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.shard += 1
+
+    def __enter__(self) -> 'ShardWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def iter_shards(directory:str, prefix:str='*') -> Iterator[np.ndarray]:
+    """ Every shard in a directory, memory-mapped, in name order """
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), prefix + '-*.npy'))):
+        yield np.load(path, mmap_mode='r')
+
+def augment(records:np.ndarray, symmetries:list) -> np.ndarray:
+    """ The records under each symmetry, given as the tile number each tile number maps to (see tables.Tables) """
+    height, width = records['policy'].shape[1:]
+    out = []
+    for mapped in symmetries:
+        mapped = np.asarray(mapped)
+        moved = records.copy()
+        stones = np.empty_like(records['stones'].reshape(len(records), 2, -1))
+        stones[:, :, mapped] = records['stones'].reshape(len(records), 2, -1)
+        moved['stones'] = stones.reshape(len(records), 2, height, width)
+        policy = np.empty_like(records['policy'].reshape(len(records), -1))
+        policy[:, mapped] = records['policy'].reshape(len(records), -1)
+        moved['policy'] = policy.reshape(len(records), height, width)
+        moved['move'] = mapped[records['move']]
+        out.append(moved)
+    return np.concatenate(out)
+
+### SELF-PLAY ###
+
+def choice_policy(choices:list, width:int, temperature:float) -> Tuple[list, np.ndarray]:
+    """ Softmax of the root choice scores ((tile_x, tile_y, mark), score): (their tile numbers, their share of the policy) """
+    scores = np.clip([score for _, score in choices], -SCORE_CLIP, SCORE_CLIP) / temperature
+    weights = np.exp(scores - scores.max())
+    tiles = [tile_y * width + tile_x for (tile_x, tile_y, _), _ in choices]
+    return tiles, weights / weights.sum()
+
+def search(player:Player, board:Board, temperature:float) -> Tuple[int, float, list, list]:
+    """ Search the board's position with a player
+    :return: (tile number of the best move, its score, tile numbers of the root moves, their share of the policy)
+    """
+    side = board.side_to_move
+    player.mark = MARKS[side]
+    if isinstance(player, MCTSPlayer):
+        root = player.search(board, side)
+        children = [child for child in root.children if child.visits > 0]
+        numbers = board.tables.numbers
+        best = max(children, key=lambda child: child.visits)
+        visits = np.array([child.visits for child in children], dtype=np.float64)
+        return numbers[best.move], 2 * best.wins / best.visits - 1, [numbers[child.move] for child in children], visits / visits.sum()
+
+    with redirect_stdout(io.StringIO()): # the search prints its statistics
+        for result in player.iter_search(board, player.minimax_depth, player.branch_factor, player.time_lim):
+            pass
+    tile_x, tile_y, _ = result.move
+    if result.choices is None: # aborted before depth 1 finished, or nothing to search
+        return tile_y * board.width + tile_x, float('nan'), [tile_y * board.width + tile_x], np.ones(1)
+    tiles, policy = choice_policy(result.choices, board.width, temperature)
+    return tile_y * board.width + tile_x, result.score, tiles, policy
+
+def play_game(player:Player, size:int, opening:list, rng:random.Random, temperature:float=20, sample_plies:int=0,
+              max_moves:int=None) -> np.ndarray:
+    """ One self-play game after the opening moves, with a record per searched position
+    :param sample_plies: draw the first moves after the opening from the policy instead of playing the best one
+    """
+    board = Board(size * 40, size * 40, 40, verbose=False)
+    for move in opening:
+        board.update_board(move, graphic=False)
+    if isinstance(player, MCTSPlayer):
+        player.root = None # no tree from the last game
+    records, count, winner = [], 0, None
+    dtype = record_dtype(size, size)
+
+    while not board.check_full() and (max_moves is None or len(board.history) < max_moves):
+        side = board.side_to_move
+        best, score, tiles, policy = search(player, board, temperature)
+        if count < sample_plies:
+            best = tiles[rng.choices(range(len(tiles)), weights=policy)[0]]
+
+        record = np.zeros((), dtype=dtype)
+        grid = np.asarray(board.cells, dtype=np.int8)[np.asarray(board.tables.playable)].reshape(size, size)
+        record['stones'] = [grid == 1, grid == 2]
+        record['side'], record['score'], record['move'], record['ply'] = side, score, best, len(board.history)
+        record['policy'].reshape(-1)[tiles] = policy
+        records.append(record)
+        count += 1
+
+        move = (best % size, best // size, MARKS[side])
+        board.update_board(move, graphic=False)
+        if board.check_win(move)[0]:
+            winner = side
+            break
+
+    records = np.array(records, dtype=dtype)
+    if winner is not None:
+        records['result'] = np.where(records['side'] == winner, 1, -1)
+    return records
+
+def generate(directory:str, prefix:str, games:int, engine:str, size:int=15, opening:int=2, symmetries:int=1,
+             shard_size:int=65536, temperature:float=20, sample_plies:int=0, max_moves:int=None, seed:int=None) -> Tuple[int, int]:
+    """ Play games self-play games and append their positions to the prefix's shards in directory.
+    Meant to run in a worker process, one prefix per process.
+    :param symmetries: write each position under this many of the board's symmetries, up to 8 (4 if not square)
+    :return: (games played, records written)
+    """
+    Player.PlayerNumber = 0
+    player = make_player(engine)
+    rng = random.Random(seed)
+    mapped = Board(size * 40, size * 40, 40, verbose=False).tables.symmetries[:max(symmetries, 1)]
+    with ShardWriter(directory, prefix, record_dtype(size, size), shard_size) as writer:
+        for _ in range(games):
+            records = play_game(player, size, random_opening(size, opening, rng), rng, temperature, sample_plies, max_moves)
+            writer.write(augment(records, mapped) if len(mapped) > 1 else records)
+    if isinstance(player, MCTSPlayer):
+        player.close()
+    return games, writer.written
+
+def main():
+    parser = argparse.ArgumentParser(description='Play self-play games and stream their positions to .npy shards')
+    parser.add_argument('output', help='directory for the shards')
+    parser.add_argument('-e', '--engine', default='ai:depth=4,branch_factor=10,time=0.5',
+                        help='engine spec as for tournament.py, e.g. mcts:playouts=800')
+    parser.add_argument('-g', '--games', type=int, default=10, help='games per worker')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='processes, each writing shards of its own')
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--opening', type=int, default=2, help='random stones to start each game from')
+    parser.add_argument('--symmetries', type=int, default=1, help='write each position rotated and reflected this many ways, up to 8')
+    parser.add_argument('--shard-size', type=int, default=65536, help='records per shard')
+    parser.add_argument('--temperature', type=float, default=20, help='of the softmax turning AI choice scores into a policy')
+    parser.add_argument('--sample-plies', type=int, default=0, help='draw this many moves per game from the policy')
+    parser.add_argument('--max-moves', type=int, default=None, help='call the game a draw after this many moves')
+    parser.add_argument('--prefix', default='selfplay', help='shard names start with this, then the worker number')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    seed = random.randrange(1 << 32) if args.seed is None else args.seed
+    start = time()
+    jobs = [(args.output, f'{args.prefix}-w{worker}', args.games, args.engine, args.size, args.opening, args.symmetries,
+             args.shard_size, args.temperature, args.sample_plies, args.max_moves, seed + worker) for worker in range(args.workers)]
+    if args.workers == 1:
+        results = [generate(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(args.workers) as pool:
+            results = list(pool.map(generate, *zip(*jobs)))
+    games, records = (sum(column) for column in zip(*results))
+    seconds = time() - start
+    print(f'{games} games, {records} records in {seconds:.1f}s ({records / seconds:.1f} records/s) written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+""" Serves many human vs AI games at once over a local TCP socket """
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+
+from board import Board, MARKS
+from players import search_position
+
+# Protocol: one JSON object per line each way. Every request has an "op" and gets exactly one reply,
+# {"ok": true, ...} or {"ok": false, "error": ...}. Requests on one connection are answered in order.
+#   {"op": "new", "width": 15, "height": 15, "depth": 4, "branch_factor": 10, "time_limit": 5, "ai_first": false}
+#   {"op": "move", "session": id, "x": tile_x, "y": tile_y}     -> the AI's reply, once it has searched
+#   {"op": "state", "session": id}
+#   {"op": "close", "session": id}
+#   {"op": "metrics"}
+
+TILE_SIZE = 40 # boards are never drawn here, but Board wants a tile size
+
+
+class Session():
+    """ One game: its board, the AI's settings, and whether a search for it is under way """
+    def __init__(self, session_id:int, width:int, height:int, depth:int, branch_factor:int, time_limit:float, \
+                 selective:bool, ai_side:int) -> None:
+        self.session_id = session_id
+        self.board = Board(width * TILE_SIZE, height * TILE_SIZE, TILE_SIZE, verbose=False)
+        self.depth = depth
+        self.branch_factor = branch_factor
+        self.time_limit = time_limit
+        self.selective = selective
+        self.ai_side = ai_side
+        self.winner = None # a mark, or 'draw'
+        self.searching = False
+        self.last_used = time()
+
+    def play(self, move:tuple) -> None:
+        """ Play a legal move and record whether it ends the game """
+        self.board.update_board(move, graphic=False)
+        if self.board.check_win(move)[0]:
+            self.winner = move[2]
+        elif self.board.check_full():
+            self.winner = 'draw'
+
+    def state(self) -> dict:
+        return {'session': self.session_id, 'tiles': self.board.tiles, 'moves': [list(self.board.decode_move(idx, side)) for idx, side in self.board.history],
+                'ai_mark': MARKS[self.ai_side], 'to_move': MARKS[self.board.side_to_move], 'winner': self.winner}
+
+
+class GameServer():
+    """
+    Hosts game sessions and sends their searches to a shared process pool.
+    At most `workers` searches run at once; up to max_pending more wait in line, and past that
+    moves are refused with a "busy" error instead of piling up, so latency stays bounded under load.
+    """
+    def __init__(self, workers:int=None, max_pending:int=None, max_sessions:int=10000, idle_timeout:float=3600, \
+                 max_time_limit:float=30, max_depth:int=8, max_branch_factor:int=40) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = self.workers * 4 if max_pending is None else max_pending
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_time_limit = max_time_limit
+        self.max_depth = max_depth
+        self.max_branch_factor = max_branch_factor
+
+        self.pool = None
+        self.slots = None
+        self.sessions = dict()
+        self.session_ids = itertools.count(1)
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=1000) # seconds from the move arriving to the AI's reply, for the last searches
+        self.queue_waits = deque(maxlen=1000)
+
+    async def serve(self, host:str='127.0.0.1', port:int=7878) -> None:
+        """ Run the server until cancelled """
+        self.pool = ProcessPoolExecutor(self.workers)
+        self.slots = asyncio.Semaphore(self.workers)
+        server = await asyncio.start_server(self.handle_client, host, port)
+        reaper = asyncio.create_task(self.reap_sessions())
+        print(f"Serving on {host}:{port} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reaper.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+    async def handle_client(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        """ Answer one connection's requests in order. A slow client only holds up its own connection """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    reply = await self.dispatch(request)
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {'ok': False, 'error': f'bad request: {e}'}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request:dict) -> dict:
+        op = request['op']
+        if op == 'metrics':
+            return {'ok': True, **self.metrics()}
+        if op == 'new':
+            return await self.new_game(request)
+        if op not in ('move', 'state', 'close'):
+            return {'ok': False, 'error': f'unknown op {op}'}
+
+        session = self.sessions.get(request['session'])
+        if session is None:
+            return {'ok': False, 'error': 'no such session'}
+        session.last_used = time()
+
+        if op == 'move':
+            return await self.move(session, int(request['x']), int(request['y']))
+        if op == 'state':
+            return {'ok': True, **session.state()}
+        del self.sessions[session.session_id]
+        return {'ok': True}
+
+    async def new_game(self, request:dict) -> dict:
+        if len(self.sessions) >= self.max_sessions or self.overloaded():
+            self.rejected += 1
+            return {'ok': False, 'error': 'busy'}
+
+        width, height = int(request.get('width', 15)), int(request.get('height', 15))
+        if not (5 <= width <= 100 and 5 <= height <= 100):
+            raise ValueError('boards must be 5 to 100 tiles wide and high')
+        depth, branch_factor = int(request.get('depth', 4)), int(request.get('branch_factor', 10))
+        if not (1 <= depth <= self.max_depth and 2 <= branch_factor <= self.max_branch_factor):
+            raise ValueError(f'depth must be 1 to {self.max_depth} and branch_factor 2 to {self.max_branch_factor}')
+
+        session = Session(next(self.session_ids), width, height, depth, branch_factor,
+                          min(float(request.get('time_limit', 5)), self.max_time_limit),
+                          bool(request.get('selective', False)), 0 if request.get('ai_first', False) else 1)
+        self.sessions[session.session_id] = session
+
+        reply = {'ok': True, 'session': session.session_id}
+        if session.ai_side == 0:
+            ai_reply = await self.ai_move(session)
+            if not ai_reply['ok']:
+                del self.sessions[session.session_id]
+                return ai_reply
+            reply.update(ai_reply)
+        return reply
+
+    async def move(self, session:Session, tile_x:int, tile_y:int) -> dict:
+        """ Play the human's move, then the AI's reply """
+        if session.searching:
+            return {'ok': False, 'error': 'the AI is still thinking'}
+        if session.winner is not None:
+            return {'ok': False, 'error': 'the game is over', 'winner': session.winner}
+        move = (tile_x, tile_y, MARKS[1 - session.ai_side])
+        if not session.board.in_grid(tile_x, tile_y) or not session.board.check_legal(move):
+            return {'ok': False, 'error': 'illegal move'}
+        if self.overloaded(): # refuse before playing, so the client can simply send the move again
+            self.rejected += 1
+            return {'ok': False, 'error': 'busy'}
+
+        session.play(move)
+        if session.winner is not None:
+            return {'ok': True, 'winner': session.winner}
+        return await self.ai_move(session)
+
+    def overloaded(self) -> bool:
+        """ Whether every worker is busy and max_pending searches are already waiting """
+        return self.queued + self.running >= self.workers + self.max_pending
+
+    async def ai_move(self, session:Session) -> dict:
+        """ Queue a search for the AI's move and play it """
+        arrived = time()
+        session.searching = True
+        self.queued += 1
+        try:
+            async with self.slots:
+                self.queued -= 1
+                self.running += 1
+                self.queue_waits.append(time() - arrived)
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.pool, search_position, session.board.to_bytes(chains=False),
+                        session.depth, session.branch_factor, session.time_limit, session.selective)
+                finally:
+                    self.running -= 1
+        except Exception as e:
+            self.failed += 1
+            return {'ok': False, 'error': f'search failed: {e!r}'}
+        finally:
+            session.searching = False
+
+        move = tuple(result['move'])
+        session.play(move)
+        self.completed += 1
+        self.latencies.append(time() - arrived)
+        return {'ok': True, 'move': [move[0], move[1]], 'mark': move[2], 'winner': session.winner,
+                'nodes': result['nodes'], 'search_time': round(result['search_time'], 4)}
+
+    def metrics(self) -> dict:
+        """ Queue depth, load and latency percentiles over the last 1000 searches """
+        def percentiles(values):
+            ordered = sorted(values)
+            if not ordered:
+                return None
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+            return {'p50': pick(0.5), 'p95': pick(0.95), 'max': round(ordered[-1], 4)}
+
+        return {'sessions': len(self.sessions), 'workers': self.workers, 'queued': self.queued, 'running': self.running,
+                'completed': self.completed, 'rejected': self.rejected, 'failed': self.failed,
+                'latency': percentiles(self.latencies), 'queue_wait': percentiles(self.queue_waits)}
+
+    async def reap_sessions(self) -> None:
+        """ Drop sessions nobody has touched for idle_timeout seconds """
+        while True:
+            await asyncio.sleep(min(60, self.idle_timeout))
+            now = time()
+            for session_id, session in list(self.sessions.items()):
+                if now - session.last_used > self.idle_timeout and not session.searching:
+                    del self.sessions[session_id]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve human vs AI Gomoku games over newline-delimited JSON')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--workers', type=int, default=None, help='search processes, defaults to the number of cores')
+    parser.add_argument('--max-pending', type=int, default=None, help='searches allowed to wait for a worker before moves are refused')
+    args = parser.parse_args()
+
+    server = GameServer(args.workers, args.max_pending)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+""" Builds, caches and shares the lookup tables of each board size """
+
+import mmap
+import os
+import struct
+from typing import Dict, Tuple
+
+TABLES_MAGIC = b'GTB1'
+TABLES_VERSION = 1 # bump when the layout or the meaning of a table changes, older cache files are then ignored
+HEADER = struct.Struct('<4sHHHHIHxx') # magic, version, width, height, win length, number of cells, number of symmetries, padding to 20 bytes
+CACHE_DIR = os.environ.get('GOMOKU_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'gomoku'))
+
+EMPTY, WALL = 0, 3 # cell values, see board.py
+
+_loaded: Dict[Tuple[int, int, int], 'Tables'] = {} # every board of a size in this process shares one Tables
+
+
+class Tables():
+    """
+    Read-only lookup tables for one board size, memory-mapped from the cache file.
+    * cells: the empty padded board, WALL or EMPTY per cell index
+    * playable: the cell index of each tile, in reading order (tile number = tile_y * width + tile_x)
+    * numbers: the tile number of each cell index, -1 for walls
+    * symmetries: for each symmetry of the board, the tile number each tile number maps to.
+      8 for a square board (rotations and reflections), 4 otherwise
+    """
+    def __init__(self, width:int, height:int, win_length:int, data) -> None:
+        """ Wrap the tables encoded in data, a bytes-like object laid out as by build_tables """
+        view = memoryview(data)
+        magic, version, file_width, file_height, file_win_length, num_cells, num_symmetries = HEADER.unpack_from(view)
+        if magic != TABLES_MAGIC or version != TABLES_VERSION or (file_width, file_height, file_win_length) != (width, height, win_length):
+            raise ValueError(f'Not the tables of a {width}x{height} board (version {TABLES_VERSION})!')
+
+        self.width, self.height, self.win_length = width, height, win_length
+        self.stride, self.offset = width + 1, 1
+        num_tiles = width * height
+        if len(view) != HEADER.size + _padded(num_cells) + 4 * num_cells + 4 * num_tiles * (1 + num_symmetries):
+            raise ValueError('Truncated tables!')
+
+        pos = HEADER.size
+        self.cells = view[pos:pos + num_cells]
+        pos += _padded(num_cells)
+        self.playable = view[pos:pos + 4 * num_tiles].cast('i')
+        pos += 4 * num_tiles
+        self.numbers = view[pos:pos + 4 * num_cells].cast('i')
+        pos += 4 * num_cells
+        self.symmetries = []
+        for _ in range(num_symmetries):
+            self.symmetries.append(view[pos:pos + 4 * num_tiles].cast('i'))
+            pos += 4 * num_tiles
+
+
+def _padded(size:int) -> int:
+    """ Round a table size up so the int tables after it stay 4-byte aligned """
+    return (size + 3) // 4 * 4
+
+def build_tables(width:int, height:int, win_length:int) -> bytes:
+    """ Build the tables of a board size, encoded as they are stored in the cache file """
+    stride, offset = width + 1, 1
+    num_cells = (height + 2) * stride + 1
+    index = lambda tile_x, tile_y: (tile_y + offset) * stride + tile_x + offset
+
+    cells = bytearray([WALL]) * num_cells
+    numbers = [-1] * num_cells
+    playable = []
+    for tile_y in range(height):
+        for tile_x in range(width):
+            idx = index(tile_x, tile_y)
+            cells[idx] = EMPTY
+            numbers[idx] = len(playable)
+            playable.append(idx)
+
+    transforms = [lambda x, y: (x, y), lambda x, y: (width - 1 - x, y),
+                  lambda x, y: (x, height - 1 - y), lambda x, y: (width - 1 - x, height - 1 - y)]
+    if width == height:
+        transforms += [lambda x, y: (y, x), lambda x, y: (height - 1 - y, x),
+                       lambda x, y: (y, width - 1 - x), lambda x, y: (height - 1 - y, width - 1 - x)]
+    symmetries = []
+    for transform in transforms:
+        mapped = [0] * (width * height)
+        for tile_y in range(height):
+            for tile_x in range(width):
+                new_x, new_y = transform(tile_x, tile_y)
+                mapped[tile_y * width + tile_x] = new_y * width + new_x
+        symmetries.append(mapped)
+
+    ints = lambda values: struct.pack(f'<{len(values)}i', *values)
+    return b''.join([
+        HEADER.pack(TABLES_MAGIC, TABLES_VERSION, width, height, win_length, num_cells, len(symmetries)),
+        bytes(cells), bytes(_padded(num_cells) - num_cells),
+        ints(playable),
+        ints(numbers),
+        *[ints(mapped) for mapped in symmetries],
+    ])
+
+def get_tables(width:int, height:int, win_length:int) -> Tables:
+    """
+    Return the tables of a board size: from this process if already loaded, else memory-mapped from the
+    cache file, else built and written to the cache file for later starts. If the cache directory
+    cannot be written, the tables are built in memory every start instead.
+    """
+    key = (width, height, win_length)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(CACHE_DIR, f'tables-v{TABLES_VERSION}-{width}x{height}-{win_length}.bin')
+    try:
+        with open(path, 'rb') as f:
+            tables = Tables(width, height, win_length, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, struct.error): # missing, unreadable, stale or truncated
+        data = build_tables(width, height, win_length)
+        tables = Tables(width, height, win_length, data)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    _loaded[key] = tables
+    return tables
@@ -0,0 +1,38 @@
+import io
+import json
+
+from analyse import analyse, parse_games, positions
+
+GAMES = '''# a comment, then a blank line
+
+7,7 8,8 6,8
+[[7, 7], [8, 8]]
+7,7 8,8,1
+7,7 x,8
+[[7, 7], 8]
+7,7 7,7 6,8
+7,7 15,3
+5,5 6,6
+'''
+
+def test_bad_records_are_reported_and_skipped(capsys):
+    games = list(parse_games(io.StringIO(GAMES)))
+    assert [line_no for line_no, _ in games] == [3, 4, 8, 9, 10]
+    assert games[0][1] == [(7, 7, 'O'), (8, 8, 'X'), (6, 8, 'O')]
+    wheres = [where for where, _ in positions(games, 15, 15)]
+    assert [(where['line'], where['ply']) for where in wheres] == [(3, 1), (3, 2), (3, 3), (4, 1), (4, 2), (10, 1), (10, 2)]
+    assert wheres[0] == {'line': 3, 'ply': 1, 'to_move': 'X', 'played': [8, 8]}
+    assert capsys.readouterr().err.splitlines() == [
+        "line 5: not a game record ('8,8,1' is not an x,y pair), skipped",
+        "line 6: not a game record (invalid literal for int() with base 10: 'x'), skipped",
+        "line 7: not a game record (cannot unpack non-iterable int object), skipped",
+        "line 8: illegal move (7, 7) at ply 2, skipped",
+        "line 9: illegal move (15, 3) at ply 2, skipped"]
+
+def test_analysis_follows_the_input_order():
+    games = parse_games(io.StringIO('7,7 8,8 6,8\n5,5 6,6\n'))
+    results = list(analyse(positions(games, 15, 15), 2, 6, 5, False, 1))
+    assert [(result['line'], result['ply']) for result in results] == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2)]
+    for result in results:
+        assert result['depth'] == 2 and result['nodes'] > 0 and len(result['best']) == 2
+        json.dumps(result)
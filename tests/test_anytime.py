@@ -0,0 +1,47 @@
+import io
+from contextlib import redirect_stdout
+
+from board import Board, MARKS
+from players import AI
+
+MOVES = [(7, 7), (8, 8), (6, 8), (8, 6), (9, 7), (6, 6), (5, 9), (7, 9), (9, 9), (10, 6)]
+
+def position() -> Board:
+    board = Board(600, 600, 40, verbose=False)
+    for ply, (tile_x, tile_y) in enumerate(MOVES):
+        board.update_board((tile_x, tile_y, MARKS[ply % 2]), graphic=False)
+    return board
+
+def searcher(board:Board) -> AI:
+    ai = AI(4, 10, ponder_width=0)
+    ai.mark = MARKS[board.side_to_move]
+    return ai
+
+def test_results_deepen_until_the_depth():
+    board = position()
+    cells = board.cells[:]
+    ai = searcher(board)
+    with redirect_stdout(io.StringIO()):
+        results = list(ai.iter_search(board, 4, 10, time_lim=600))
+    assert [result.depth for result in results] == [1, 2, 3, 4]
+    assert all(earlier.nodes <= later.nodes and earlier.elapsed <= later.elapsed for earlier, later in zip(results, results[1:]))
+    for result in results:
+        assert result.pv[0] == result.move and len(result.pv) <= result.depth
+        assert result.move[2] == ai.mark and board.check_legal(result.move)
+    assert board.cells == cells and ai.best_move == results[-1].move
+
+def test_a_stop_keeps_the_last_result():
+    board = position()
+    cells = board.cells[:]
+    ai = searcher(board)
+    results = []
+    with redirect_stdout(io.StringIO()):
+        for result in ai.iter_search(board, 4, 10, time_lim=600):
+            results.append(result)
+            ai.stop_search = True # abort depth 2 as soon as it starts
+    assert [result.depth for result in results] == [1]
+    assert board.cells == cells and ai.best_move == results[0].move and not ai.stop_search
+
+    # the next search is not stopped by the last one's stop
+    with redirect_stdout(io.StringIO()):
+        assert [result.depth for result in ai.iter_search(board, 2, 10, time_lim=600)] == [1, 2]
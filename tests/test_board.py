@@ -0,0 +1,105 @@
+import io
+import pickle
+from contextlib import redirect_stdout
+
+import pytest
+
+from board import Board, MARKS, SparseBoard, Tile
+from players import AI
+
+MOVES = [(7, 7), (8, 8), (6, 8), (8, 6), (5, 9), (9, 7), (4, 10), (0, 0)]
+
+def position(width:int=None, height:int=None) -> SparseBoard:
+    board = SparseBoard(width, height)
+    for ply, (tile_x, tile_y) in enumerate(MOVES):
+        board.play(board.index(tile_x, tile_y), ply % 2)
+    return board
+
+def logic(board:Board) -> list:
+    return [(idx, (tile.chains[0][:], tile.chains[1][:])) for idx, tile in enumerate(board.logic) if tile is not None]
+
+def candidates(board:SparseBoard) -> list:
+    return [(idx, tile.chains) for idx, tile in board.candidate_tiles()]
+
+def test_sparse_snapshot_round_trip():
+    for width, height in [(15, 15), (None, None), (15, None)]:
+        board = position(width, height)
+        for chains in (True, False):
+            decoded = SparseBoard.from_bytes(board.to_bytes(chains))
+            assert (decoded.width, decoded.height, decoded.bounded) == (width, height, board.bounded)
+            assert dict(decoded.cells) == dict(board.cells)
+            assert decoded.history == board.history and decoded.bounds == board.bounds
+            assert decoded.get_bit_repr() == board.get_bit_repr()
+            assert candidates(decoded) == candidates(board)
+
+def test_sparse_candidates_stay_sorted():
+    board = position(15, 15)
+    idx = board.index(14, 14)
+    board.undo(board.play(idx, 0), idx, 0)
+    assert [idx for idx, _ in board.candidate_tiles()] == sorted(idx for idx in board.logic if idx not in board.cells)
+    for copy in (board.copy(), pickle.loads(pickle.dumps(board))):
+        assert candidates(copy) == candidates(board)
+        assert copy.logic.order == board.logic.order and copy.logic.order is not board.logic.order
+
+def test_tiles_take_marks_as_before():
+    tile = Tile()
+    tile.set_value(2, 'X', 9)
+    tile.set_value(5, 0, 4)
+    tile.set_value(6, 'O', 1)
+    assert tile.chains == ([0, 0, 0, 0, 0, 4, 1, 0], [0, 0, 9, 0, 0, 0, 0, 0])
+    assert tile.get_value_mark_place(2, 'X') == 9 and tile.get_value_mark_place(5, 'O') == 4
+    assert tile.get_max_value_mark('X') == tile.get_max_value_side(1) == 9 and tile.get_max_value_mark('O') == 4
+    assert tile.get_value_mark('X') == -9 and tile.get_value() == -4
+
+def test_a_large_sparse_board_searches_like_a_small_one():
+    def search(board, offset:int) -> tuple:
+        for ply, (tile_x, tile_y) in enumerate([(7, 7), (8, 8), (6, 8), (8, 6), (9, 7), (6, 6)]):
+            board.update_board((tile_x + offset, tile_y + offset, MARKS[ply % 2]), graphic=False)
+        ai = AI(4, 10, ponder_width=0)
+        ai.mark = 'O'
+        with redirect_stdout(io.StringIO()):
+            tile_x, tile_y, _ = ai.get_move(board, 4, 10)
+        return (tile_x - offset, tile_y - offset), ai.num_states_searched
+
+    move, states = search(Board(600, 600, 40, verbose=False), 0)
+    for board in (SparseBoard(1000, 1000), SparseBoard()):
+        assert search(board, 493) == (move, states)
+        assert len(board.logic) < 200 # only the tiles the stones' chains reach, not the million on the board
+
+def test_moves_encode_as_cell_indices():
+    board = Board(15 * 40, 11 * 40, 40, verbose=False)
+    for tile_x, tile_y, mark in [(0, 0, 'O'), (14, 10, 'X'), (3, 7, 'O')]:
+        idx, side = board.encode_move((tile_x, tile_y, mark))
+        assert (idx, side) == (board.index(tile_x, tile_y), MARKS.index(mark))
+        assert board.coords(idx) == (tile_x, tile_y) and board.decode_move(idx, side) == (tile_x, tile_y, mark)
+    assert board.check_legal((14, 10, 'X')) and not board.check_legal((15, 10, 'X')) and not board.check_legal((0, -1, 'O'))
+
+def test_play_and_undo_restore_the_board():
+    board = Board(600, 600, 40, verbose=False)
+    before = (board.cells[:], logic(board), board.get_bit_repr())
+    played = []
+    for ply, (tile_x, tile_y) in enumerate([(7, 7), (8, 8), (7, 8), (0, 0), (7, 9), (14, 14), (7, 10), (1, 0), (7, 6)]):
+        idx, side = board.index(tile_x, tile_y), ply % 2
+        played.append((board.play(idx, side), idx, side))
+    assert board.is_win(board.index(7, 6), 0) and not board.is_win(board.index(1, 0), 1)
+    assert board.check_win((7, 6, 'O')) == (True, ((7, 6), (7, 10)))
+    assert board.tiles[7][7] == 'O' and board.mark_at(8, 8) == 'X' and board.mark_at(5, 5) == 0
+    for change, idx, side in reversed(played):
+        board.undo(change, idx, side)
+    assert (board.cells, logic(board), board.get_bit_repr()) == before and board.history == []
+
+def test_snapshot_round_trip():
+    board = Board(15 * 40, 13 * 40, 40, verbose=False)
+    for ply, (tile_x, tile_y) in enumerate(MOVES):
+        board.play(board.index(tile_x, tile_y), ply % 2)
+    for chains in (True, False):
+        data = board.to_bytes(chains)
+        decoded = Board.from_bytes(memoryview(data))
+        assert (decoded.width, decoded.height, decoded.win_length) == (15, 13, 5)
+        assert decoded.cells == board.cells and decoded.history == board.history
+        assert logic(decoded) == logic(board) and decoded.get_bit_repr() == board.get_bit_repr()
+    assert len(board.to_bytes(False)) < len(board.to_bytes())
+    copy = pickle.loads(pickle.dumps(board))
+    assert copy.cells == board.cells and logic(copy) == logic(board)
+    with pytest.raises(ValueError):
+        Board.from_bytes(b'XXXX' + board.to_bytes()[4:])
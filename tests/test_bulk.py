@@ -0,0 +1,45 @@
+import random
+
+from board import Board, MARKS, SparseBoard
+from bulk import check_logic, grid_to_moves, load_boards
+
+def random_game(rng:random.Random, size:int, length:int) -> list:
+    tiles = rng.sample([(tile_x, tile_y) for tile_x in range(size) for tile_y in range(size)], length)
+    return [(tile_x, tile_y, MARKS[ply % 2]) for ply, (tile_x, tile_y) in enumerate(tiles)]
+
+def replay(moves:list, size:int) -> Board:
+    board = Board(size * 40, size * 40, 40, verbose=False)
+    for move in moves:
+        board.update_board(move, graphic=False)
+    return board
+
+def logic(board:Board) -> list:
+    return [(idx, tile.chains) for idx, tile in enumerate(board.logic) if tile is not None]
+
+def test_bulk_rebuild_equals_replay():
+    rng = random.Random(7)
+    games = [random_game(rng, 9, length) for length in [0, 1, 2, 5, 17, 40, 81]]
+    for moves, board in zip(games, load_boards(games, 9, 9, chunk_size=3)):
+        played = replay(moves, 9)
+        assert board.cells == played.cells and board.history == played.history
+        assert (board.tiles_O, board.tiles_X, board.num_tiles_placed) == (played.tiles_O, played.tiles_X, played.num_tiles_placed)
+        assert logic(board) == logic(played)
+        assert board.score_board(board) == played.score_board(played)
+        assert check_logic(played) == []
+
+def test_from_moves_builds_the_class_it_is_called_on():
+    moves = random_game(random.Random(3), 15, 12)
+    board = Board.from_moves(moves)
+    assert type(board) is Board and logic(board) == logic(replay(moves, 15))
+    for width, height in [(15, 15), (None, None)]:
+        sparse = SparseBoard.from_moves(moves, width, height)
+        assert type(sparse) is SparseBoard and (sparse.width, sparse.height) == (width, height)
+        assert [sparse.decode_move(idx, side) for idx, side in sparse.history] == moves
+    bounded = SparseBoard.from_moves(moves)
+    assert bounded.score_board(bounded) == board.score_board(board) # an unbounded board scores the edge tiles differently
+
+def test_from_grid_takes_the_stones_in_reading_order():
+    grid = [['O', 0, 'X'], [0, 'O', 0], ['X', 0, 'O']]
+    assert grid_to_moves(grid) == [(0, 0, 'O'), (2, 0, 'X'), (1, 1, 'O'), (0, 2, 'X'), (2, 2, 'O')]
+    assert Board.from_grid(grid).tiles == [['O', 0, 'X'], [0, 'O', 0], ['X', 0, 'O']]
+    assert type(SparseBoard.from_grid(grid)) is SparseBoard
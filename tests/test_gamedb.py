@@ -0,0 +1,43 @@
+from board import Board
+from gamedb import GameDB, board_key
+
+GAMES = [
+    ([(7, 7, 'O'), (8, 8, 'X'), (6, 8, 'O'), (8, 6, 'X')], 'O'),
+    ([(6, 8, 'O'), (8, 6, 'X'), (7, 7, 'O'), (8, 8, 'X'), (0, 0, 'O')], 'X'), # reaches the first game's position by transposition
+    ([(0, 0, 'O'), (14, 14, 'X')], None),
+    ([], 'draw'),
+]
+
+def test_games_round_trip(tmp_path):
+    path = str(tmp_path / 'games.gdb')
+    db = GameDB(path)
+    for moves, result in GAMES:
+        db.append(moves, result)
+    assert list(db) == GAMES
+    db.close()
+
+    db = GameDB(path)
+    assert len(db) == len(GAMES) and db.game(1) == GAMES[1]
+    db.close()
+
+def test_find_and_results_with_and_without_index(tmp_path):
+    path = str(tmp_path / 'games.gdb')
+    db = GameDB(path)
+    for moves, result in GAMES[:3]:
+        db.append(moves, result)
+    position = Board.from_moves(GAMES[0][0])
+
+    replayed = (db.find(position), db.results(position))
+    assert replayed == ([(0, 4), (1, 4)], {'O': 1, 'X': 1, 'draw': 0, None: 0})
+    assert db.build_index() == 11
+    assert (db.find(position), db.results(position)) == replayed
+    assert db.find(board_key(position), limit=1) == [(0, 4)]
+
+    # games appended after the index are found too, also after reopening
+    db.append(GAMES[0][0][:2] + GAMES[0][0][3:] + GAMES[0][0][2:3], 'draw')
+    db.close()
+    db = GameDB(path)
+    assert db.find(position) == [(0, 4), (1, 4), (3, 4)]
+    assert db.results(position) == {'O': 1, 'X': 1, 'draw': 1, None: 0}
+    assert db.find(Board.from_moves([(1, 1, 'O')])) == []
+    db.close()
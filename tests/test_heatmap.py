@@ -0,0 +1,17 @@
+from board import Board, MARKS
+from heatmap import HeatMap, STONE_COLOR
+
+def test_tiles_shade_towards_the_side_they_favour():
+    board = Board(600, 600, 40, verbose=False)
+    for ply, (tile_x, tile_y) in enumerate([(7, 7), (0, 0), (8, 7), (14, 14), (9, 7)]):
+        board.update_board((tile_x, tile_y, MARKS[ply % 2]), graphic=False)
+    heat_map = HeatMap.__new__(HeatMap) # the colours need no window
+    heat_map.scale = 20
+
+    assert heat_map.color(board, board.index(7, 7)) == STONE_COLOR
+    assert heat_map.color(board, board.index(3, 12)) == '#ffffff' # out of every chain's reach
+    red, green, blue = (int(heat_map.color(board, board.index(10, 7))[i:i + 2], 16) for i in (1, 3, 5))
+    assert blue == 255 and red < green < 255 # next to O's three: blue
+    assert heat_map.color(board, board.index(10, 7)) != heat_map.color(board, board.index(12, 7))
+    red, green, blue = (int(heat_map.color(board, board.index(13, 13))[i:i + 2], 16) for i in (1, 3, 5))
+    assert red == 255 and blue < 255 # next to X's stone: red
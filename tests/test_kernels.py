@@ -0,0 +1,52 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+import pytest
+
+from board import Board, MARKS
+from players import AI
+
+pytest.importorskip('numba')
+
+def boards() -> tuple:
+    return Board(600, 600, 40, verbose=False), Board(600, 600, 40, verbose=False, backend='jit')
+
+def logic(board:Board) -> list:
+    return [(idx, tile.chains) for idx, tile in enumerate(board.logic) if tile is not None]
+
+def test_jit_board_plays_like_the_plain_one():
+    plain, jit = boards()
+    assert jit.backend == 'jit'
+    rng = random.Random(5)
+    changes = []
+    for ply, (tile_x, tile_y) in enumerate(rng.sample([(x, y) for x in range(15) for y in range(15)], 40)):
+        idx, side = plain.index(tile_x, tile_y), ply % 2
+        changes.append((plain.play(idx, side), jit.play(idx, side), idx, side))
+        assert plain.is_win(idx, side) == jit.is_win(idx, side)
+        assert plain.get_chains(idx + 1, side + 1) == jit.get_chains(idx + 1, side + 1)
+        assert plain.score_board(plain) == jit.score_board(jit)
+    assert list(jit.cells) == plain.cells and logic(jit) == logic(plain)
+    for plain_change, jit_change, idx, side in reversed(changes[20:]):
+        plain.undo(plain_change, idx, side)
+        jit.undo(jit_change, idx, side)
+    assert list(jit.cells) == plain.cells and logic(jit) == logic(plain)
+
+def test_jit_board_searches_like_the_plain_one():
+    results = []
+    for board in boards():
+        for ply, (tile_x, tile_y) in enumerate([(7, 7), (8, 8), (6, 8), (8, 6), (9, 7), (6, 6)]):
+            board.update_board((tile_x, tile_y, MARKS[ply % 2]), graphic=False)
+        ai = AI(3, 10, ponder_width=0)
+        ai.mark = MARKS[board.side_to_move]
+        with redirect_stdout(io.StringIO()):
+            results.append((ai.get_move(board, 3, 10), ai.num_states_searched))
+    assert results[0] == results[1]
+
+def test_jit_tiles_take_marks_as_before():
+    _, jit = boards()
+    jit.update_board((7, 7, 'O'), graphic=False)
+    tile = jit.logic[jit.index(8, 8)]
+    tile.set_value(3, 'X', 9)
+    tile.set_value(2, 1, 4)
+    assert tile.chains[1][2:4] == [4, 9] and tile.get_value_mark('X') == -13 and tile.get_value_mark_place(3, 'X') == 9
@@ -0,0 +1,29 @@
+import io
+
+from pbrain import ABOUT, Brain
+
+def transcript(brain:Brain, *commands) -> list:
+    """ The brain's answers to the commands, MESSAGE lines left out """
+    brain.run(io.StringIO(''.join(command + '\n' for command in commands)))
+    return [line for line in brain.out.getvalue().splitlines() if not line.startswith('MESSAGE')]
+
+def test_a_game_through_the_protocol():
+    brain = Brain(depth=2, branch_factor=6, out=io.StringIO())
+    answers = transcript(brain, 'TURN 1,1', 'START 15', 'INFO timeout_turn 1000', 'BEGIN', 'TURN 8,8', 'ABOUT', 'YXSHOWINFO', 'END', 'START 15')
+    assert answers[:3] == ['ERROR no game started', 'OK', '7,7']
+    tile_x, tile_y = (int(n) for n in answers[3].split(','))
+    assert answers[4:] == [ABOUT, 'UNKNOWN YXSHOWINFO']
+    assert brain.board.mark_at(7, 7) == 'O' and brain.board.mark_at(8, 8) == 'X' and brain.board.mark_at(tile_x, tile_y) == 'O'
+
+def test_takeback_and_board():
+    brain = Brain(depth=2, branch_factor=6, out=io.StringIO())
+    reply = transcript(brain, 'START 15', 'TURN 7,7')[1]
+    answers = transcript(brain, 'TAKEBACK 7,7', f'TAKEBACK {reply}', 'TAKEBACK 7,7', 'BOARD', '7,7,2', '8,8,1', '6,8,2', 'DONE')
+    assert answers[2:5] == ['ERROR 7,7 is not the last move', 'OK', 'OK']
+    assert brain.board.num_tiles_placed == 4 and brain.own_side == 1
+    assert brain.board.mark_at(*(int(n) for n in answers[5].split(','))) == 'X'
+
+def test_a_move_when_there_is_nothing_to_search():
+    # a branch factor of 1 keeps no candidate moves, so the brain falls back on the free tile nearest the centre
+    brain = Brain(depth=2, branch_factor=1, out=io.StringIO())
+    assert transcript(brain, 'START 5', 'BOARD', '0,0,1', 'DONE') == ['OK', '2,2']
@@ -0,0 +1,41 @@
+import numpy as np
+
+from board import Board, EMPTY
+from playouts import REACH, Playouts, box_sum, evaluate, has_line
+
+def test_has_line_finds_every_direction():
+    grids = np.zeros((6, 9, 9), dtype=bool)
+    grids[0, 8, 4:9] = True # along the bottom edge
+    grids[1, 0:5, 0] = True # down the left edge
+    grids[2, range(4, 9), range(4, 9)] = True
+    grids[3, range(0, 5), range(8, 3, -1)] = True
+    grids[4, 2, 1:5] = grids[4, 2, 6:9] = True # four and three with a gap
+    grids[5, range(0, 4), range(0, 4)] = True
+    assert list(has_line(grids, 5)) == [True, True, True, True, False, False]
+    assert list(has_line(grids, 4)) == [True, True, True, True, True, True]
+
+def test_games_end_at_the_first_line():
+    board = Board(9 * 40, 9 * 40, 40, verbose=False)
+    board.update_board((4, 4, 'O'), graphic=False)
+    playouts = Playouts.from_board(board, 200, seed=3)
+    winner = playouts.run()
+    stones = playouts.stones
+    assert playouts.done.all() and playouts.moves_played == playouts.moves.sum()
+    for side in (0, 1):
+        wins = winner == side
+        assert has_line(stones[wins] == side + 1, 5).all() and not has_line(stones[wins] == 2 - side, 5).any()
+        # the winner played last: O has one stone more than X after an O win, as many after an X win
+        counts = (stones[wins] == 1).sum(axis=(1, 2)) - (stones[wins] == 2).sum(axis=(1, 2))
+        assert (counts == 1 - side).all()
+    assert ((stones != EMPTY).sum(axis=(1, 2)) == playouts.moves + 1).all()
+    # the weights kept up to date move by move match those computed afresh
+    occupied = stones != EMPTY
+    assert (playouts.nearby[:, REACH:-REACH, REACH:-REACH] == 4 * box_sum(occupied, 1) + box_sum(occupied, REACH)).all()
+
+def test_evaluate_is_repeatable_and_one_sided_positions_lean_their_way():
+    board = Board(15 * 40, 15 * 40, 40, verbose=False)
+    for move in [(5, 7, 'O'), (0, 0, 'X'), (6, 7, 'O'), (14, 0, 'X'), (7, 7, 'O'), (0, 14, 'X'), (8, 7, 'O'), (14, 14, 'X')]:
+        board.update_board(move, graphic=False)
+    assert evaluate(board, 128, seed=1) == evaluate(board, 128, seed=1)
+    assert evaluate(board, 128, seed=1) > 0.8
+    assert 0 <= evaluate(board, 64, max_moves=2, policy='uniform', seed=1) <= 1
@@ -0,0 +1,55 @@
+import io
+from contextlib import redirect_stdout
+
+from board import Board
+from players import AI
+
+def play_game(ponder_width:int, depth:int=4, branch_factor:int=8, turns:int=10) -> tuple:
+    """ The AI as X against a fixed depth 3 opponent, pondering fully between moves as against a slow human
+    :return: (states the AI searched, states it pondered, pondered replies the opponent played)
+    """
+    board = Board(600, 600, 40, verbose=False)
+    for move in [(7, 7, 'O'), (8, 8, 'X')]:
+        board.update_board(move, graphic=False)
+    ai, opponent = AI(depth, branch_factor, ponder_width=ponder_width), AI(3, branch_factor, ponder_width=0)
+    ai.mark, opponent.mark = 'X', 'O'
+    searched = hits = 0
+    with redirect_stdout(io.StringIO()):
+        for _ in range(turns):
+            move = opponent.get_move(board, 3, branch_factor)
+            board.update_board(move, graphic=False)
+            if board.check_win(move)[0]:
+                break
+            if ai.ponder_thread is not None:
+                ai.ponder_thread.join()
+            hits += board.get_bit_repr() in ai.ponder_results
+            move = ai.get_move_iterative_deepening(board, depth, branch_factor, float('inf'))
+            searched += ai.num_states_searched
+            board.update_board(move, graphic=False)
+            if board.check_win(move)[0]:
+                break
+            ai.start_pondering(board)
+        ai.stop_pondering()
+    return searched, ai.ponder_states_searched, hits
+
+def test_pondering_costs_no_more_per_game():
+    searched, pondered, hits = play_game(ponder_width=0)
+    assert pondered == hits == 0
+    ponder_searched, ponder_pondered, ponder_hits = play_game(ponder_width=3)
+    assert ponder_pondered > 0 and ponder_hits > 0
+    assert ponder_searched < searched
+    assert ponder_searched + ponder_pondered <= searched
+
+def test_stop_pondering_keeps_a_stop():
+    board = Board(600, 600, 40, verbose=False)
+    for move in [(7, 7, 'O'), (8, 8, 'X'), (6, 8, 'O')]:
+        board.update_board(move, graphic=False)
+    ai = AI(6, 10)
+    ai.mark = 'X'
+    with redirect_stdout(io.StringIO()):
+        ai.get_move(board, 2, 10)
+        ai.start_pondering(board)
+        ai.stop_search = True # meant for the next search
+        ai.stop_pondering()
+    assert ai.stop_search and ai.ponder_thread is None
+    assert ai.node_limit == float('inf')
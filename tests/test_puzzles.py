@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from puzzles import compare, load_puzzles, parse_puzzles, run, setup_board
+
+SUITE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'puzzles.txt')
+
+def test_the_suite_sets_up():
+    puzzles = load_puzzles(SUITE)
+    assert len(puzzles) >= 20 and len({puzzle.name for puzzle in puzzles}) == len(puzzles)
+    for puzzle in puzzles:
+        board = setup_board(puzzle)
+        assert len(board.history) == len(puzzle.moves)
+
+@pytest.mark.parametrize('line, error', [
+    ('a | win1 | 1,1', 'line 2: expected name'),
+    ('a | win2 | 1,1 | 0,0', 'line 2: unknown kind'),
+    ('a | win1 | 1;1 | 0,0', 'line 2: not a list of x,y moves'),
+    ('a | block |  | 0,0', 'line 2: no correct moves'),
+])
+def test_bad_lines_name_their_line(line, error):
+    with pytest.raises(ValueError, match=error):
+        list(parse_puzzles(['# a comment', line]))
+
+def test_a_run_reports_per_kind():
+    puzzles = [puzzle for puzzle in load_puzzles(SUITE) if puzzle.name in ('win1-01', 'block-01')]
+    report = run(puzzles, depth=2, verbose=False)
+    assert (report['solved'], report['total'], report['budget']) == (2, 2, 'depth=2')
+    assert report['kinds'] == {'win1': {'solved': 1, 'total': 1}, 'block': {'solved': 1, 'total': 1}}
+    assert [result['first_correct']['depth'] for result in report['results']] == [2, 2]
+
+    timed = run(puzzles[:1], time_lim=5, max_depth=2, verbose=False)
+    assert timed['budget'] == 'time=5' and timed['results'][0]['solved']
+
+    worse = {**report, 'solved': 1, 'results': [report['results'][0], {**report['results'][1], 'solved': False}]}
+    lines = list(compare({'runs': [worse]}, {'runs': [report]}))
+    assert lines[0].startswith('depth=2: solved 1/2 -> 2/2') and lines[1:] == ['  block-01: now solved']
@@ -0,0 +1,64 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+from board import Board, MARKS
+from players import AI
+
+class NoTable(dict):
+    """ A transposition table that forgets everything stored in it """
+    def __setitem__(self, key, value) -> None:
+        pass
+
+def position() -> Board:
+    """ 14 random stones around the centre, none of them winning """
+    board = Board(600, 600, 40, verbose=False)
+    rng = random.Random(2)
+    while board.num_tiles_placed < 14:
+        move = (7 + rng.randint(-4, 4), 7 + rng.randint(-4, 4), MARKS[board.num_tiles_placed % 2])
+        if board.check_legal(move):
+            change = board.update_board(move, graphic=False)
+            if board.check_win(move)[0]:
+                board.undo_change(change, move)
+    return board
+
+def search_replies(ai:AI, board:Board) -> None:
+    """ Search every reply at depth 3 with late move reductions, filling the table with the bounds of null-window searches """
+    side = board.num_tiles_placed % 2
+    ai.mark, ai.late_move_reductions = MARKS[1 - side], True
+    for _, idx in ai.select_moves(ai.get_possible_moves(board, side == 0), side == 0, 20):
+        change = board.play(idx, side)
+        if not board.is_win(idx, side):
+            ai.get_move(board, 3, 20)
+        board.undo(change, idx, side)
+    ai.mark, ai.late_move_reductions = MARKS[side], False
+
+def best_move(ai:AI, board:Board, warm=None) -> tuple:
+    ai.mark = MARKS[board.num_tiles_placed % 2]
+    maximizer = ai.mark == 'O'
+    with redirect_stdout(io.StringIO()):
+        if warm is not None:
+            warm(ai, board)
+        return ai.negamaxAB(board, maximizer, 3, 20, ai.get_possible_moves(board, maximizer))[0]
+
+def test_table_bounds_match_a_search_without_table():
+    ai = AI(3, 20, ponder_width=0)
+    ai.transposition_table = NoTable()
+    assert best_move(AI(3, 20, ponder_width=0), position(), search_replies) == best_move(ai, position())
+
+def top_moves(ai:AI, board:Board, warm=None) -> list:
+    ai.mark = MARKS[board.num_tiles_placed % 2]
+    with redirect_stdout(io.StringIO()):
+        if warm is not None:
+            warm(ai, board)
+        return [(move, score) for move, score, _ in ai.get_top_moves(board, n=3, depth=3)]
+
+def test_top_moves_match_a_search_without_table():
+    ai = AI(3, 20, ponder_width=0)
+    ai.transposition_table = NoTable()
+    expected = top_moves(ai, position())
+    assert expected == [((4, 6, 'O'), 61.0), ((10, 9, 'O'), 56.0), ((7, 9, 'O'), 54.0)]
+    assert top_moves(AI(3, 20, ponder_width=0), position()) == expected
+    # an ordinary search of the same position, and searches of the replies, leave bounds where the top moves look
+    assert top_moves(AI(3, 20, ponder_width=0), position(), lambda ai, board: ai.get_move(board, 3, 20)) == expected
+    assert top_moves(AI(3, 20, ponder_width=0), position(), search_replies) == expected
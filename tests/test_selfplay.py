@@ -0,0 +1,27 @@
+import numpy as np
+
+from board import Board
+from selfplay import augment, generate, iter_shards
+
+def test_games_from_an_empty_board_fill_the_shards(tmp_path):
+    assert generate(str(tmp_path), 'w0', 1, 'ai:depth=2,branch_factor=6', size=9, opening=0, shard_size=4, max_moves=6, seed=1) == (1, 6)
+    shards = list(iter_shards(str(tmp_path)))
+    assert [len(shard) for shard in shards] == [4, 2]
+    records = np.concatenate(shards)
+    assert list(records['ply']) == list(range(6)) and list(records['side']) == [0, 1] * 3
+    assert not records[0]['stones'].any() and records[0]['move'] == 4 * 9 + 4 # the centre, with nothing to search
+    for before, after in zip(records, records[1:]): # each move is the one stone the next position gains
+        assert after['stones'].sum() == before['stones'].sum() + 1
+        assert after['stones'][before['side']].reshape(-1)[before['move']] == 1
+
+def test_augment_moves_stones_policy_and_move_together(tmp_path):
+    generate(str(tmp_path), 'w0', 1, 'ai:depth=2,branch_factor=6', size=9, opening=2, max_moves=4, seed=2)
+    records = np.concatenate(list(iter_shards(str(tmp_path))))
+    symmetries = Board(9 * 40, 9 * 40, 40, verbose=False).tables.symmetries
+    moved = augment(records, symmetries)
+    assert len(moved) == len(records) * len(symmetries) == len(records) * 8
+    for i, mapped in enumerate(np.asarray(symmetries)):
+        part = moved[i * len(records):(i + 1) * len(records)]
+        assert (part['move'] == mapped[records['move']]).all()
+        assert (part['stones'].reshape(len(records), 2, -1)[:, :, mapped] == records['stones'].reshape(len(records), 2, -1)).all()
+        assert (part['policy'].reshape(len(records), -1)[:, mapped] == records['policy'].reshape(len(records), -1)).all()
@@ -0,0 +1,58 @@
+import asyncio
+import io
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import players
+from board import Board
+from players import AI, MAX_SEARCH_AIS, search_position
+from server import GameServer
+
+def run(server:GameServer, *requests) -> list:
+    """ Dispatch the requests in order, searching in a thread rather than a process pool """
+    async def dispatch_all():
+        server.pool, server.slots = ThreadPoolExecutor(1), asyncio.Semaphore(1)
+        try:
+            return [await server.dispatch(request) for request in requests]
+        finally:
+            server.pool.shutdown()
+    return asyncio.run(dispatch_all())
+
+def test_a_move_gets_the_ai_reply():
+    server = GameServer(workers=1)
+    new, move, state = run(server, {'op': 'new', 'depth': 2, 'branch_factor': 5},
+                           {'op': 'move', 'session': 1, 'x': 7, 'y': 7}, {'op': 'state', 'session': 1})
+    assert new == {'ok': True, 'session': 1}
+    assert move['ok'] and move['mark'] == 'X' and move['winner'] is None
+    assert state['moves'] == [[7, 7, 'O'], move['move'] + ['X']]
+    assert server.metrics()['completed'] == 1
+
+@pytest.mark.parametrize('settings', [{'depth': 0}, {'depth': 9}, {'branch_factor': 1}, {'branch_factor': 41}])
+def test_search_settings_out_of_range_are_refused(settings):
+    server = GameServer(workers=1)
+    with pytest.raises(ValueError):
+        run(server, {'op': 'new', **settings})
+    assert not server.sessions
+
+def test_workers_keep_a_bounded_number_of_ais():
+    board = Board(600, 600, 40, verbose=False)
+    board.update_board((7, 7, 'X'), graphic=False)
+    players._search_ais.clear()
+    for branch_factor in range(2, MAX_SEARCH_AIS + 4):
+        search_position(board.to_bytes(chains=False), 1, branch_factor, 5)
+    assert list(players._search_ais) == [(1, branch_factor, False) for branch_factor in range(4, MAX_SEARCH_AIS + 4)]
+
+def test_a_stale_stop_does_not_abort_the_next_search():
+    board = Board(600, 600, 40, verbose=False)
+    for move in [(7, 7, 'O'), (8, 8, 'X'), (6, 8, 'O')]:
+        board.update_board(move, graphic=False)
+    def search(ai:AI) -> tuple:
+        ai.mark = 'X'
+        with redirect_stdout(io.StringIO()):
+            return ai.get_move_iterative_deepening(board, 3, 10, time_lim=60, hard_time_lim=60), ai.num_states_searched
+    stale = AI(3, 10, ponder_width=0)
+    stale.stop_search = True # left over from an earlier search in the same worker
+    assert search(stale) == search(AI(3, 10, ponder_width=0))
+    assert not stale.stop_search
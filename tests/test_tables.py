@@ -0,0 +1,33 @@
+import struct
+
+import pytest
+
+import tables
+
+def test_int_tables_are_aligned():
+    for width, height in [(15, 15), (10, 7), (19, 19)]:
+        data = tables.build_tables(width, height, 5)
+        num_cells = (height + 2) * (width + 1) + 1
+        assert tables.HEADER.size == 20 and len(data) % 4 == 0
+        table = tables.Tables(width, height, 5, data)
+        assert len(table.cells) == num_cells and len(table.playable) == width * height
+        assert len(table.symmetries) == (8 if width == height else 4)
+        assert sorted(table.symmetries[-1]) == list(range(width * height))
+        pos = tables.HEADER.size + tables._padded(num_cells)
+        assert pos % 4 == 0 and list(table.playable) == list(struct.unpack_from(f'<{width * height}i', data, pos))
+
+def test_other_versions_are_rejected(tmp_path, monkeypatch):
+    data = bytearray(tables.build_tables(9, 9, 5))
+    struct.pack_into('<H', data, 4, tables.TABLES_VERSION + 1)
+    with pytest.raises(ValueError):
+        tables.Tables(9, 9, 5, data)
+    with pytest.raises(ValueError):
+        tables.Tables(9, 9, 4, tables.build_tables(9, 9, 5))
+
+    # a stale cache file is rebuilt, not loaded
+    monkeypatch.setattr(tables, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(tables, '_loaded', {})
+    path = tmp_path / f'tables-v{tables.TABLES_VERSION}-9x9-5.bin'
+    path.write_bytes(bytes(data))
+    assert list(tables.get_tables(9, 9, 5).playable) == list(tables.Tables(9, 9, 5, tables.build_tables(9, 9, 5)).playable)
+    assert path.read_bytes() == tables.build_tables(9, 9, 5)
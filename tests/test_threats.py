@@ -0,0 +1,57 @@
+import random
+
+from board import Board
+from players import AI
+
+def position(stones:dict) -> Board:
+    """ A board with stones {side: [(tile_x, tile_y)]}, played alternately from O's """
+    board = Board(15 * 40, 15 * 40, 40, verbose=False)
+    moves = [[board.index(*tile) for tile in stones.get(side, [])] for side in (0, 1)]
+    for ply in range(2 * max(len(moves[0]), len(moves[1]))):
+        if moves[ply % 2]:
+            board.play(moves[ply % 2].pop(0), ply % 2)
+    return board
+
+def tiles(board:Board, side:int) -> list:
+    return [sorted(board.coords(idx) for idx in level) for level in board.threats(side)]
+
+def fresh_threats(board:Board) -> list:
+    copy = Board(board.width * 40, board.height * 40, 40, verbose=False)
+    for idx, side in board.history:
+        copy.play(idx, side)
+    return [copy.threats(side) for side in (0, 1)]
+
+def test_levels_of_a_three_and_a_four():
+    three = position({0: [(5, 7), (6, 7), (7, 7)], 1: [(0, 0), (14, 14), (0, 14)]})
+    assert tiles(three, 0) == [[], [(4, 7), (8, 7)], [(3, 7), (9, 7)]] # no five, open fours, fours
+    assert tiles(three, 1) == [[], [], []]
+
+    four = position({0: [(4, 7), (5, 7), (6, 7), (7, 7)], 1: [(3, 7), (14, 14), (0, 14)]})
+    assert tiles(four, 0) == [[(8, 7)], [], [(9, 7)]] # 9 makes a split four
+
+def test_threats_follow_play_and_undo():
+    rng = random.Random(7)
+    board = Board(11 * 40, 11 * 40, 40, verbose=False)
+    played = []
+    for ply in range(40):
+        idx = rng.choice([idx for idx, _ in board.candidate_tiles()] or [board.index(5, 5)])
+        played.append((board.play(idx, ply % 2), idx, ply % 2))
+        if ply % 3 == 0: # threats are brought up to date after some moves, several at once after others
+            assert [board.threats(side) for side in (0, 1)] == fresh_threats(board)
+        if board.is_win(idx, ply % 2):
+            break
+    while played:
+        change, idx, side = played.pop()
+        board.undo(change, idx, side)
+        if len(played) % 4 == 0:
+            assert [board.threats(side) for side in (0, 1)] == fresh_threats(board)
+
+def test_forced_moves():
+    ai = AI(3, 10, ponder_width=0)
+    four = position({0: [(4, 7), (5, 7), (6, 7), (7, 7)], 1: [(0, 0), (14, 14), (0, 14), (14, 0)]})
+    assert [four.coords(idx) for _, idx in ai.forced_moves(four, 0)] == [(3, 7)] # the win, one of the two
+    assert sorted(four.coords(idx) for _, idx in ai.forced_moves(four, 1)) == [(3, 7), (8, 7)] # both blocks, X still loses
+
+    three = position({0: [(5, 7), (6, 7), (7, 7)], 1: [(0, 0), (14, 14), (0, 14)]})
+    assert sorted(three.coords(idx) for _, idx in ai.forced_moves(three, 1)) == [(3, 7), (4, 7), (8, 7), (9, 7)]
+    assert ai.forced_moves(three, 0) is None
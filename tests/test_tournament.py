@@ -0,0 +1,58 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from board import Board, MARKS
+from players import AI, MCTSPlayer
+from tournament import elo_difference, make_player, play_game
+
+def position(moves:list) -> Board:
+    board = Board(600, 600, 40, verbose=False)
+    for ply, (tile_x, tile_y) in enumerate(moves):
+        board.update_board((tile_x, tile_y, MARKS[ply % 2]), graphic=False)
+    return board
+
+def test_engine_specs():
+    ai = make_player('ai:depth=3,branch_factor=8,time=2')
+    assert isinstance(ai, AI) and (ai.minimax_depth, ai.branch_factor, ai.time_lim) == (3, 8, 2.0)
+    mcts = make_player('mcts:playouts=200,branch_factor=6')
+    assert isinstance(mcts, MCTSPlayer) and (mcts.max_playouts, mcts.branch_factor, mcts.time_lim) == (200, 6, float('inf'))
+    for spec in ['minimax:depth=3', 'ai:depht=3', 'mcts:time=1,playout=5']:
+        with pytest.raises(ValueError):
+            make_player(spec)
+
+def test_elo_difference():
+    assert elo_difference(0.5) == 0
+    assert elo_difference(0.75) == pytest.approx(190.8, abs=0.1) and elo_difference(0.25) == -elo_difference(0.75)
+    assert elo_difference(1.0) == elo_difference(0.999) and elo_difference(0.0) == pytest.approx(-elo_difference(1.0))
+
+def test_mcts_takes_a_win_and_keeps_its_tree():
+    board = position([(7, 7), (8, 8), (7, 8), (8, 7), (7, 9), (9, 9), (7, 10), (3, 3)]) # O has four in a column
+    player = MCTSPlayer(max_playouts=300, seed=1)
+    player.mark = 'O'
+    with redirect_stdout(io.StringIO()):
+        move = player.get_move(board)
+    assert move in [(7, 6, 'O'), (7, 11, 'O')]
+
+    board = position([(7, 7), (8, 8), (6, 8), (8, 6)])
+    player = MCTSPlayer(max_playouts=200, seed=1)
+    player.mark = 'O'
+    with redirect_stdout(io.StringIO()):
+        move = player.get_move(board)
+        board.update_board(move, graphic=False)
+        played = next(child for child in player.root.children if child.move == board.index(*move[:2]))
+        reply = max(played.children, key=lambda child: child.visits).move # the reply the tree looked at most
+        board.update_board(board.decode_move(reply, 1), graphic=False)
+        player.get_move(board)
+    assert player.reused_visits > 0 and player.num_playouts == 200
+
+def test_a_game_between_engines():
+    players = [make_player('mcts:playouts=50,branch_factor=6'), make_player('ai:depth=2,branch_factor=6,time=5')]
+    winner, moves, spent = play_game(players, 9, [(4, 4, 'O'), (5, 5, 'X')])
+    assert winner in (0, 1, None) and moves[:2] == [(4, 4, 'O'), (5, 5, 'X')] and len(spent) == 2
+    if winner is not None:
+        board = Board(9 * 40, 9 * 40, 40, verbose=False)
+        for move in moves:
+            board.update_board(move, graphic=False)
+        assert board.check_win(moves[-1])[0] and MARKS.index(moves[-1][2]) == winner
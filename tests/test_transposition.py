@@ -0,0 +1,72 @@
+import io
+from contextlib import redirect_stdout
+
+from board import Board, default_weights
+from players import AI
+from transposition import Snapshot, board_signature, save_snapshot
+
+MOVES = [(7, 7, 'O'), (8, 8, 'X'), (6, 8, 'O'), (8, 6, 'X')]
+
+def position(size:int=15, weights=None) -> Board:
+    board = Board(size * 40, size * 40, 40, verbose=False, weights=weights)
+    for move in MOVES:
+        board.update_board(move, graphic=False)
+    return board
+
+def search(ai:AI, board:Board) -> tuple:
+    ai.mark = 'O'
+    with redirect_stdout(io.StringIO()):
+        return ai.get_move(board, 3, 8)
+
+def saved_snapshot(tmp_path, board:Board) -> str:
+    path = str(tmp_path / 'tt.bin')
+    ai = AI(3, 8, ponder_width=0, tt_path=path)
+    search(ai, board)
+    assert ai.save_transposition_table(min_depth=1) > 0
+    return path
+
+def test_snapshot_records_the_board(tmp_path):
+    board = position()
+    snapshot = Snapshot(saved_snapshot(tmp_path, board))
+    assert snapshot.signature == board_signature(board) == (15, 15, 5, 16, 0)
+    assert snapshot.matches(board)
+    assert not snapshot.matches(position(11))
+    assert not snapshot.matches(position(weights=default_weights()[:-1] + [1000.0]))
+    snapshot.close()
+
+def fresh_search(board:Board) -> tuple:
+    """ (move, states searched) from an AI without a snapshot """
+    ai = AI(3, 8, ponder_width=0)
+    return search(ai, board), ai.num_states_searched
+
+def test_snapshot_of_the_same_board_is_used(tmp_path):
+    board = position()
+    ai = AI(3, 8, ponder_width=0, tt_path=saved_snapshot(tmp_path, board))
+    search(ai, board)
+    assert ai.tt_snapshot is not None
+    assert ai.num_states_searched < fresh_search(board)[1]
+
+def test_snapshot_of_another_board_size_is_ignored(tmp_path):
+    path = saved_snapshot(tmp_path, position())
+    board = position(11)
+    ai = AI(3, 8, ponder_width=0, tt_path=path)
+    move = search(ai, board)
+    assert ai.tt_snapshot is None
+    assert (move, ai.num_states_searched) == fresh_search(board)
+
+def test_snapshot_of_other_weights_is_ignored(tmp_path):
+    path = saved_snapshot(tmp_path, position())
+    board = position(weights=[weight * 2 for weight in default_weights()])
+    ai = AI(3, 8, ponder_width=0, tt_path=path)
+    move = search(ai, board)
+    assert ai.tt_snapshot is None
+    assert (move, ai.num_states_searched) == fresh_search(board)
+
+def test_snapshot_keeps_the_bounds(tmp_path):
+    path = str(tmp_path / 'tt.bin')
+    table = {((0b101, 0b10), 3): (12.5, 4, 1), ((0b1, 0b110), 2): (-3.0, 5, -1), ((0b11, 0b100), 4): (0.0, 5, 0)}
+    assert save_snapshot(path, table, 5, board_signature(position())) == len(table)
+    snapshot = Snapshot(path)
+    assert dict(snapshot.items()) == table
+    assert all(snapshot.get(key) == value for key, value in table.items())
+    snapshot.close()
@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pytest
+
+from board import Board, default_weights, load_weights
+from tune import chain_features, fit_scale, loss, save_weights, sigmoid, tune
+
+WEIGHTS = [0.0, 2.0, 3.5, 11.0, 40.0, 90.0, 300.0]
+
+def positions(count:int, seed:int=3) -> list:
+    """ Boards with tuned weights after a random number of random moves near the centre """
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        board = Board(9 * 40, 9 * 40, 40, verbose=False, weights=WEIGHTS)
+        free = [board.index(tile_x, tile_y) for tile_x in range(1, 8) for tile_y in range(1, 8)]
+        for ply in range(rng.randint(1, 16)):
+            board.play(free.pop(rng.randrange(len(free))), ply % 2)
+        boards.append(board)
+    return boards
+
+def test_features_score_like_the_board():
+    boards = positions(20)
+    features = chain_features([board.history for board in boards], Board(9 * 40, 9 * 40, 40, verbose=False), len(WEIGHTS))
+    assert features.shape == (20, len(WEIGHTS))
+    assert features @ np.array(WEIGHTS) == pytest.approx([Board.score_board(board) for board in boards])
+    for board in boards:
+        board.set_weights(default_weights())
+        weighted = Board.score_board(board)
+        board.set_weights(None)
+        assert weighted == Board.score_board(board)
+
+def test_tuning_lowers_the_loss():
+    rng = np.random.default_rng(1)
+    features = rng.integers(-3, 4, size=(400, 4)).astype(np.float64)
+    labels = (rng.random(400) < sigmoid(features @ np.array([0.2, 0.5, 1.0, 2.0]))).astype(np.float64)
+    start = np.ones(4)
+    scale = fit_scale(features, labels, start)
+    assert loss(features, labels, start, scale) <= min(loss(features, labels, start, scale * 2), loss(features, labels, start, scale / 2))
+    for method in ('gradient', 'local'):
+        weights, tuned_scale = tune(features, labels, start.copy(), method, iterations=60, verbose=False)
+        assert tuned_scale == scale and loss(features, labels, weights, scale) < loss(features, labels, start, scale) - 0.005
+    with pytest.raises(ValueError):
+        tune(features, labels, start, 'newton')
+
+def test_weights_files_load_into_boards(tmp_path):
+    path = str(tmp_path / 'weights.json')
+    save_weights(path, np.array(WEIGHTS), 0.01, 100, 0.2)
+    assert load_weights(path) == WEIGHTS
+    board = positions(1)[0]
+    loaded = Board(9 * 40, 9 * 40, 40, verbose=False, weights=path)
+    for idx, side in board.history:
+        loaded.play(idx, side)
+    assert Board.score_board(loaded) == Board.score_board(board)
+    (tmp_path / 'other.json').write_text('{"weights": [1, 2]}')
+    with pytest.raises(ValueError):
+        Board(9 * 40, 9 * 40, 40, verbose=False, weights=str(tmp_path / 'other.json'))
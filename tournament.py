@@ -0,0 +1,116 @@
+""" Plays engines against each other without graphics and reports their results """
+
+import argparse
+import io
+import math
+import random
+from contextlib import redirect_stdout
+from time import time
+
+from board import Board, MARKS
+from players import AI, MCTSPlayer, Player
+
+# An engine is given as kind:setting=value,... for example
+#   ai:depth=4,branch_factor=10,time=1            minimax with iterative deepening, time in seconds per move
+#   ai:depth=6,selective=1,time=1                 with late move reductions and null move pruning
+#   ai:depth=6,adaptive=1,time=1                  narrowing quiet nodes, widening and extending forcing lines
+#   mcts:time=1,workers=4                         Monte Carlo tree search on 4 cores
+#   mcts:playouts=2000                            a fixed number of playouts per move
+
+def make_player(spec:str) -> Player:
+    """ Build a player from an engine spec """
+    kind, _, settings = spec.partition(':')
+    options = dict(setting.split('=') for setting in settings.split(',') if setting)
+    time_lim = float(options.pop('time', 1))
+    if kind == 'ai':
+        depth, branch_factor = int(options.pop('depth', 4)), int(options.pop('branch_factor', 10))
+        selective = bool(int(options.pop('selective', 0)))
+        player = AI(depth, branch_factor, ponder_width=0, late_move_reductions=selective, null_move=selective,
+                    adaptive=bool(int(options.pop('adaptive', 0))), node_budget=int(options.pop('node_budget', 0)))
+        player.time_lim = time_lim
+    elif kind == 'mcts':
+        playouts = options.pop('playouts', None)
+        player = MCTSPlayer(time_lim if playouts is None else float('inf'), None if playouts is None else int(playouts),
+                            branch_factor=int(options.pop('branch_factor', 12)), workers=int(options.pop('workers', 1)))
+    else:
+        raise ValueError(f'Unknown engine kind {kind}, expected ai or mcts')
+    if options:
+        raise ValueError(f'Unknown settings for {kind}: {", ".join(options)}')
+    return player
+
+def choose_move(player:Player, board:Board) -> tuple:
+    if isinstance(player, AI):
+        return player.get_move_iterative_deepening(board, player.minimax_depth, player.branch_factor, player.time_lim)
+    return player.get_move(board)
+
+def play_game(players:list, size:int, opening:list, max_moves:int=None) -> tuple:
+    """ Play one game, players[0] as O, after the opening moves
+    :return: (winning side, or None for a draw, the moves played, seconds spent by each side)
+    """
+    board = Board(size * 40, size * 40, 40, verbose=False)
+    for move in opening:
+        board.update_board(move, graphic=False)
+    players[0].mark, players[1].mark = MARKS
+    spent = [0.0, 0.0]
+
+    while not board.check_full() and (max_moves is None or len(board.history) < max_moves):
+        side = board.side_to_move
+        start = time()
+        with redirect_stdout(io.StringIO()): # the engines print their statistics
+            move = choose_move(players[side], board)
+        spent[side] += time() - start
+        board.update_board(move, graphic=False)
+        if board.check_win(move)[0]:
+            return side, [board.decode_move(idx, side) for idx, side in board.history], spent
+    return None, [board.decode_move(idx, side) for idx, side in board.history], spent
+
+def random_opening(size:int, stones:int, rng:random.Random) -> list:
+    """ stones random moves near the centre, alternating O and X """
+    centre = size // 2
+    tiles = [(centre + dx, centre + dy) for dx in range(-2, 3) for dy in range(-2, 3)]
+    return [(tile_x, tile_y, MARKS[ply % 2]) for ply, (tile_x, tile_y) in enumerate(rng.sample(tiles, stones))]
+
+def elo_difference(score:float) -> float:
+    """ Elo difference implied by a score fraction, capped for all wins or all losses """
+    score = min(max(score, 0.001), 0.999)
+    return 400 * math.log10(score / (1 - score))
+
+def main():
+    parser = argparse.ArgumentParser(description='Play two engines against each other, each opening with both colours')
+    parser.add_argument('engine1', help='e.g. ai:depth=4,time=1 or mcts:time=1,workers=2')
+    parser.add_argument('engine2')
+    parser.add_argument('-g', '--games', type=int, default=10, help='games, rounded up to an even number')
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--opening', type=int, default=2, help='random stones to start each pair of games from')
+    parser.add_argument('--max-moves', type=int, default=None, help='call the game a draw after this many moves')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    engines = [make_player(args.engine1), make_player(args.engine2)]
+    rng = random.Random(args.seed)
+    points = [0.0, 0.0]
+    for pair in range((args.games + 1) // 2):
+        opening = random_opening(args.size, args.opening, rng)
+        for first in (0, 1): # the same opening with each engine as O
+            order = [engines[first], engines[1 - first]]
+            winner, moves, spent = play_game(order, args.size, opening, args.max_moves)
+            if winner is None:
+                points[0] += 0.5
+                points[1] += 0.5
+                result = 'draw'
+            else:
+                points[first if winner == 0 else 1 - first] += 1
+                result = f'engine{(first if winner == 0 else 1 - first) + 1} wins'
+            print(f'game {2 * pair + first + 1}: engine{first + 1} as O, {result} in {len(moves)} moves '
+                  f'({spent[0]:.1f}s / {spent[1]:.1f}s)', flush=True)
+
+    games = sum(points)
+    print(f'{args.engine1}: {points[0]:g}, {args.engine2}: {points[1]:g} of {games:g} games, '
+          f'Elo difference {elo_difference(points[0] / games):+.0f}')
+    for engine in engines:
+        if isinstance(engine, MCTSPlayer):
+            engine.close()
+
+
+if __name__ == '__main__':
+    main()
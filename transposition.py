@@ -0,0 +1,128 @@
+""" Implements on-disk snapshots of the AI's transposition table """
+
+import hashlib
+import mmap
+import os
+import struct
+from typing import Iterator, Optional, Tuple
+
+MAGIC = b'GTT1'
+# magic, format version, bytes per bitboard, newest generation, number of records,
+# then what the keys and scores depend on: board width, height (0 if unbounded), win length, the stride
+# of its cell indices (2**21 for SparseBoard's Zobrist keys) and the score weights' fingerprint
+HEADER = struct.Struct('<4sHHIQHHHIQ')
+VALUE = struct.Struct('<Bbid') # depth, bound (as in players: 0 exact, 1 lower, -1 upper), generation, score
+FORMAT_VERSION = 5
+
+def board_signature(board) -> tuple:
+    """
+    (width, height, win_length, stride, weights fingerprint) of a board. Keys are bitboards over the board's padded
+    cells (or Zobrist hashes of them) and scores come from its weights, so a snapshot is only valid for boards
+    with the same signature. Unbounded sizes are 0, and the fingerprint is 0 for the default chain values
+    """
+    fingerprint = 0
+    if board.weights is not None:
+        digest = hashlib.blake2b(repr([float(weight) for weight in board.weights]).encode(), digest_size=8).digest()
+        fingerprint = int.from_bytes(digest, 'little') or 1
+    return (board.width or 0, board.height or 0, board.win_length, board.stride, fingerprint)
+
+class Snapshot():
+    """
+    A read-only transposition table snapshot, memory-mapped from disk.
+    Records are fixed size and sorted by key, so lookups are binary searches
+    straight into the mapped file and opening a snapshot costs nothing but the mmap.
+    """
+    def __init__(self, path:str) -> None:
+        """ Open and map a snapshot written by save_snapshot """
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = struct.unpack_from('<4sH', self.data, 0) if len(self.data) >= 6 else (None, None)
+        if magic != MAGIC or version != FORMAT_VERSION or len(self.data) < HEADER.size:
+            self.data.close()
+            raise ValueError(f'{path} is not a transposition table snapshot (version {FORMAT_VERSION})')
+        _, _, key_bytes, generation, count, *signature = HEADER.unpack_from(self.data, 0)
+
+        self.signature = tuple(signature) # see board_signature
+        self.key_bytes = key_bytes
+        self.generation = generation
+        self.count = count
+        self.prefix_size = 2 * key_bytes + 1 # bitboards of X and O, then depth
+        self.record_size = 2 * key_bytes + VALUE.size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def encode_key(self, key:tuple) -> Optional[bytes]:
+        """ Encode a transposition table key ((tiles_X, tiles_O), depth) as it is stored on disk """
+        (tiles_X, tiles_O), depth = key
+        try:
+            return tiles_X.to_bytes(self.key_bytes, 'big') + tiles_O.to_bytes(self.key_bytes, 'big') + bytes((depth,))
+        except OverflowError: # board larger than the one the snapshot was taken on, or depth > 255
+            return None
+
+    def get(self, key:tuple) -> Optional[Tuple[float, int, int]]:
+        """ Return the stored (score, generation, bound) for key, or None """
+        target = self.encode_key(key)
+        if target is None:
+            return None
+
+        data, size, prefix = self.data, self.record_size, self.prefix_size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * size
+            cand = data[offset:offset + prefix]
+            if cand < target:
+                lo = mid + 1
+            elif cand > target:
+                hi = mid
+            else:
+                _, bound, generation, score = VALUE.unpack_from(data, offset + 2 * self.key_bytes)
+                return (score, generation, bound)
+        return None
+
+    def items(self) -> Iterator[Tuple[tuple, Tuple[float, int, int]]]:
+        """ Yield every (key, (score, generation, bound)) record in the snapshot """
+        kb = self.key_bytes
+        for i in range(self.count):
+            offset = HEADER.size + i * self.record_size
+            tiles_X = int.from_bytes(self.data[offset:offset + kb], 'big')
+            tiles_O = int.from_bytes(self.data[offset + kb:offset + 2 * kb], 'big')
+            depth, bound, generation, score = VALUE.unpack_from(self.data, offset + 2 * kb)
+            yield ((tiles_X, tiles_O), depth), (score, generation, bound)
+
+    def matches(self, board) -> bool:
+        """ Whether the snapshot was taken on boards like this one, so its keys and scores mean the same here """
+        return self.signature == board_signature(board)
+
+    def close(self) -> None:
+        self.data.close()
+
+
+def save_snapshot(path:str, table:dict, generation:int, signature:tuple, min_depth:int=1, min_generation:int=0) -> int:
+    """
+    Write a transposition table to path as a sorted, fixed-record snapshot.
+    The file is written next to path and renamed into place, so readers never see a partial snapshot.
+    :param table: {((tiles_X, tiles_O), depth): (score, generation, bound)}
+    :param generation: the newest generation in the table, stored in the header
+    :param signature: board_signature of the boards the table was searched on, stored in the header
+    :param min_depth: drop entries searched shallower than this
+    :param min_generation: drop entries older than this generation
+    :return: the number of records written
+    """
+    entries = [(key, value) for key, value in table.items() if key[1] >= min_depth and value[1] >= min_generation and key[1] < 256]
+    key_bytes = max([max(tiles_X.bit_length(), tiles_O.bit_length()) for ((tiles_X, tiles_O), _), _ in entries] + [1])
+    key_bytes = (key_bytes + 7) // 8
+
+    records = sorted(tiles_X.to_bytes(key_bytes, 'big') + tiles_O.to_bytes(key_bytes, 'big') + VALUE.pack(depth, bound, value_gen, score)
+                    for ((tiles_X, tiles_O), depth), (score, value_gen, bound) in entries)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, key_bytes, generation, len(records), *signature))
+        f.write(b''.join(records))
+    os.replace(tmp_path, path)
+
+    return len(records)
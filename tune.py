@@ -0,0 +1,180 @@
+""" Tunes the chain weights of score_board on positions labelled with the result of their game """
+
+import argparse
+import json
+import os
+import numpy as np
+from time import perf_counter
+from typing import Iterator, Tuple
+
+from board import Board, WEIGHTS_FORMAT, default_weights
+from bulk import rebuild_logic
+from gamedb import GameDB, RESULTS
+
+# score_board adds up a weight per chain, the same for every chain of a given effective length m, so a
+# position's score is linear in the weights: features . weights, where features[m] is the number of O's
+# chains of length m minus X's (chains longer than the weights weigh as the longest). The features of
+# every position are extracted once, with bulk.rebuild_logic; after that, scoring a million positions
+# is one matrix product. As in Texel tuning, a score s predicts O's result as sigmoid(scale * s), and the
+# weights minimise the mean squared error of that prediction against the game's result.
+
+METHODS = ('gradient', 'local')
+LABELS = {'O': 1.0, 'X': 0.0, 'draw': 0.5} # O's result
+CHUNK = 1024 # positions rebuilt at once
+
+def labelled_histories(db:GameDB, skip:int=4) -> Iterator[Tuple[list, float]]:
+    """ (history, O's result) for every position of every game with a known result, from ply skip on """
+    template = Board(db.width * 40, db.height * 40, 40, db.win_length, verbose=False)
+    playable = template.tables.playable
+    for game in range(len(db)):
+        moves, result = db.raw_game(game)
+        if RESULTS[result] is None:
+            continue
+        history = [(playable[move >> 1], move & 1) for move in moves]
+        for ply in range(max(skip, 1), len(history) + 1):
+            yield history[:ply], LABELS[RESULTS[result]]
+
+def chain_features(histories:list, template:Board, lengths:int) -> np.ndarray:
+    """ For each position, O's chains minus X's of each effective length m below lengths, as (positions, lengths) """
+    _, chains = rebuild_logic(histories, template)
+    chains = chains.astype(np.int64)
+    m = np.minimum(np.rint(np.sqrt(np.maximum(chains - 1, 0))).astype(np.int64), lengths - 1)
+    position = np.arange(len(histories))[:, None, None, None]
+    side = np.arange(2)[None, None, :, None]
+    key = ((position * 2 + side) * lengths + m)[chains > 0]
+    counts = np.bincount(key, minlength=len(histories) * 2 * lengths).reshape(len(histories), 2, lengths)
+    return (counts[:, 0] - counts[:, 1]).astype(np.float64)
+
+def load_positions(path:str, lengths:int, skip:int=4, limit:int=None) -> Tuple[np.ndarray, np.ndarray]:
+    """ The features and labels of the positions in a game database, at most limit of them """
+    db = GameDB(path)
+    template = Board(db.width * 40, db.height * 40, 40, db.win_length, verbose=False)
+    features, labels, histories = [], [], []
+    try:
+        for history, label in labelled_histories(db, skip):
+            if limit is not None and len(labels) >= limit:
+                break
+            histories.append(history)
+            labels.append(label)
+            if len(histories) == CHUNK:
+                features.append(chain_features(histories, template, lengths))
+                histories = []
+        if histories:
+            features.append(chain_features(histories, template, lengths))
+    finally:
+        db.close()
+    if not labels:
+        raise ValueError(f'{path} has no games with a known result!')
+    return np.concatenate(features), np.array(labels)
+
+def sigmoid(x:np.ndarray) -> np.ndarray:
+    return 0.5 + 0.5 * np.tanh(0.5 * x)
+
+def loss(features:np.ndarray, labels:np.ndarray, weights:np.ndarray, scale:float) -> float:
+    """ Mean squared error of the predicted results """
+    return float(np.mean((labels - sigmoid(scale * (features @ weights)))**2))
+
+def fit_scale(features:np.ndarray, labels:np.ndarray, weights:np.ndarray) -> float:
+    """ The scale that best turns the scores of these weights into results, by golden section search on its log """
+    low, high = -12.0, 2.0
+    ratio = (5 ** 0.5 - 1) / 2
+    for _ in range(40):
+        left, right = high - ratio * (high - low), low + ratio * (high - low)
+        if loss(features, labels, weights, np.exp(left)) < loss(features, labels, weights, np.exp(right)):
+            high = right
+        else:
+            low = left
+    return float(np.exp((low + high) / 2))
+
+def gradient_step(features:np.ndarray, labels:np.ndarray, weights:np.ndarray, scale:float, state:dict,
+                  rate:float=0.05) -> np.ndarray:
+    """ One Adam step on the loss, with the step size relative to the weights """
+    predicted = sigmoid(scale * (features @ weights))
+    gradient = features.T @ ((predicted - labels) * predicted * (1 - predicted)) * (2 * scale / len(labels))
+    state['t'] = t = state.get('t', 0) + 1
+    state['m'] = m = 0.9 * state.get('m', 0) + 0.1 * gradient
+    state['v'] = v = 0.999 * state.get('v', 0) + 0.001 * gradient**2
+    step = (m / (1 - 0.9**t)) / (np.sqrt(v / (1 - 0.999**t)) + 1e-12)
+    return weights - rate * np.maximum(np.abs(weights), 1) * step
+
+def local_step(features:np.ndarray, labels:np.ndarray, weights:np.ndarray, scale:float, state:dict) -> np.ndarray:
+    """ One pass of Texel's local search: move each weight by its step while that lowers the loss,
+    and halve the steps after a pass that found nothing better """
+    steps = state.setdefault('steps', np.maximum(np.abs(weights), 1) * 0.1)
+    best = loss(features, labels, weights, scale)
+    improved = False
+    for m in range(len(weights)):
+        for direction in (1, -1):
+            trial = weights.copy()
+            trial[m] += direction * steps[m]
+            trial_loss = loss(features, labels, trial, scale)
+            if trial_loss < best:
+                weights, best, improved = trial, trial_loss, True
+                break
+    if not improved:
+        steps /= 2
+    return weights
+
+def tune(features:np.ndarray, labels:np.ndarray, weights:np.ndarray, method:str='gradient', iterations:int=200,
+         verbose:bool=True) -> Tuple[np.ndarray, float]:
+    """ Fit the weights to the labels, starting from weights
+    :return: (the weights, the scale their scores are turned into results with)
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown method {method}, expected one of {METHODS}!')
+    scale = fit_scale(features, labels, weights)
+    # the loss only depends on scale * weights: keep the scale and let the weights take up any change
+    state = {}
+    for iteration in range(iterations):
+        start = perf_counter()
+        if method == 'gradient':
+            weights = gradient_step(features, labels, weights, scale, state)
+        else:
+            weights = local_step(features, labels, weights, scale, state)
+        if verbose and (iteration % 20 == 0 or iteration == iterations - 1):
+            print(f'iteration {iteration + 1}: loss {loss(features, labels, weights, scale):.6f} '
+                  f'({perf_counter() - start:.2f}s)', flush=True)
+    return weights, scale
+
+def save_weights(path:str, weights:np.ndarray, scale:float, positions:int, final_loss:float) -> None:
+    """ Write a weights file that Board(..., weights=path) loads """
+    with open(path, 'w') as f:
+        json.dump({'format': WEIGHTS_FORMAT, 'weights': [round(float(weight), 6) for weight in weights],
+                   'scale': scale, 'positions': positions, 'loss': final_loss}, f, indent=1)
+        f.write('\n')
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the chain weights of score_board to the results of the games in a game database')
+    parser.add_argument('games', help='game database (see gamedb.py); only games with a known result are used')
+    parser.add_argument('-o', '--output', default='weights.json', help='weights file to write')
+    parser.add_argument('-m', '--method', choices=METHODS, default='gradient', help='Adam on the loss, or Texel local search')
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    parser.add_argument('--lengths', type=int, default=10, help='weights to fit, for chains of length 0 up to lengths - 1')
+    parser.add_argument('--skip', type=int, default=4, help='opening plies left out of every game')
+    parser.add_argument('--limit', type=int, default=None, help='at most this many positions')
+    parser.add_argument('--cache', default=None, help='.npz file to keep the extracted features in, reused if it exists')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    if args.cache and os.path.exists(args.cache):
+        cached = np.load(args.cache)
+        features, labels = cached['features'], cached['labels']
+        if features.shape[1] != args.lengths:
+            raise SystemExit(f'{args.cache} holds features for {features.shape[1]} lengths, not {args.lengths}')
+    else:
+        features, labels = load_positions(args.games, args.lengths, args.skip, args.limit)
+        if args.cache:
+            np.savez(args.cache, features=features, labels=labels)
+    print(f'{len(labels)} positions in {perf_counter() - start:.1f}s, O scoring {labels.mean():.3f}', flush=True)
+
+    initial = np.array(default_weights(args.lengths))
+    weights, scale = tune(features, labels, initial.copy(), args.method, args.iterations)
+    final_loss = loss(features, labels, weights, scale)
+    print(f'loss {loss(features, labels, initial, scale):.6f} -> {final_loss:.6f}')
+    print('weights: ' + ', '.join(f'{m}: {weight:.2f}' for m, weight in enumerate(weights)))
+    save_weights(args.output, weights, scale, len(labels), final_loss)
+    print(f'written to {args.output}, load with Board(..., weights={args.output!r})')
+
+
+if __name__ == '__main__':
+    main()